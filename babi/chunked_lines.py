@@ -0,0 +1,125 @@
+import itertools
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+from babi.list_spy import MutableSequenceNoSlice
+
+# chunks are split when they grow past twice this size
+LOAD = 512
+
+
+class ChunkedLines(MutableSequenceNoSlice):
+    """A list of lines stored as a sequence of chunks.
+
+    A Fenwick tree over the chunk lengths locates a line in O(log n) so that
+    inserting or deleting a line only touches a single small chunk instead
+    of shifting every line after it.
+    """
+
+    def __init__(self, lines: Iterable[str] = ()) -> None:
+        lst = list(lines)
+        self._chunks = [lst[i:i + LOAD] for i in range(0, len(lst), LOAD)]
+        self._len = len(lst)
+        self._build_index()
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({list(self)})'
+
+    def _build_index(self) -> None:
+        tree = [0, *map(len, self._chunks)]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._bit = 1 << len(self._chunks).bit_length() >> 1
+        # (start, chunk index) of the most recently located chunk
+        self._last = (0, 0)
+
+    def _update_index(self, i: int, delta: int) -> None:
+        self._len += delta
+        self._last = (0, 0)
+        i += 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _locate(self, idx: int) -> Tuple[int, int]:
+        if idx < 0:
+            idx += self._len
+        if not 0 <= idx < self._len:
+            raise IndexError('list index out of range')
+
+        # sequential access (iteration, searching, drawing) hits this
+        start, i = self._last
+        if start <= idx < start + len(self._chunks[i]):
+            return i, idx - start
+
+        pos, remaining = 0, idx
+        bit = self._bit
+        while bit:
+            nxt = pos + bit
+            if nxt < len(self._tree) and self._tree[nxt] <= remaining:
+                pos = nxt
+                remaining -= self._tree[nxt]
+            bit >>= 1
+        self._last = (idx - remaining, pos)
+        return pos, remaining
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk in self._chunks:
+            yield from chunk
+
+    def snapshot(self) -> Tuple[str, ...]:
+        """The current lines, unaffected by later edits."""
+        return tuple(itertools.chain.from_iterable(self._chunks))
+
+    def __getitem__(self, idx: int) -> str:
+        i, offset = self._locate(idx)
+        return self._chunks[i][offset]
+
+    def __setitem__(self, idx: int, val: str) -> None:
+        i, offset = self._locate(idx)
+        self._chunks[i][offset] = val
+
+    def __delitem__(self, idx: int) -> None:
+        i, offset = self._locate(idx)
+        chunk = self._chunks[i]
+        del chunk[offset]
+        if chunk:
+            self._update_index(i, -1)
+        else:
+            del self._chunks[i]
+            self._len -= 1
+            self._build_index()
+
+    def insert(self, idx: int, val: str) -> None:
+        if idx < 0:
+            idx = max(idx + self._len, 0)
+
+        chunk: List[str]
+        if not self._chunks:
+            self._chunks.append([val])
+            self._len += 1
+            self._build_index()
+            return
+        elif idx >= self._len:
+            i = len(self._chunks) - 1
+            chunk = self._chunks[i]
+            chunk.append(val)
+        else:
+            i, offset = self._locate(idx)
+            chunk = self._chunks[i]
+            chunk.insert(offset, val)
+
+        if len(chunk) > 2 * LOAD:
+            self._chunks[i:i + 1] = [chunk[:LOAD], chunk[LOAD:]]
+            self._len += 1
+            self._build_index()
+        else:
+            self._update_index(i, 1)
@@ -0,0 +1,86 @@
+from array import array
+from typing import Iterable
+from typing import Iterator
+
+from babi.list_spy import MutableSequenceNoSlice
+
+
+class CompactLines(MutableSequenceNoSlice):
+    """Lines stored as utf-8 in a single contiguous buffer.  `str` objects
+    are only created when a line is accessed.
+
+    Each distinct line is stored once: `_ids` holds the index of every
+    line's text in `_offsets` and an open addressing hash table of the
+    stored texts finds an existing copy of a line.  Text which is no longer
+    used after editing is not reclaimed.
+    """
+
+    def __init__(self, lines: Iterable[str] = ()) -> None:
+        self._blob = bytearray()
+        self._offsets = array('q', [0])
+        self._ids = array('I')
+        self._table = array('i', [-1]) * 8
+        self.extend(lines)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({list(self)})'
+
+    def _text_bytes(self, text_id: int) -> bytearray:
+        return self._blob[self._offsets[text_id]:self._offsets[text_id + 1]]
+
+    def _text(self, text_id: int) -> str:
+        return self._text_bytes(text_id).decode()
+
+    def _grow_table(self) -> None:
+        table = array('i', [-1]) * (len(self._table) * 4)
+        mask = len(table) - 1
+        for text_id in range(len(self._offsets) - 1):
+            i = hash(bytes(self._text_bytes(text_id))) & mask
+            while table[i] != -1:
+                i = (i + 1) & mask
+            table[i] = text_id
+        self._table = table
+
+    def _intern(self, s: str) -> int:
+        b = s.encode()
+        mask = len(self._table) - 1
+        i = hash(b) & mask
+        while self._table[i] != -1:
+            if self._text_bytes(self._table[i]) == b:
+                return self._table[i]
+            i = (i + 1) & mask
+
+        text_id = len(self._offsets) - 1
+        self._blob += b
+        self._offsets.append(len(self._blob))
+        self._table[i] = text_id
+        # keep the table at most half full
+        if text_id * 2 >= len(self._table):
+            self._grow_table()
+        return text_id
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return map(self._text, self._ids)
+
+    def snapshot(self) -> Iterator[str]:
+        """The current lines, unaffected by later edits."""
+        # stored text is never modified so only the ids need to be copied
+        return map(self._text, self._ids[:])
+
+    def __getitem__(self, idx: int) -> str:
+        return self._text(self._ids[idx])
+
+    def __setitem__(self, idx: int, val: str) -> None:
+        self._ids[idx] = self._intern(val)
+
+    def __delitem__(self, idx: int) -> None:
+        del self._ids[idx]
+
+    def insert(self, idx: int, val: str) -> None:
+        self._ids.insert(idx, self._intern(val))
+
+    def extend(self, lines: Iterable[str]) -> None:
+        self._ids.extend(map(self._intern, lines))
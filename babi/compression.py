@@ -0,0 +1,57 @@
+import bz2
+import gzip
+import lzma
+import re
+from typing import BinaryIO
+from typing import cast
+from typing import Optional
+from typing import Pattern
+from typing import Tuple
+
+# the start of a file in each supported format, bz2 is followed by either
+# the first block or the end of an empty stream
+MAGIC: Tuple[Tuple[str, Pattern[bytes]], ...] = (
+    ('gzip', re.compile(b'\x1f\x8b\x08')),
+    ('bz2', re.compile(b'BZh[1-9](1AY&SY|\x17rE8P\x90)')),
+    ('xz', re.compile(b'\xfd7zXZ\x00')),
+)
+
+
+def detect_compression(filename: str) -> Optional[str]:
+    """The format `filename` is compressed with, by its magic bytes."""
+    with open(filename, 'rb') as bf:
+        start = bf.read(10)
+    for compression, pattern in MAGIC:
+        if pattern.match(start):
+            return compression
+    return None
+
+
+def open_decompressed(filename: str, compression: Optional[str]) -> BinaryIO:
+    """Open `filename` to read its decompressed contents as a stream."""
+    if compression == 'gzip':
+        return cast(BinaryIO, gzip.open(filename, 'rb'))
+    elif compression == 'bz2':
+        return cast(BinaryIO, bz2.open(filename, 'rb'))
+    elif compression == 'xz':
+        return cast(BinaryIO, lzma.open(filename, 'rb'))
+    else:
+        return open(filename, 'rb')
+
+
+def open_compressor(
+        bf: BinaryIO,
+        compression: str,
+        filename: str,
+) -> BinaryIO:
+    """Compress what is written into `bf`, which stays open when this is
+    closed.  `filename` is recorded in the gzip header.
+    """
+    if compression == 'gzip':
+        return cast(BinaryIO, gzip.GzipFile(filename, 'wb', fileobj=bf))
+    elif compression == 'bz2':
+        return cast(BinaryIO, bz2.open(bf, 'wb'))
+    elif compression == 'xz':
+        return cast(BinaryIO, lzma.open(bf, 'wb'))
+    else:
+        raise AssertionError(f'unreachable {compression}')
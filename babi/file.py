@@ -1,3 +1,4 @@
+import bisect
 import collections
 import contextlib
 import curses
@@ -6,13 +7,23 @@ import hashlib
 import io
 import itertools
 import os.path
+import stat
+import sys
+import tempfile
+import threading
+import time
+from array import array
 from typing import Any
+from typing import BinaryIO
 from typing import Callable
 from typing import cast
+from typing import Deque
+from typing import Dict
 from typing import Generator
 from typing import IO
+from typing import Iterable
+from typing import Iterator
 from typing import List
-from typing import Match
 from typing import NamedTuple
 from typing import Optional
 from typing import Pattern
@@ -21,19 +32,68 @@ from typing import TYPE_CHECKING
 from typing import TypeVar
 from typing import Union
 
+from babi.chunked_lines import ChunkedLines
+from babi.compact_lines import CompactLines
+from babi.compression import detect_compression
+from babi.compression import open_compressor
+from babi.compression import open_decompressed
+from babi.gap_buffer import GapBuffer
+from babi.hash_tree import HashTree
 from babi.horizontal_scrolling import line_x
 from babi.horizontal_scrolling import scrolled_line
+from babi.horizontal_scrolling import scrolled_window
 from babi.list_spy import ListSpy
 from babi.list_spy import MutableSequenceNoSlice
+from babi.mapped_lines import get_lines_mapped
+from babi.mapped_lines import MappedLines
 from babi.margin import Margin
 from babi.prompt import PromptResult
+from babi.recovery import Change
+from babi.recovery import load_recovery
+from babi.recovery import recovery_exists
+from babi.recovery import RecoveryJournal
+from babi.recovery import remove_recovery
+from babi.search import finditer
+from babi.search import Found
+from babi.search import is_multiline
+from babi.search import matches
+from babi.search import Replacement
+from babi.search import search_lines
+from babi.search import search_multiline
+from babi.search import sub_lines
 from babi.status import Status
+from babi.undo_journal import UndoJournal
+from babi.view_lines import get_lines_view
 
 if TYPE_CHECKING:
     from babi.main import Screen  # XXX: circular
 
 TCallable = TypeVar('TCallable', bound=Callable[..., Any])
 HIGHLIGHT = curses.A_REVERSE | curses.A_DIM
+# files at least this large are memory mapped and decoded lazily
+MAPPED_LINES_THRESHOLD = 64 * 1024 * 1024
+# files at least this large finish loading on a background thread
+PROGRESSIVE_LOAD_THRESHOLD = 1024 * 1024
+# compressed files are usually several times larger once decompressed
+COMPRESSED_LOAD_THRESHOLD = PROGRESSIVE_LOAD_THRESHOLD // 8
+# buffers with at least this many lines use `ChunkedLines` for cheap edits
+CHUNKED_LINES_THRESHOLD = 500000
+# lines at least this long are edited in a `GapBuffer`
+GAP_BUFFER_THRESHOLD = 64 * 1024
+LOAD_CHUNK_SIZE = 64 * 1024
+SAVE_CHUNK_LINES = 1024
+# bytes of undo (and of redo) history kept in memory for each file
+UNDO_MEMORY = 64 * 1024 * 1024
+# states this many actions apart keep a snapshot of the lines, see `UndoTree`
+CHECKPOINT_INTERVAL = 64
+# patterns matching more often than this are searched without `_MatchIndex`
+MATCH_INDEX_MAX = 4 * 1024 * 1024
+# a `_MatchIndex` is rebuilt instead of updated after this many changes
+MATCH_INDEX_MAX_CHANGES = 1024
+# saves taking longer than this finish in the background
+SAVE_BLOCK_SECONDS = .5
+
+LoadResult = Tuple[MutableSequenceNoSlice, str, bool, str]
 
 
 def _restore_lines_eof_invariant(lines: MutableSequenceNoSlice) -> None:
@@ -45,64 +105,803 @@ def _restore_lines_eof_invariant(lines: MutableSequenceNoSlice) -> None:
         lines.append('')
 
 
-def get_lines(sio: IO[str]) -> Tuple[List[str], str, bool, str]:
-    sha256 = hashlib.sha256()
-    lines = []
-    newlines = collections.Counter({'\n': 0})  # default to `\n`
-    for line in sio:
-        sha256.update(line.encode())
+class FileStat(NamedTuple):
+    """The parts of `os.stat` which change when a file is written."""
+    dev: int
+    ino: int
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def from_stat(cls, st: os.stat_result) -> 'FileStat':
+        return cls(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    @classmethod
+    def from_path(cls, filename: str) -> 'FileStat':
+        return cls.from_stat(os.stat(filename))
+
+
+class _LineParser:
+    """The incremental state of `get_lines` and `get_lines_bytes`."""
+
+    def __init__(self, *, compact: bool = False) -> None:
+        self.lines: Union[List[str], CompactLines]
+        self.lines = CompactLines() if compact else []
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._newlines = collections.Counter({'\n': 0})  # default to `\n`
+        # bytes of the last line when it has not been terminated yet
+        self._partial: List[bytes] = []
+
+    def _append_line(self, line: str) -> None:
         for ending in ('\r\n', '\n'):
             if line.endswith(ending):
-                lines.append(line[:-1 * len(ending)])
-                newlines[ending] += 1
+                self.lines.append(line[:-1 * len(ending)])
+                self._newlines[ending] += 1
                 break
         else:
-            lines.append(line)
-    _restore_lines_eof_invariant(lines)
-    (nl, _), = newlines.most_common(1)
-    mixed = len({k for k, v in newlines.items() if v}) > 1
-    return lines, nl, mixed, sha256.hexdigest()
+            self.lines.append(line)
+
+    def feed(self, sio: Iterable[str]) -> None:
+        for line in sio:
+            encoded = line.encode()
+            self.size += len(encoded)
+            self._sha256.update(encoded)
+            self._append_line(line)
+
+    def _feed_lines(self, b: bytes, *, final: bool) -> None:
+        text = b.decode()
+        crlf = b.count(b'\r\n')
+        # a lone `\r` also ends a line (but isn't a counted newline)
+        if b.count(b'\r') != crlf:
+            for line in io.StringIO(text, newline=''):
+                self._append_line(line)
+            return
+
+        lf = b.count(b'\n') - crlf
+        if not lf:
+            lines = text.split('\r\n')
+        else:
+            lines = text.replace('\r\n', '\n').split('\n')
+        if not final:  # `b` ends in a newline
+            lines.pop()
+        if crlf:
+            self._newlines['\r\n'] += crlf
+        self._newlines['\n'] += lf
+        self.lines.extend(lines)
+
+    def feed_bytes(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        self._sha256.update(chunk)
+        end = chunk.rfind(b'\n') + 1
+        if not end:
+            self._partial.append(chunk)
+        else:
+            self._partial.append(chunk[:end])
+            complete = b''.join(self._partial)
+            self._partial = [chunk[end:]]
+            self._feed_lines(complete, final=False)
+
+    @property
+    def partial(self) -> str:
+        """The last line, when it is not terminated yet."""
+        # it may end in the middle of a character or of a `\r\n`
+        line = b''.join(self._partial).decode(errors='ignore')
+        return line[:-1] if line.endswith('\r') else line
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    def newlines(self) -> Tuple[str, bool]:
+        """The most common newline and whether the newlines are mixed."""
+        (nl, _), = self._newlines.most_common(1)
+        mixed = len({k for k, v in self._newlines.items() if v}) > 1
+        return nl, mixed
+
+    def finish(self) -> LoadResult:
+        rest = b''.join(self._partial)
+        if rest:
+            self._feed_lines(rest, final=True)
+        _restore_lines_eof_invariant(self.lines)
+        return (self.lines, *self.newlines(), self.sha256)
+
+
+def get_lines(sio: IO[str]) -> LoadResult:
+    parser = _LineParser()
+    parser.feed(sio)
+    return parser.finish()
+
+
+def get_lines_bytes(f: BinaryIO, *, compact: bool = False) -> LoadResult:
+    """The equivalent of `get_lines` for a file opened in binary mode.
+
+    The contents are hashed, counted and split a large chunk at a time
+    instead of line by line.  With `compact`, the lines are stored in
+    `CompactLines`.
+    """
+    parser = _LineParser(compact=compact)
+    for chunk in iter(functools.partial(f.read, LOAD_CHUNK_SIZE), b''):
+        parser.feed_bytes(chunk)
+    return parser.finish()
+
+
+def _encoded_chunks(lines: Iterable[str], nl: str) -> Iterator[bytes]:
+    """`nl.join(lines).encode()`, a few lines at a time."""
+    lines_iter = iter(lines)
+    sep = ''
+    while True:
+        batch = list(itertools.islice(lines_iter, SAVE_CHUNK_LINES))
+        if not batch:
+            break
+        yield f'{sep}{nl.join(batch)}'.encode()
+        sep = nl
+
+
+def write_lines(
+        bf: BinaryIO,
+        lines: Iterable[str],
+        nl: str,
+) -> Tuple[int, str]:
+    """Write the lines without building the whole contents in memory.
+    Returns the number of bytes written and their sha256.
+    """
+    size = 0
+    sha256 = hashlib.sha256()
+    for chunk in _encoded_chunks(lines, nl):
+        size += len(chunk)
+        sha256.update(chunk)
+        bf.write(chunk)
+    return size, sha256.hexdigest()
+
+
+class _Loader:
+    """Parses `f` on a background thread.  `lines` grows as the file is read
+    and, like the lines of a loaded file, always ends in a blank line.
+
+    `size` is `None` for a stream (stdin), which should be unbuffered so
+    lines are parsed as they arrive.
+    """
+
+    def __init__(
+            self,
+            f: BinaryIO,
+            size: Optional[int],
+            *,
+            compact: bool,
+    ) -> None:
+        self._f = f
+        self._read = functools.partial(f.read, LOAD_CHUNK_SIZE)
+        self.size = size
+        self._parser = _LineParser(compact=compact)
+        self.lines = self._parser.lines
+        self.lines.append('')
+        self.result: Optional[LoadResult] = None
+        self._exc: Optional[BaseException] = None
+        self._cond = threading.Condition()
+        threading.Thread(target=self._load, daemon=True).start()
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None or self._exc is not None
+
+    @property
+    def progress(self) -> str:
+        if self.size is None:
+            return f'{len(self.lines) - 1} lines'
+        else:
+            return f'{self._parser.size * 100 // self.size}%'
+
+    def _feed(self, chunk: bytes) -> None:
+        with self._cond:
+            # the lines are appended before the blank line at the end
+            self.lines.pop()
+            self._parser.feed_bytes(chunk)
+            self.lines.append('')
+            self._cond.notify_all()
+
+    def _load(self) -> None:
+        try:
+            with self._f:
+                for chunk in iter(self._read, b''):
+                    self._feed(chunk)
+                with self._cond:
+                    self.lines.pop()
+                    result = self._parser.finish()
+        except BaseException as e:  # pragma: no cover (re-raised on wait)
+            with self._cond:
+                self._exc = e
+                self._cond.notify_all()
+        else:
+            with self._cond:
+                self.result = result
+                self._cond.notify_all()
+
+    def wait_for(self, n: Optional[int]) -> None:
+        """wait until at least `n` lines are loaded (or everything if None)"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.done or (n is not None and len(self.lines) >= n),
+            )
+        if self._exc is not None:  # pragma: no cover (decoding errors)
+            raise self._exc
+
+    @contextlib.contextmanager
+    def paused(self) -> Generator[None, None, None]:
+        """No lines are appended while the lines are edited."""
+        with self._cond:
+            yield
+
+
+class _Follower:
+    """Reads what is appended to a file after it was opened, see
+    `--follow`.  The lines are split, counted and hashed incrementally.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self._filename = filename
+        self._f = open(filename, 'rb')
+        self._parser = _LineParser()
+        self.stat = FileStat.from_stat(os.fstat(self._f.fileno()))
+        # the number of terminated lines which were taken
+        self.complete = 0
+
+    @property
+    def partial(self) -> str:
+        return self._parser.partial
+
+    @property
+    def sha256(self) -> str:
+        return self._parser.sha256
+
+    def newlines(self) -> Tuple[str, bool]:
+        return self._parser.newlines()
+
+    def close(self) -> None:
+        self._f.close()
+
+    def replaced(self) -> bool:
+        """Whether the file was truncated, replaced or removed."""
+        try:
+            st = os.stat(self._filename)
+        except OSError:
+            return True
+        else:
+            size = os.fstat(self._f.fileno()).st_size
+            return size < self._parser.size or st.st_ino != self.stat.ino
+
+    def read(self) -> bool:
+        """Read up to the current end of the file, returns whether anything
+        was appended.
+        """
+        st = os.fstat(self._f.fileno())
+        # stop at the size which is recorded in `stat`, anything appended
+        # in the meantime is read next time
+        remaining = st.st_size - self._parser.size
+        if remaining <= 0:
+            return False
+        while remaining > 0:
+            chunk = self._f.read(min(remaining, LOAD_CHUNK_SIZE))
+            if not chunk:  # pragma: no cover (truncated while reading)
+                break
+            self._parser.feed_bytes(chunk)
+            remaining -= len(chunk)
+        self.stat = FileStat.from_stat(st)
+        return True
+
+    def take_lines(self) -> List[str]:
+        """The lines which were terminated since the last call."""
+        lines = self._parser.lines
+        assert isinstance(lines, list)
+        self._parser.lines = []
+        self.complete += len(lines)
+        return lines
+
+
+def _snapshot(lines: MutableSequenceNoSlice) -> Iterable[str]:
+    """A copy of the lines which can be written on another thread while
+    editing continues.
+    """
+    if isinstance(lines, (ChunkedLines, CompactLines, MappedLines)):
+        return lines.snapshot()
+    else:
+        return tuple(lines)
+
+
+def _write_atomically(
+        filename: str,
+        lines: Iterable[str],
+        nl: str,
+        *,
+        mode: int,
+        compression: Optional[str] = None,
+) -> Tuple[int, str]:
+    """Write to a temporary file next to `filename` and rename it into place
+    so `filename` is never left partially written.  The size and sha256 are
+    of the lines before they are compressed.
+    """
+    dirname, basename = os.path.split(filename)
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix=f'.{basename}.')
+    try:
+        with open(fd, 'wb') as bf:
+            if compression is None:
+                size, sha256 = write_lines(bf, lines, nl)
+            else:
+                with open_compressor(bf, compression, filename) as cf:
+                    size, sha256 = write_lines(cf, lines, nl)
+            bf.flush()
+            os.fsync(bf.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, filename)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
+    # make the rename itself durable (not supported by every filesystem)
+    with contextlib.suppress(OSError):
+        dir_fd = os.open(dirname, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    return size, sha256
+
+
+class _Saver:
+    """Writes a snapshot of the lines on a background thread."""
+
+    def __init__(
+            self,
+            filename: str,
+            lines: Iterable[str],
+            nl: str,
+            *,
+            num_lines: int,
+            root: str,
+            compression: Optional[str],
+    ) -> None:
+        # write through symlinks rather than replacing them
+        self._filename = os.path.realpath(filename)
+        self._lines = lines
+        self._nl = nl
+        self._compression = compression
+        # the state of the buffer which is being saved
+        self.num_lines = num_lines
+        self.root = root
+
+        try:
+            self._mode = stat.S_IMODE(os.stat(self._filename).st_mode)
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            self._mode = 0o666 & ~umask
+
+        self.result: Optional[Tuple[str, FileStat]] = None
+        self.exc: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._save, daemon=True)
+        self._thread.start()
+
+    @property
+    def done(self) -> bool:
+        return not self._thread.is_alive()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        self._thread.join(timeout)
+
+    def _save(self) -> None:
+        try:
+            _, sha256 = _write_atomically(
+                self._filename, self._lines, self._nl,
+                mode=self._mode, compression=self._compression,
+            )
+            self.result = (sha256, FileStat.from_path(self._filename))
+        except BaseException as e:
+            self.exc = e
 
 
 class Action:
     def __init__(
             self, *, name: str, spy: ListSpy,
-            start_x: int, start_y: int, start_modified: bool,
-            end_x: int, end_y: int, end_modified: bool,
+            start_x: int, start_y: int,
+            end_x: int, end_y: int,
             final: bool,
     ):
         self.name = name
         self.spy = spy
         self.start_x = start_x
         self.start_y = start_y
-        self.start_modified = start_modified
         self.end_x = end_x
         self.end_y = end_y
-        self.end_modified = end_modified
         self.final = final
+        # the states of the `UndoTree` before and after the action
+        self.before = self.after = 0
+        # of the state after the action
+        self.depth = 0
+        self.time = 0.
 
-    def apply(self, file: 'File') -> 'Action':
-        spy = ListSpy(file.lines)
-        action = Action(
-            name=self.name, spy=spy,
-            start_x=self.end_x, start_y=self.end_y,
-            start_modified=self.end_modified,
-            end_x=self.start_x, end_y=self.start_y,
-            end_modified=self.start_modified,
+    def _apply(
+            self,
+            file: 'File',
+            func: Callable[[MutableSequenceNoSlice], None],
+            x: int,
+            y: int,
+    ) -> None:
+        file._flush_gap()
+        with file._editing():
+            spy = ListSpy(file.lines)
+            func(spy)
+            file.x = x
+            file.y = y
+            file._rehash(spy)
+
+    def undo(self, file: 'File') -> None:
+        self._apply(file, self.spy.undo, self.start_x, self.start_y)
+
+    def redo(self, file: 'File') -> None:
+        self._apply(file, self.spy.redo, self.end_x, self.end_y)
+
+    @property
+    def size(self) -> int:
+        """Approximate number of bytes used, see `UndoStack`."""
+        return sys.getsizeof(self) + self.spy.undo_size
+
+    def record(self) -> Any:
+        """The action as plain data, see `from_record`."""
+        return (
+            self.name, self.start_x, self.start_y, self.end_x, self.end_y,
+            self.before, self.after, self.depth, self.time,
+            self.spy.undo_records(),
+        )
+
+    @classmethod
+    def from_record(cls, record: Any) -> 'Action':
+        (
+            name, start_x, start_y, end_x, end_y,
+            before, after, depth, timestamp,
+            undo_records,
+        ) = record
+        action = cls(
+            name=name, spy=ListSpy.from_undo_records(undo_records),
+            start_x=start_x, start_y=start_y,
+            end_x=end_x, end_y=end_y,
             final=True,
         )
+        action.before, action.after = before, after
+        action.depth, action.time = depth, timestamp
+        return action
+
+
+class UndoStack:
+    """The actions to undo (or redo).  When the actions use more than
+    `memory` bytes the oldest are moved to an `UndoJournal` and loaded back
+    when everything after them was undone.
+
+    The last action may still be continued so it is only measured once
+    another action is pushed.
+    """
+
+    def __init__(self, memory: int) -> None:
+        self.memory = memory
+        self._actions: Deque[Action] = collections.deque()
+        # sizes of all but the last action
+        self._sizes: Deque[int] = collections.deque()
+        self._size = 0
+        self._journal = UndoJournal()
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(<{len(self)} actions>)'
+
+    def __len__(self) -> int:
+        return len(self._journal) + len(self._actions)
+
+    def __getitem__(self, idx: int) -> Action:
+        return self._actions[idx]
+
+    def append(self, action: Action) -> None:
+        if self._actions:
+            size = self._actions[-1].size
+            self._sizes.append(size)
+            self._size += size
+        self._actions.append(action)
+
+        while self._size > self.memory and self._sizes:
+            self._size -= self._sizes.popleft()
+            self._journal.push(self._actions.popleft().record())
+
+    def pop(self) -> Action:
+        action = self._actions.pop()
+        if self._actions:
+            self._size -= self._sizes.pop()
+        elif self._journal:
+            self._actions.append(Action.from_record(self._journal.pop()))
+        return action
+
+    def clear(self) -> None:
+        self._actions.clear()
+        self._sizes.clear()
+        self._size = 0
+        self._journal.clear()
+
+    def load(self, filename: str, sha256: str) -> None:
+        """Continue the history saved for `filename`, if it still has the
+        contents `sha256`.  Only the last action is read.
+        """
+        journal = UndoJournal.open(filename, sha256)
+        if journal:
+            self.clear()
+            self._journal = journal
+            self._actions.append(Action.from_record(journal.pop()))
+
+    def save(self, filename: str, sha256: str) -> None:
+        """Keep the history for when `filename` is opened again with the
+        contents `sha256`.
+        """
+        while self._actions:
+            self._sizes.clear()
+            self._journal.push(self._actions.popleft().record())
+        self._size = 0
+        self._journal.save(filename, sha256)
+        self._journal = UndoJournal()
+
+
+class _State(NamedTuple):
+    parent: int
+    depth: int
+    time: float
+
+
+class UndoTree:
+    """Every state the lines were in, numbered in the order they were made,
+    so that an edit after undoing does not lose what was undone.
+
+    `undo_stack` leads from the current `state` back to the first state and
+    `redo_stack` forward along the branch which was left last.  The redo
+    stacks of the other branches are kept by the state they start from.
+
+    States every `CHECKPOINT_INTERVAL` actions deep keep a snapshot of the
+    lines (which shares the line strings with the buffer), `go_to` a distant
+    state only applies the actions after the checkpoint closest to it.  The
+    snapshots are limited to `memory` bytes, the oldest are dropped first.
+    """
+
+    def __init__(self, memory: int) -> None:
+        self.memory = memory
+        self.undo_stack = UndoStack(memory)
+        self.redo_stack = UndoStack(memory)
+        self.state = 0
+        self._states = {0: _State(-1, 0, time.time())}
+        self._next = 1
+        self._branches: Dict[int, List[UndoStack]] = {}
+        self._checkpoints: Dict[int, Tuple[str, ...]] = {}
+        self._checkpoints_size = 0
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(<{len(self._states)} states>)'
+
+    def _register(self, action: Action) -> None:
+        state = _State(action.before, action.depth, action.time)
+        self._states.setdefault(action.after, state)
+
+    def finalize(self, lines: MutableSequenceNoSlice) -> None:
+        """The last action will not be continued, `lines` must be in the
+        current state.
+        """
+        if self.undo_stack:
+            self.undo_stack[-1].final = True
+            self.undo_stack[-1].spy.seal(lines)
+
+    def _checkpoint(self, lines: MutableSequenceNoSlice) -> None:
+        if (
+                self._states[self.state].depth % CHECKPOINT_INTERVAL or
+                self.state in self._checkpoints or
+                # other lines would have to be decoded to be snapshotted
+                not isinstance(lines, (list, ChunkedLines))
+        ):
+            return
 
-        self.spy.undo(spy)
-        file.x = self.start_x
-        file.y = self.start_y
-        file.modified = self.start_modified
+        snapshot = tuple(lines)
+        size = sys.getsizeof(snapshot)
+        if size > self.memory:
+            return
+        self._checkpoints[self.state] = snapshot
+        self._checkpoints_size += size
+        while self._checkpoints_size > self.memory:
+            oldest = self._checkpoints.pop(next(iter(self._checkpoints)))
+            self._checkpoints_size -= sys.getsizeof(oldest)
+
+    def leave(self, file: 'File') -> None:
+        """Called before the lines leave the current state."""
+        file._wait_for_edit()
+        file._flush_gap()
+        self.finalize(file.lines)
+        # the lines of a stream are still appended to
+        if not file._streaming:
+            self._checkpoint(file.lines)
+
+    def push(self, action: Action) -> None:
+        """A new action was made from the current state (after `leave`), what
+        could be redone is kept as another branch.
+        """
+        if self.redo_stack:
+            self._branches.setdefault(self.state, []).append(self.redo_stack)
+            self.redo_stack = UndoStack(self.memory)
+
+        action.before, action.after = self.state, self._next
+        action.depth = self._states[self.state].depth + 1
+        action.time = time.time()
+        self._next += 1
+        self._register(action)
+        self.undo_stack.append(action)
+        self.state = action.after
+
+    def _pop_undo(self) -> Action:
+        action = self.undo_stack.pop()
+        # the states of a history from another session are only known
+        # once they are undone
+        if self.undo_stack:
+            self._register(self.undo_stack[-1])
+        else:
+            root = _State(-1, action.depth - 1, action.time)
+            self._states.setdefault(action.before, root)
+        self.redo_stack.append(action)
+        self.state = action.before
+        return action
 
+    def _pop_redo(self, child: int) -> Action:
+        if not self.redo_stack or self.redo_stack[-1].after != child:
+            branches = self._branches.setdefault(self.state, [])
+            if self.redo_stack:
+                branches.append(self.redo_stack)
+            self.redo_stack, = (b for b in branches if b[-1].after == child)
+            branches.remove(self.redo_stack)
+            if not branches:
+                del self._branches[self.state]
+
+        action = self.redo_stack.pop()
+        self.undo_stack.append(action)
+        self.state = action.after
         return action
 
+    def undo(self, file: 'File') -> Optional[Action]:
+        if not self.undo_stack:
+            return None
+        self.leave(file)
+        action = self._pop_undo()
+        action.undo(file)
+        return action
+
+    def redo(self, file: 'File') -> Optional[Action]:
+        if not self.redo_stack:
+            return None
+        self.leave(file)
+        action = self._pop_redo(self.redo_stack[-1].after)
+        action.redo(file)
+        return action
+
+    def find(self, *, changes: int = 0, seconds: float = 0) -> int:
+        """The state `changes` states or `seconds` after the current one
+        (before it when negative), or the closest state which exists.
+        """
+        if seconds:
+            when = self._states[self.state].time + seconds
+            found = [k for k, v in self._states.items() if v.time <= when]
+            return max(found, default=min(self._states))
+
+        target = self.state + changes
+        if changes < 0:
+            return max(
+                (k for k in self._states if k <= target),
+                default=min(self._states),
+            )
+        else:
+            return min(
+                (k for k in self._states if k >= target),
+                default=max(self._states),
+            )
+
+    def _path(self, target: int) -> List[int]:
+        """The states from the current one to `target`."""
+        ancestors = [self.state]
+        while self._states[ancestors[-1]].parent in self._states:
+            ancestors.append(self._states[ancestors[-1]].parent)
+
+        down = []
+        while target not in ancestors:
+            down.append(target)
+            target = self._states[target].parent
+        return ancestors[:ancestors.index(target) + 1] + down[::-1]
+
+    def go_to(self, file: 'File', target: int) -> None:
+        """Undo and redo (along any branch) to the state `target`."""
+        path = self._path(target)
+        # start from the checkpoint closest to the target if it saves
+        # applying enough actions
+        skip = 0
+        for i in range(len(path) - 1, CHECKPOINT_INTERVAL - 1, -1):
+            if path[i] in self._checkpoints:
+                skip = i
+                break
+
+        self.leave(file)
+        for i, state in enumerate(path[1:], 1):
+            undo = state == self._states[self.state].parent
+            if undo:
+                action = self._pop_undo()
+            else:
+                action = self._pop_redo(state)
+
+            if i > skip:
+                if undo:
+                    action.undo(file)
+                else:
+                    action.redo(file)
+            elif i == skip:
+                _restore(file, self._checkpoints[state])
+                if undo:
+                    file.x, file.y = action.start_x, action.start_y
+                else:
+                    file.x, file.y = action.end_x, action.end_y
+
+    def clear(self) -> None:
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self._states = {self.state: _State(-1, 0, time.time())}
+        self._branches.clear()
+        self._checkpoints.clear()
+        self._checkpoints_size = 0
+
+    def load(self, filename: str, sha256: str) -> None:
+        """Continue the history saved for `filename`, see `UndoStack.load`."""
+        self.clear()
+        self.undo_stack.load(filename, sha256)
+        if self.undo_stack:
+            top = self.undo_stack[-1]
+            self.state, self._next = top.after, top.after + 1
+            self._states = {}
+            self._register(top)
+
+    def save(self, filename: str, sha256: str) -> None:
+        """Keep the history leading to the current state, see
+        `UndoStack.save`.  It must be `finalize`d.
+        """
+        self.undo_stack.save(filename, sha256)
+
+
+def _restore(file: 'File', snapshot: Tuple[str, ...]) -> None:
+    """Change the lines of `file` to `snapshot`, only replacing the lines
+    between the parts at the start and end which are the same.
+    """
+    file._hashes()
+    lines = file.lines
+    common = min(len(lines), len(snapshot))
+    start = 0
+    for start, (line, snap) in enumerate(zip(lines, snapshot)):
+        if line != snap:
+            break
+    else:
+        start = common
+    end = 0
+    while (
+            end < common - start and
+            lines[len(lines) - 1 - end] == snapshot[len(snapshot) - 1 - end]
+    ):
+        end += 1
+
+    count = len(lines) - end - start
+    vals = list(snapshot[start:len(snapshot) - end])
+    if count or vals:
+        spy = ListSpy(lines)
+        spy.replace(start, count, vals)
+        file._rehash(spy)
+
 
 def action(func: TCallable) -> TCallable:
     @functools.wraps(func)
     def action_inner(self: 'File', *args: Any, **kwargs: Any) -> Any:
+        # movement at most needs the lines up to a screen past the current one
+        self._wait_for_lines(self.file_y + 2 * curses.LINES)
         self.finalize_previous_action()
         return func(self, *args, **kwargs)
     return cast(TCallable, action_inner)
@@ -139,9 +938,129 @@ def clear_selection(func: TCallable) -> TCallable:
     return cast(TCallable, clear_selection_inner)
 
 
-class Found(NamedTuple):
-    y: int
-    match: Match[str]
+class _MatchIndex:
+    """Every position in the lines `reg` matches at, as `ys` and `xs` sorted
+    by position.  A position is included if searching from any position
+    before it finds it, so matches may overlap.
+
+    The changes to the lines are only noted (`changed`) as they are made,
+    `update` applies them before the index is used by searching only the
+    lines which changed.  `version` is the `File.version` of the lines the
+    index is for, including the noted changes.
+    """
+
+    def __init__(self, reg: Pattern[str], version: int) -> None:
+        self.reg = reg
+        self.version = version
+        self.ys = array('q')
+        self.xs = array('q')
+        self._pending: List[Tuple[int, int, int]] = []
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.reg!r}, <{len(self)} matches>)'
+
+    def __len__(self) -> int:
+        return len(self.ys)
+
+    def _search(
+            self,
+            lines: MutableSequenceNoSlice,
+            ys: Iterable[int],
+    ) -> bool:
+        """Add the matches of the lines `ys` (in order) at the end, returns
+        whether the index is still small enough.
+        """
+        for y, x in matches(lines, self.reg, ys):
+            self.ys.append(y)
+            self.xs.append(x)
+            if len(self.ys) > MATCH_INDEX_MAX:
+                return False
+        return True
+
+    @classmethod
+    def build(
+            cls,
+            reg: Pattern[str],
+            lines: MutableSequenceNoSlice,
+            version: int,
+            candidates: Optional[List[int]],
+    ) -> Optional['_MatchIndex']:
+        """The index of all of the lines, `candidates` are the only lines
+        which may match.  `None` when there are too many matches.
+        """
+        index = cls(reg, version)
+        if candidates is None:
+            ys: Iterable[int] = range(len(lines))
+        else:
+            ys = candidates
+        if index._search(lines, ys):
+            return index
+        else:
+            return None
+
+    def changed(self, start: int, end: int, delta: int) -> None:
+        """`lines[start:end]` replaced what were `end - delta - start` lines.
+        """
+        if self._pending:
+            prev_start, prev_end, prev_delta = self._pending[-1]
+            # next to or overlapping the previous change (like typing): one
+            # change replacing the lines of both
+            if start <= prev_end and end - delta >= prev_start:
+                start = min(start, prev_start)
+                end = max(end, prev_end + delta)
+                delta += prev_delta
+                self._pending.pop()
+        self._pending.append((start, end, delta))
+        self.version += 1
+        if len(self._pending) > MATCH_INDEX_MAX_CHANGES:
+            self.version = -1  # rebuilt instead
+
+    def update(self, lines: MutableSequenceNoSlice) -> bool:
+        """Apply the changes, returns whether the index is still small
+        enough.
+        """
+        # the changed lines (in the current lines) which need searching
+        dirty: List[Tuple[int, int]] = []
+        for start, end, delta in self._pending:
+            old_end = end - delta
+            lo = bisect.bisect_left(self.ys, start)
+            hi = bisect.bisect_left(self.ys, old_end)
+            del self.ys[lo:hi]
+            del self.xs[lo:hi]
+            if delta:
+                self.ys[lo:] = array('q', [y + delta for y in self.ys[lo:]])
+
+            before = [(s, e) for s, e in dirty if e <= start]
+            after = [(s + delta, e + delta) for s, e in dirty if s >= old_end]
+            overlapping = dirty[len(before):len(dirty) - len(after)]
+            dirty_start = min([start, *(s for s, _ in overlapping)])
+            dirty_end = max([end, *(e + delta for _, e in overlapping)])
+            if dirty_start < dirty_end:
+                dirty = [*before, (dirty_start, dirty_end), *after]
+            else:
+                dirty = [*before, *after]
+        self._pending.clear()
+
+        for start, end in dirty:
+            rest = _MatchIndex(self.reg, self.version)
+            if not rest._search(lines, range(start, end)):
+                return False
+            i = bisect.bisect_left(self.ys, start)
+            self.ys[i:i] = rest.ys
+            self.xs[i:i] = rest.xs
+        return len(self.ys) <= MATCH_INDEX_MAX
+
+    def after(self, y: int, x: int) -> Tuple[int, bool]:
+        """The first match after `(y, x)` and whether that wrapped around to
+        the start, there must be a match.
+        """
+        lo = bisect.bisect_left(self.ys, y)
+        hi = bisect.bisect_right(self.ys, y, lo)
+        i = bisect.bisect_right(self.xs, x, lo, hi)
+        if i == len(self.ys):
+            return 0, True
+        else:
+            return i, False
 
 
 class _SearchIter:
@@ -151,10 +1070,15 @@ class _SearchIter:
             reg: Pattern[str],
             *,
             offset: int,
+            candidates: Optional[List[int]] = None,
     ) -> None:
         self.file = file
         self.reg = reg
         self.offset = offset
+        # (sorted) lines which may match, other lines are not searched
+        self.candidates = candidates
+        # patterns containing a newline are searched for across lines
+        self.multiline = is_multiline(reg)
         self.wrapped = False
         self._start_x = file.x + offset
         self._start_y = file.y
@@ -162,65 +1086,249 @@ class _SearchIter:
     def __iter__(self) -> '_SearchIter':
         return self
 
-    def _stop_if_past_original(self, y: int, match: Match[str]) -> Found:
+    def _stop_if_past_original(self, found: Found) -> Found:
         if (
                 self.wrapped and (
-                    y > self._start_y or
-                    y == self._start_y and match.start() >= self._start_x
+                    found.y > self._start_y or
+                    found.y == self._start_y and found.x >= self._start_x
                 )
         ):
             raise StopIteration()
-        return Found(y, match)
+        return found
+
+
+    def _next_multiline(self, y: int, x: int) -> Found:
+        found = search_multiline(self.file.lines, self.reg, y, x)
+        if found is None and not self.wrapped:
+            self.wrapped = True
+            found = search_multiline(self.file.lines, self.reg, 0, 0)
+        if found is None:
+            raise StopIteration()
+        return self._stop_if_past_original(found)
 
-    def __next__(self) -> Tuple[int, Match[str]]:
+    def __next__(self) -> Found:
         x = self.file.x + self.offset
         y = self.file.y
 
+        if self.multiline:
+            return self._next_multiline(y, x)
+
         match = self.reg.search(self.file.lines[y], x)
         if match:
-            return self._stop_if_past_original(y, match)
+            found = Found(y, match.start(), y, match.end(), match)
+            return self._stop_if_past_original(found)
 
         if self.wrapped:
-            for line_y in range(y + 1, self._start_y + 1):
-                match = self.reg.search(self.file.lines[line_y])
-                if match:
-                    return self._stop_if_past_original(line_y, match)
+            found = self._search_lines(y + 1, self._start_y + 1)
         else:
-            for line_y in range(y + 1, len(self.file.lines)):
-                match = self.reg.search(self.file.lines[line_y])
-                if match:
-                    return self._stop_if_past_original(line_y, match)
+            found = self._search_lines(y + 1, len(self.file.lines))
+            if found is None:
+                self.wrapped = True
+                found = self._search_lines(0, self._start_y + 1)
 
-            self.wrapped = True
+        if found is None:
+            raise StopIteration()
+        return self._stop_if_past_original(found)
 
-            for line_y in range(0, self._start_y + 1):
-                match = self.reg.search(self.file.lines[line_y])
-                if match:
-                    return self._stop_if_past_original(line_y, match)
+    def _search_lines(self, start: int, end: int) -> Optional[Found]:
+        """The first match in `lines[start:end]`."""
+        return search_lines(self.file.lines, self.reg, self._ys(start, end))
 
-        raise StopIteration()
+    def replacements(
+            self,
+            found: Found,
+            replace: str,
+    ) -> Generator[Replacement, None, None]:
+        """Replacing `found` and the matches after it which iterating would
+        find, but not overlapping (see `finditer`).  They are in order in
+        the lines: the ones after wrapping around (before `found`) first.
+
+        The lines where every match is replaced are replaced at once (see
+        `sub_lines`) instead of each match.
+        """
+        lines, reg = self.file.lines, self.reg
+        # expanding parses `replace` each time, the same text expands the
+        # same so each is only expanded once
+        expanded: Dict[Tuple[Optional[str], ...], str] = {}
+
+        def _found_between(
+                start: Tuple[int, int],
+                end: Tuple[int, int],
+                stop: Optional[Tuple[int, int]],
+        ) -> Generator[Replacement, None, None]:
+            for match_found in finditer(lines, reg, start, end):
+                match_end = (match_found.end_y, match_found.end_x)
+                if stop is not None and match_end > stop:
+                    return
+                key = (match_found.match[0], *match_found.match.groups())
+                if key not in expanded:
+                    expanded[key] = match_found.match.expand(replace)
+                yield Replacement(*match_found[:4], expanded[key], 1)
+
+        def _between(
+                start: Tuple[int, int],
+                end: Tuple[int, int],
+                stop: Optional[Tuple[int, int]] = None,
+        ) -> Generator[Replacement, None, None]:
+            """The matches starting from `start` and before `end`, which
+            end by `stop`.
+            """
+            if self.multiline:
+                yield from _found_between(start, end, stop)
+                return
+
+            start_y, start_x = start
+            end_y, end_x = end
+            if start_x:
+                first_end = min(end, (start_y + 1, 0))
+                yield from _found_between(start, first_end, stop)
+                start_y += 1
+            if start_y < end_y:
+                yield from sub_lines(lines, reg, replace, start_y, end_y)
+            if end_x and start_y <= end_y:
+                yield from _found_between((end_y, 0), end, stop)
+
+        pos = (found.y, found.x)
+        start = (self._start_y, self._start_x)
+        if self.wrapped:
+            yield from _between(pos, start)
+        else:
+            # the matches before the search started cannot reach `found`
+            yield from _between((0, 0), start, stop=pos)
+            yield from _between(pos, (len(lines), 0))
+
+    def _ys(self, start: int, end: int) -> Iterable[int]:
+        if self.candidates is None:
+            return range(start, end)
+        else:
+            lo = bisect.bisect_left(self.candidates, start)
+            hi = bisect.bisect_left(self.candidates, end)
+            return map(self.candidates.__getitem__, range(lo, hi))
 
 
 class File:
-    def __init__(self, filename: Optional[str]) -> None:
+    def __init__(
+            self,
+            filename: Optional[str],
+            *,
+            compact_lines: bool = False,
+            view: bool = False,
+            follow: bool = False,
+            stream: Optional[BinaryIO] = None,
+            undo_memory: int = UNDO_MEMORY,
+    ) -> None:
         self.filename = filename
+        # read instead of `filename`, see `_Loader`
+        self.stream = stream
+        self.compact_lines = compact_lines
+        # read-only, see `ViewLines`
+        self.view = view
+        # append what is written to the file, see `_Follower`
+        self.following = follow
         self.modified = False
         self.lines: MutableSequenceNoSlice = []
         self.nl = '\n'
+        # how the file is compressed on disk, see `detect_compression`
+        self.compression: Optional[str] = None
         self.file_y = self.y = self.x = self.x_hint = 0
         self.sha256: Optional[str] = None
-        self.undo_stack: List[Action] = []
-        self.redo_stack: List[Action] = []
+        # the file on disk when it was loaded or saved (`None` if new)
+        self.stat: Optional[FileStat] = None
+        # digests of the lines, built before they are first edited
+        self._hash_tree: Optional[HashTree] = None
+        # `hash_root` of the file on disk (`None` if saving would change it)
+        self._saved_root: Optional[str] = None
+        self.history = UndoTree(undo_memory)
         self.select_start: Optional[Tuple[int, int]] = None
-
-    def ensure_loaded(self, status: Status) -> None:
+        self._loader: Optional[_Loader] = None
+        self._saver: Optional[_Saver] = None
+        self._follower: Optional[_Follower] = None
+        # the current line while it is being edited, see `_edit_gap`
+        self._gap: Optional[GapBuffer] = None
+        # the changes since the file was saved, see `RecoveryJournal`
+        self._recovery: Optional[RecoveryJournal] = None
+        # changes left by a session which did not exit, see `recover`
+        self._recoverable: Optional[List[Change]] = None
+        # incremented whenever the lines change
+        self.version = 0
+        # where the last search matches, see `_MatchIndex`
+        self._matches: Optional[_MatchIndex] = None
+
+    def ensure_loaded(self, status: Status, margin: Margin) -> None:
         if self.lines:
             return
 
-        if self.filename is not None and os.path.isfile(self.filename):
-            with open(self.filename, newline='') as f:
-                self.lines, self.nl, mixed, self.sha256 = get_lines(f)
+        self._load(status, margin)
+        self._find_recovery()
+
+    def _load(self, status: Status, margin: Margin) -> None:
+        if self.stream is not None:
+            # drawn as the lines arrive, a stream may not end soon
+            self._loader = _Loader(
+                self.stream, None, compact=self.compact_lines,
+            )
+            self.lines = self._loader.lines
+            self.stream = None
+            self.sha256 = hashlib.sha256(b'').hexdigest()
+            return
+        elif self.filename is not None and os.path.isfile(self.filename):
+            size = os.path.getsize(self.filename)
+            self.compression = detect_compression(self.filename)
+            if (
+                    self.compression is not None and
+                    size >= COMPRESSED_LOAD_THRESHOLD
+            ):
+                # the decompressed size is not known up front
+                bf = open_decompressed(self.filename, self.compression)
+                self.stat = FileStat.from_stat(os.fstat(bf.fileno()))
+                self._loader = _Loader(
+                    bf, None, compact=self.compact_lines,
+                )
+                self.lines = self._loader.lines
+                self._loader.wait_for(margin.body_lines)
+                return
+            elif self.compression is not None:
+                with open_decompressed(self.filename, self.compression) as bf:
+                    self.stat = FileStat.from_stat(os.fstat(bf.fileno()))
+                    compact = self.compact_lines
+                    loaded = get_lines_bytes(bf, compact=compact)
+                    self.lines, self.nl, mixed, self.sha256 = loaded
+            elif self.view and size:
+                with open(self.filename, 'rb') as bf:
+                    self.stat = FileStat.from_stat(os.fstat(bf.fileno()))
+                    self.lines, self.nl = get_lines_view(bf)
+                return
+            elif self.following:
+                self._follower = _Follower(self.filename)
+                self.lines = ['']
+                self._read_followed()
+                self.stat = self._follower.stat
+                self.sha256 = self._follower.sha256
+                self.nl, mixed = self._follower.newlines()
+                # like `tail -f`, start at the end
+                self._follow_end(margin)
+            elif size >= MAPPED_LINES_THRESHOLD:
+                with open(self.filename, 'rb') as bf:
+                    self.stat = FileStat.from_stat(os.fstat(bf.fileno()))
+                    loaded = get_lines_mapped(bf)
+                    self.lines, self.nl, mixed, self.sha256 = loaded
+            elif size >= PROGRESSIVE_LOAD_THRESHOLD:
+                bf = open(self.filename, 'rb')
+                self.stat = FileStat.from_stat(os.fstat(bf.fileno()))
+                self._loader = _Loader(
+                    bf, size, compact=self.compact_lines,
+                )
+                self.lines = self._loader.lines
+                self._loader.wait_for(margin.body_lines)
+                return
+            else:
+                with open(self.filename, 'rb') as bf:
+                    self.stat = FileStat.from_stat(os.fstat(bf.fileno()))
+                    compact = self.compact_lines
+                    loaded = get_lines_bytes(bf, compact=compact)
+                    self.lines, self.nl, mixed, self.sha256 = loaded
         else:
+            self.following = False
             if self.filename is not None:
                 if os.path.lexists(self.filename):
                     status.update(f'{self.filename!r} is not a file')
@@ -230,9 +1338,342 @@ class File:
             sio = io.StringIO('')
             self.lines, self.nl, mixed, self.sha256 = get_lines(sio)
 
+        self._use_chunked_lines_if_large()
         if mixed:
             status.update(f'mixed newlines will be converted to {self.nl!r}')
             self.modified = True
+        self._load_undo_history()
+
+    def _use_chunked_lines_if_large(self) -> None:
+        if (
+                isinstance(self.lines, list) and
+                len(self.lines) >= CHUNKED_LINES_THRESHOLD
+        ):
+            self.lines = ChunkedLines(self.lines)
+
+    @property
+    def loading_progress(self) -> Optional[str]:
+        if self._loader is None:
+            return None
+        else:
+            return self._loader.progress
+
+    @property
+    def busy(self) -> bool:
+        return (
+            self._loader is not None or
+            self._saver is not None or
+            self.following
+        )
+
+    def _wait_for_lines(self, n: Optional[int] = None) -> None:
+        """While loading in the background, wait until at least `n` lines are
+        available (or the whole file if `n` is None).
+        """
+        if self._loader is not None:
+            # a stream may not end soon, only wait when all lines are needed
+            if n is not None and self._loader.size is None:
+                return
+            self._loader.wait_for(n)
+            if self._loader.result is not None:
+                _, _, mixed, sha256 = self._loader.result
+                self.modified = self.modified or mixed
+                # like a new file, a stream has nothing on disk yet
+                if self.stat is not None:
+                    self.sha256 = sha256
+
+    @property
+    def _streaming(self) -> bool:
+        """Whether lines are still read from a stream (`babi -`)."""
+        return self._loader is not None and self.stat is None
+
+    def _wait_for_edit(self) -> None:
+        """Wait for the lines an edit may change.  The lines of a stream are
+        edited while it is read: only the lines up to the one after the
+        cursor (or the selection) are waited for and the edit pauses the
+        reading, so the lines are only appended after it.
+        """
+        if self._loader is not None and self._streaming:
+            y = self.y
+            if self.select_start is not None:
+                y = max(y, self.select_start[0])
+            # these lines are not the blank line which is appended to
+            self._loader.wait_for(y + 3)
+        else:
+            self._wait_for_lines()
+
+    @contextlib.contextmanager
+    def _editing(self) -> Generator[None, None, None]:
+        """Around changing the lines, they are hashed before (see
+        `_edited`) or the reading of a stream is paused.
+        """
+        if self._loader is not None and self._streaming:
+            with self._loader.paused():
+                yield
+        else:
+            self._hashes()
+            yield
+
+    def poll(self, status: Status) -> None:
+        if self._loader is not None and self._loader.done:
+            self._wait_for_lines()
+            assert self._loader.result is not None
+            _, self.nl, mixed, _ = self._loader.result
+            self._loader = None
+            self._use_chunked_lines_if_large()
+            if mixed:
+                status.update(
+                    f'mixed newlines will be converted to {self.nl!r}',
+                )
+            self._load_undo_history()
+
+        if self._saver is not None and self._saver.done:
+            saver, self._saver = self._saver, None
+            self._finish_save(saver, status)
+
+    def _read_followed(self) -> bool:
+        """Append the lines written to the file since it was last read,
+        returns whether there were any.
+        """
+        assert self._follower is not None
+        if not self._follower.read():
+            return False
+
+        spy = ListSpy(self.lines)
+        # replace the previously unterminated line and the blank line
+        while len(spy) > self._follower.complete:
+            spy.pop()
+        for line in self._follower.take_lines():
+            spy.append(line)
+        if self._follower.partial:
+            spy.append(self._follower.partial)
+        _restore_lines_eof_invariant(spy)
+
+        self.stat = self._follower.stat
+        self.sha256 = self._follower.sha256
+        self.nl, _ = self._follower.newlines()
+        changes = spy.take_changes()
+        if changes is not None:
+            self._changed(*changes)
+        if self._hash_tree is not None and changes is not None:
+            self._hash_tree.update(self.lines, *changes)
+            self._saved_root = self.hash_root
+        return True
+
+    def poll_follow(self, status: Status, margin: Margin) -> None:
+        # appending is paused while there are edits which are not saved
+        if not self.following or self.modified:
+            return
+        assert self._follower is not None
+
+        if self._follower.replaced():
+            self.stop_following()
+            status.update('file was truncated or replaced, stopped following')
+            return
+
+        at_end = self.y == len(self.lines) - 1
+        if self._read_followed():
+            self._use_chunked_lines_if_large()
+            # the actions may refer to lines at the end which were replaced
+            self.history.clear()
+            if at_end:
+                self._follow_end(margin)
+
+    def _follow_end(self, margin: Margin) -> None:
+        """Move to the end, keeping it at the bottom of the screen."""
+        self.y = len(self.lines) - 1
+        self.x = self.x_hint = 0
+        self.file_y = max(self.file_y, self.y - margin.body_lines + 1)
+
+    def toggle_following(self, status: Status) -> None:
+        if self._follower is None:
+            status.update('not following (open the file with --follow)')
+        elif self.following:
+            self.following = False
+            status.update('stopped following')
+        else:
+            self.following = True
+            status.update('following')
+
+    def stop_following(self) -> None:
+        self.following = False
+        if self._follower is not None:
+            self._follower.close()
+            self._follower = None
+
+    def wait_until_loaded(self, status: Status) -> None:
+        self._wait_for_lines()
+        self.poll(status)
+
+    def save(self, status: Status) -> None:
+        """Write the lines to `self.filename`, finishing in the background
+        if it takes a while.  Editing can continue in the meantime.
+        """
+        assert self.filename is not None
+        self._saver = _Saver(
+            self.filename, _snapshot(self.lines), self.nl,
+            num_lines=len(self.lines) - 1,
+            root=self.hash_root,
+            compression=self.compression,
+        )
+        self._saver.wait(SAVE_BLOCK_SECONDS)
+        self.poll(status)
+        if self._saver is not None:
+            status.update('saving...')
+
+    def wait_until_saved(self, status: Status) -> None:
+        if self._saver is not None:
+            self._saver.wait()
+            self.poll(status)
+
+    def _finish_save(self, saver: _Saver, status: Status) -> None:
+        if saver.exc is not None:
+            if not isinstance(saver.exc, OSError):  # pragma: no cover (bugs)
+                raise saver.exc
+            status.update(f'error saving: {saver.exc}')
+            return
+
+        assert saver.result is not None
+        self.sha256, self.stat = saver.result
+        lines = 'lines' if saver.num_lines != 1 else 'line'
+        status.update(f'saved! ({saver.num_lines} {lines} written)')
+
+        # the lines may have been edited while saving
+        self._saved_root = saver.root
+        self._update_modified()
+        if self._recovery is not None:
+            self._recovery.close()
+            self._recovery = None
+            if self.modified:
+                self._record_change(0, len(self.lines), saver.num_lines + 1)
+        # the file was replaced, anything still appended to it is lost
+        self.stop_following()
+
+    def _undo_history_saved(self) -> bool:
+        """whether the undo history applies to the file on disk"""
+        return (
+            self.filename is not None and
+            self.stat is not None and
+            self.sha256 is not None and
+            self._saver is None and
+            not self.view and
+            not self.following and
+            not self.modified
+        )
+
+    def _load_undo_history(self) -> None:
+        if self._undo_history_saved():
+            assert self.filename is not None and self.sha256 is not None
+            self.history.load(self.filename, self.sha256)
+
+    def save_undo_history(self) -> None:
+        """Keep the undo history for the next time the file is opened,
+        unless the file was changed without being saved.
+        """
+        if self._undo_history_saved():
+            assert self.filename is not None and self.sha256 is not None
+            self.history.finalize(self.lines)
+            self.history.save(self.filename, self.sha256)
+
+    def close(self) -> None:
+        """Called once the file is no longer edited, after it was saved or
+        its changes were discarded.
+        """
+        self.save_undo_history()
+        if self._recovery is not None:
+            self._recovery.close()
+            self._recovery = None
+
+    def _find_recovery(self) -> None:
+        if (
+                self.filename is not None and
+                not self.view and
+                not self.following and
+                recovery_exists(self.filename)
+        ):
+            # the changes apply to the contents once they are loaded
+            self._wait_for_lines()
+            if self.sha256 is not None:
+                changes = load_recovery(self.filename, self.sha256)
+                self._recoverable = changes or None
+
+    @property
+    def recoverable(self) -> bool:
+        return self._recoverable is not None
+
+    def discard_recovery(self) -> None:
+        assert self.filename is not None
+        self._recoverable = None
+        remove_recovery(self.filename)
+
+    @edit_action('recover', final=True)
+    def recover(self, margin: Margin) -> None:
+        """Replay the changes of a session which did not exit."""
+        assert isinstance(self.lines, ListSpy)
+        assert self._recoverable is not None
+        changes, self._recoverable = self._recoverable, None
+        self.lines.replay(changes, ChunkedLines(self.lines))
+        last_start, _, _ = changes[-1]
+        self.y = min(last_start, len(self.lines) - 1)
+        self.x = self.x_hint = 0
+        self.scroll_screen_if_needed(margin)
+
+    def _record_change(self, start: int, end: int, old_count: int) -> None:
+        """Keep `lines[start:end]`, which replaced `old_count` lines, in
+        case the session ends without saving.
+        """
+        if self._recovery is None:
+            if self.filename is None or self.sha256 is None:
+                return
+            self._recovery = RecoveryJournal(self.filename, self.sha256)
+        lines = [self.lines[i] for i in range(start, end)]
+        self._recovery.record(start, old_count, lines)
+
+    @property
+    def hash_root(self) -> str:
+        """The digest of the lines as they would be saved, cheap to compare
+        with `HashTree.root` of other contents.
+        """
+        return self._hashes().root(self.nl)
+
+    def _hashes(self) -> HashTree:
+        if self._hash_tree is None:
+            self._wait_for_lines()
+            self._hash_tree = HashTree(self.lines)
+            # not edited yet: these are the contents on disk unless loading
+            # them changed something (mixed newlines)
+            if not self.modified:
+                self._saved_root = self._hash_tree.root(self.nl)
+        return self._hash_tree
+
+    def _update_modified(self) -> None:
+        # the line in the gap buffer is only hashed once it is flushed
+        self.modified = (
+            self._gap is not None or self.hash_root != self._saved_root
+        )
+
+    def _rehash(self, spy: ListSpy) -> None:
+        changes = spy.take_changes()
+        if changes is not None:
+            self._edited(*changes)
+
+    def _edited(self, start: int, end: int, delta: int) -> None:
+        """`lines[start:end]` were edited, see `_changed`."""
+        # the lines of a stream are only hashed once it was read
+        if self._hash_tree is None:
+            self.modified = True
+        else:
+            self._hash_tree.update(self.lines, start, end, delta)
+            self._update_modified()
+        self._record_change(start, end, end - delta - start)
+        self._changed(start, end, delta)
+
+    def _changed(self, start: int, end: int, delta: int) -> None:
+        """`lines[start:end]` replaced what were `end - delta - start` lines.
+        """
+        self.version += 1
+        if self._matches is not None:
+            self._matches.changed(start, end, delta)
 
     def __repr__(self) -> str:
         attrs = ',\n    '.join(f'{k}={v!r}' for k, v in self.__dict__.items())
@@ -368,12 +1809,14 @@ class File:
 
     @action
     def ctrl_end(self, margin: Margin) -> None:
+        self._wait_for_lines()
         self.x = self.x_hint = 0
         self.y = len(self.lines) - 1
         self.scroll_screen_if_needed(margin)
 
     @action
     def go_to_line(self, lineno: int, margin: Margin) -> None:
+        self._wait_for_lines()
         self.x = self.x_hint = 0
         if lineno == 0:
             self.y = 0
@@ -386,26 +1829,92 @@ class File:
         self.scroll_screen_if_needed(margin)
 
     @action
+    def _match_index(
+            self,
+            reg: Pattern[str],
+            candidates: Optional[List[int]],
+    ) -> Optional[_MatchIndex]:
+        index = self._matches
+        if (
+                index is None or
+                index.reg != reg or
+                index.version != self.version or
+                not index.update(self.lines)
+        ):
+            args = (reg, self.lines, self.version, candidates)
+            index = self._matches = _MatchIndex.build(*args)
+        return index
+
     def search(
             self,
             reg: Pattern[str],
             status: Status,
             margin: Margin,
+            *,
+            candidates: Optional[List[int]] = None,
+            count: bool = True,
     ) -> None:
-        search = _SearchIter(self, reg, offset=1)
-        try:
-            line_y, match = next(iter(search))
-        except StopIteration:
-            status.update('no matches')
+        """Move to the next match, `candidates` are the only lines (other
+        than the current one) which may match, see `lines_containing`.
+
+        With `count` the matches are indexed so the status shows which of
+        them this is, see `_MatchIndex`.  Matches across lines (see
+        `search_multiline`) are not indexed.
+        """
+        self._wait_for_lines()
+        found: Optional[Tuple[int, int]] = None
+        msg: Optional[str] = None
+        search = _SearchIter(self, reg, offset=1, candidates=candidates)
+        if count and not search.multiline:
+            index = self._match_index(reg, candidates)
         else:
-            if line_y == self.y and match.start() == self.x:
-                status.update('this is the only occurrence')
-            else:
+            index = None
+        if index is not None:
+            if index:
+                i, wrapped = index.after(self.y, self.x)
+                found = (index.ys[i], index.xs[i])
+                msg = f'match {i + 1} of {len(index)}'
+                if wrapped:
+                    msg = f'search wrapped, {msg}'
+        else:
+            for match_found in search:
+                found = (match_found.y, match_found.x)
                 if search.wrapped:
-                    status.update('search wrapped')
-                self.y = line_y
-                self.x = self.x_hint = match.start()
-                self.scroll_screen_if_needed(margin)
+                    msg = 'search wrapped'
+                break
+
+        if found is None:
+            status.update('no matches')
+        elif found == (self.y, self.x):
+            status.update('this is the only occurrence')
+        else:
+            if msg is not None:
+                status.update(msg)
+            self.y, self.x = found
+            self.x_hint = self.x
+            self.scroll_screen_if_needed(margin)
+
+    def lines_containing(
+            self,
+            s: str,
+            ys: Optional[List[int]] = None,
+            *,
+            ignore_case: bool = False,
+    ) -> List[int]:
+        """The lines which contain `s`, out of `ys` if given.  Ignoring case
+        the lines are compared casefolded, which may include extra lines.
+        """
+        self._wait_for_lines()
+        lines: Iterable[Tuple[int, str]]
+        if ys is None:
+            lines = enumerate(self.lines)
+        else:
+            lines = ((y, self.lines[y]) for y in ys)
+        if ignore_case:
+            s = s.casefold()
+            return [y for y, line in lines if s in line.casefold()]
+        else:
+            return [y for y, line in lines if s in line]
 
     @clear_selection
     def replace(
@@ -414,37 +1923,50 @@ class File:
             reg: Pattern[str],
             replace: str,
     ) -> None:
+        self._wait_for_lines()
         self.finalize_previous_action()
 
         def highlight() -> None:
+            # only the first line of a match across lines is highlighted
+            first_line, _, _ = found.match[0].partition('\n')
             self.highlight(
                 screen.stdscr, screen.margin,
-                y=self.y, x=self.x, n=len(match[0]),
+                y=self.y, x=self.x, n=len(first_line),
                 color=HIGHLIGHT, include_edge=True,
             )
 
         count = 0
         res: Union[str, PromptResult] = ''
         search = _SearchIter(self, reg, offset=0)
-        for line_y, match in search:
-            self.y = line_y
-            self.x = self.x_hint = match.start()
+        for found in search:
+            self.y = found.y
+            self.x = self.x_hint = found.x
             self.scroll_screen_if_needed(screen.margin)
-            if res != 'a':  # make `a` replace the rest of them
-                screen.draw()
-                highlight()
-                with screen.resize_cb(highlight):
-                    res = screen.quick_prompt(
-                        'replace [y(es), n(o), a(ll)]?', 'yna',
-                    )
-            if res in {'y', 'a'}:
+            screen.draw()
+            highlight()
+            with screen.resize_cb(highlight):
+                res = screen.quick_prompt(
+                    'replace [y(es), n(o), a(ll)]?', 'yna',
+                )
+            if res == 'a':
+                with self.edit_action_context('replace', final=True):
+                    count += self._replace_all(search, found, replace)
+                self.scroll_screen_if_needed(screen.margin)
+                break
+            elif res == 'y':
                 count += 1
                 with self.edit_action_context('replace', final=True):
-                    replaced = match.expand(replace)
-                    line = screen.file.lines[line_y]
-                    line = line[:match.start()] + replaced + line[match.end():]
-                    screen.file.lines[line_y] = line
-                search.offset = len(replaced)
+                    replaced = found.match.expand(replace)
+                    if found.y == found.end_y and '\n' not in replaced:
+                        line = self.lines[found.y]
+                        line = line[:found.x] + replaced + line[found.end_x:]
+                        self.lines[found.y] = line
+                        search.offset = len(replaced)
+                    else:
+                        self._replace_lines(found, replaced)
+                        # continue after the replacement, but not at the
+                        # same position after replacing an empty match
+                        search.offset = 0 if found.match[0] else 1
             elif res == 'n':
                 search.offset = 1
             else:
@@ -457,6 +1979,88 @@ class File:
             occurrences = 'occurrence' if count == 1 else 'occurrences'
             screen.status.update(f'replaced {count} {occurrences}')
 
+    def _replace_all(
+            self,
+            search: _SearchIter,
+            found: Found,
+            replace: str,
+    ) -> int:
+        """Replace `found` and the rest of the matches (see
+        `_SearchIter.replacements`) in a single pass, returns how many.
+
+        Matches sharing a line are replaced together so every changed line
+        is written once.  The cursor stays at the replacement of `found`.
+        """
+        # (start_y, end_y, end_x, parts) of the lines rewritten by each run
+        # of matches sharing lines, the parts of the new lines are joined
+        regions: List[Tuple[int, int, int, List[str]]] = []
+        # the region of the replacement of `found` and its offset there
+        cursor = (0, 0)
+        count = 0
+        for replacement in search.replacements(found, replace):
+            count += replacement.count
+            line = self.lines[replacement.y]
+            if regions and regions[-1][1] == replacement.y:
+                start_y, _, end_x, parts = regions.pop()
+                parts.append(line[end_x:replacement.x])
+            else:
+                start_y, parts = replacement.y, [line[:replacement.x]]
+            if replacement[:2] == found[:2]:
+                cursor = (len(regions), sum(len(part) for part in parts))
+            parts.append(replacement.text)
+            end = (replacement.end_y, replacement.end_x)
+            regions.append((start_y, *end, parts))
+
+        # (start_y, count, new_lines) replacing consecutive lines at once,
+        # the lines of the changes before the cursor's change by `delta`
+        changes: List[Tuple[int, int, List[str]]] = []
+        delta = 0
+        for i, (start_y, end_y, end_x, parts) in enumerate(regions):
+            parts.append(self.lines[end_y][end_x:])
+            text = ''.join(parts)
+            new_lines = text.split('\n')
+            # the lines always end in a blank line
+            if end_y == len(self.lines) - 1 and new_lines[-1]:
+                new_lines.append('')
+            if i == cursor[0]:
+                _, offset = cursor
+                self.y = start_y + delta + text.count('\n', 0, offset)
+                line_start = text.rfind('\n', 0, offset) + 1
+                self.x = self.x_hint = offset - line_start
+            n = end_y + 1 - start_y
+            delta += len(new_lines) - n
+            if changes and sum(changes[-1][:2]) == start_y:
+                prev_y, prev_n, prev_lines = changes[-1]
+                prev_lines.extend(new_lines)
+                changes[-1] = (prev_y, prev_n + n, prev_lines)
+            else:
+                changes.append((start_y, n, new_lines))
+
+        # in reverse so the earlier lines do not move
+        assert isinstance(self.lines, ListSpy), 'outside of an edit action?'
+        for start_y, n, new_lines in reversed(changes):
+            if n == len(new_lines) == 1:
+                self.lines[start_y] = new_lines[0]
+            else:
+                self.lines.replace(start_y, n, new_lines)
+        return count
+
+    def _replace_lines(self, found: Found, replaced: str) -> None:
+        """Replace the match `found` with `replaced`, which may add or
+        remove lines.  The cursor moves to the end of the replacement.
+        """
+        first = self.lines[found.y][:found.x]
+        last = self.lines[found.end_y][found.end_x:]
+        new_lines = f'{first}{replaced}{last}'.split('\n')
+        assert isinstance(self.lines, ListSpy), 'outside of an edit action?'
+        self.y = found.y + len(new_lines) - 1
+        self.x = self.x_hint = len(new_lines[-1]) - len(last)
+        # the lines always end in a blank line
+        if found.end_y == len(self.lines) - 1 and new_lines[-1]:
+            new_lines.append('')
+        count = found.end_y - found.y + 1
+        self.lines.replace(found.y, count, new_lines)
+
     @action
     def page_up(self, margin: Margin) -> None:
         if self.y < margin.body_lines:
@@ -490,29 +2094,44 @@ class File:
         # at the beginning of the line, we join the current line and
         # the previous line
         elif self.x == 0:
+            self._flush_gap()
             victim = self.lines.pop(self.y)
             new_x = len(self.lines[self.y - 1])
             self.lines[self.y - 1] += victim
             self._decrement_y(margin)
             self.x = self.x_hint = new_x
         else:
-            s = self.lines[self.y]
-            self.lines[self.y] = s[:self.x - 1] + s[self.x:]
+            gap = self._edit_gap()
+            if gap is not None:
+                gap.delete(self.x - 1)
+            else:
+                s = self.lines[self.y]
+                self.lines[self.y] = s[:self.x - 1] + s[self.x:]
             self.x = self.x_hint = self.x - 1
 
     @edit_action('delete text', final=False)
     @clear_selection
     def delete(self, margin: Margin) -> None:
+        if self._gap is not None:
+            line_len = len(self._gap)
+        else:
+            line_len = len(self.lines[self.y])
+
         # noop at end of the file
         if self.y == len(self.lines) - 1:
             pass
         # if we're at the end of the line, collapse the line afterwards
-        elif self.x == len(self.lines[self.y]):
+        elif self.x == line_len:
+            self._flush_gap()
             victim = self.lines.pop(self.y + 1)
             self.lines[self.y] += victim
         else:
-            s = self.lines[self.y]
-            self.lines[self.y] = s[:self.x] + s[self.x + 1:]
+            gap = self._edit_gap()
+            if gap is not None:
+                gap.delete(self.x)
+            else:
+                s = self.lines[self.y]
+                self.lines[self.y] = s[:self.x] + s[self.x + 1:]
 
     @edit_action('line break', final=False)
     @clear_selection
@@ -713,22 +2332,49 @@ class File:
     @edit_action('text', final=False)
     @clear_selection
     def c(self, wch: str, margin: Margin) -> None:
-        s = self.lines[self.y]
-        self.lines[self.y] = s[:self.x] + wch + s[self.x:]
+        gap = self._edit_gap()
+        if gap is not None:
+            gap.insert(self.x, wch)
+        else:
+            s = self.lines[self.y]
+            self.lines[self.y] = s[:self.x] + wch + s[self.x:]
         self.x = self.x_hint = self.x + 1
         _restore_lines_eof_invariant(self.lines)
 
+    def _edit_gap(self) -> Optional[GapBuffer]:
+        """Long lines are edited in a `GapBuffer` so typing does not copy the
+        whole line on every keystroke.  Until `_flush_gap` is called,
+        `self.lines[self.y]` is stale.
+        """
+        if self._gap is None:
+            line = self.lines[self.y]
+            if len(line) < GAP_BUFFER_THRESHOLD:
+                return None
+            # record the original line for undo, `_flush_gap` writes back
+            # the edited line once the action is over
+            self.lines[self.y] = line
+            self._gap = GapBuffer(line)
+        return self._gap
+
+    def _flush_gap(self) -> None:
+        if self._gap is not None:
+            self.lines[self.y], self._gap = str(self._gap), None
+            # during an action the line is rehashed once the action is over
+            if not isinstance(self.lines, ListSpy):
+                self._edited(self.y, self.y + 1, 0)
+
     def finalize_previous_action(self) -> None:
         assert not isinstance(self.lines, ListSpy), 'nested edit/movement'
+        self._flush_gap()
         self.select_start = None
-        if self.undo_stack:
-            self.undo_stack[-1].final = True
+        self.history.finalize(self.lines)
 
     def _continue_last_action(self, name: str) -> bool:
+        undo_stack = self.history.undo_stack
         return (
-            bool(self.undo_stack) and
-            self.undo_stack[-1].name == name and
-            not self.undo_stack[-1].final
+            bool(undo_stack) and
+            undo_stack[-1].name == name and
+            not undo_stack[-1].final
         )
 
     @contextlib.contextmanager
@@ -737,37 +2383,34 @@ class File:
             *,
             final: bool,
     ) -> Generator[None, None, None]:
+        self._wait_for_edit()
         continue_last = self._continue_last_action(name)
         if continue_last:
-            spy = self.undo_stack[-1].spy
+            spy = self.history.undo_stack[-1].spy
         else:
-            if self.undo_stack:
-                self.undo_stack[-1].final = True
+            self.history.leave(self)
             spy = ListSpy(self.lines)
 
         before_x, before_line = self.x, self.y
-        before_modified = self.modified
         assert not isinstance(self.lines, ListSpy), 'recursive action?'
         orig, self.lines = self.lines, spy
-        try:
-            yield
-        finally:
-            self.lines = orig
-            self.redo_stack.clear()
-            if continue_last:
-                self.undo_stack[-1].end_x = self.x
-                self.undo_stack[-1].end_y = self.y
-            elif spy.has_modifications:
-                self.modified = True
-                action = Action(
-                    name=name, spy=spy,
-                    start_x=before_x, start_y=before_line,
-                    start_modified=before_modified,
-                    end_x=self.x, end_y=self.y,
-                    end_modified=True,
-                    final=final,
-                )
-                self.undo_stack.append(action)
+        with self._editing():
+            try:
+                yield
+            finally:
+                self.lines = orig
+                self._rehash(spy)
+                if continue_last:
+                    self.history.undo_stack[-1].end_x = self.x
+                    self.history.undo_stack[-1].end_y = self.y
+                elif spy.has_modifications:
+                    action = Action(
+                        name=name, spy=spy,
+                        start_x=before_x, start_y=before_line,
+                        end_x=self.x, end_y=self.y,
+                        final=final,
+                    )
+                    self.history.push(action)
 
     @contextlib.contextmanager
     def select(self) -> Generator[None, None, None]:
@@ -807,9 +2450,13 @@ class File:
         to_display = min(len(self.lines) - self.file_y, margin.body_lines)
         for i in range(to_display):
             line_idx = self.file_y + i
-            line = self.lines[line_idx]
             x = self.x if line_idx == self.y else 0
-            line = scrolled_line(line, x, curses.COLS)
+            if line_idx == self.y and self._gap is not None:
+                l_x = line_x(x, curses.COLS)
+                line = self._gap.substring(l_x, l_x + curses.COLS + 1)
+                line = scrolled_window(line, l_x, curses.COLS)
+            else:
+                line = scrolled_line(self.lines[line_idx], x, curses.COLS)
             stdscr.insstr(i + margin.header, 0, line)
         blankline = ' ' * curses.COLS
         for i in range(to_display, margin.body_lines):
@@ -0,0 +1,67 @@
+from typing import List
+
+
+class GapBuffer:
+    """An editable string for a very long line.
+
+    The contents are `text[:start] + ''.join(inserted) + text[end:]`: typing
+    appends to `inserted` and deleting next to the gap only moves `start` or
+    `end`, so neither copies the line.  Moving the gap to another position
+    rebuilds the text.
+    """
+
+    def __init__(self, text: str) -> None:
+        self._text = text
+        self._start = self._end = len(text)
+        self._inserted: List[str] = []
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({str(self)!r})'
+
+    def __str__(self) -> str:
+        return ''.join((
+            self._text[:self._start],
+            *self._inserted,
+            self._text[self._end:],
+        ))
+
+    def __len__(self) -> int:
+        return self._start + len(self._inserted) + len(self._text) - self._end
+
+    @property
+    def _gap(self) -> int:
+        return self._start + len(self._inserted)
+
+    def _move_gap(self, pos: int) -> None:
+        if pos != self._gap:
+            self._text = str(self)
+            self._start = self._end = pos
+            self._inserted = []
+
+    def insert(self, pos: int, s: str) -> None:
+        self._move_gap(pos)
+        self._inserted.extend(s)
+
+    def delete(self, pos: int) -> None:
+        """Delete the character at `pos`."""
+        if pos == self._gap - 1 and self._inserted:
+            self._inserted.pop()
+        elif pos == self._gap - 1:
+            self._start -= 1
+        else:
+            self._move_gap(pos)
+            self._end += 1
+
+    def substring(self, start: int, end: int) -> str:
+        """`str(self)[start:end]` without building the whole string."""
+        gap = self._gap
+        parts = []
+        if start < self._start:
+            parts.append(self._text[start:min(end, self._start)])
+        if start < gap and end > self._start:
+            inserted_start = max(start - self._start, 0)
+            parts.extend(self._inserted[inserted_start:end - self._start])
+        if end > gap:
+            offset = self._end - gap
+            parts.append(self._text[max(start, gap) + offset:end + offset])
+        return ''.join(parts)
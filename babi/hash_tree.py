@@ -0,0 +1,108 @@
+import bisect
+import hashlib
+import itertools
+import zlib
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+from babi.list_spy import MutableSequenceNoSlice
+
+# a line ends a chunk when its crc32 has this remainder, so chunks average
+# this many lines
+CHUNK_LINES = 64
+
+
+def _ends_chunk(line: str) -> bool:
+    return zlib.crc32(line.encode()) % CHUNK_LINES == CHUNK_LINES - 1
+
+
+def _chunks(lines: List[str]) -> Tuple[List[int], List[bytes]]:
+    ends = itertools.compress(
+        itertools.count(1),
+        map(
+            (CHUNK_LINES - 1).__eq__,
+            map(
+                CHUNK_LINES.__rmod__,
+                map(zlib.crc32, map(str.encode, lines)),
+            ),
+        ),
+    )
+    sizes = []
+    digests = []
+    start = 0
+    for end in itertools.chain(ends, (len(lines),)):
+        if end > start:
+            chunk = '\n'.join(lines[start:end]).encode()
+            sizes.append(end - start)
+            digests.append(hashlib.sha256(chunk).digest())
+            start = end
+    return sizes, digests
+
+
+class HashTree:
+    """Digests of chunks of lines, combined into a single `root`.
+
+    Chunks end after lines picked by their checksum so they only depend on
+    the contents: an edit changes the digests of the chunks around it and
+    the same lines produce the same `root` no matter how they were edited.
+    """
+
+    def __init__(self, lines: Iterable[str]) -> None:
+        self._build(lines)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(<{len(self._sizes)} chunks>)'
+
+    def _build(self, lines: Iterable[str]) -> None:
+        self._sizes, self._digests = _chunks(list(lines))
+        self._update_starts()
+
+    def _update_starts(self) -> None:
+        self._starts = [0, *itertools.accumulate(self._sizes)]
+        self._len = self._starts.pop()
+
+    def root(self, nl: str) -> str:
+        """The digest of the lines as they would be saved with `nl`."""
+        sha256 = hashlib.sha256(nl.encode())
+        sha256.update(b''.join(self._digests))
+        return sha256.hexdigest()
+
+    def update(
+            self,
+            lines: MutableSequenceNoSlice,
+            start: int,
+            end: int,
+            delta: int,
+    ) -> None:
+        """Rehash after `lines[start:end]` were changed, adding `delta`
+        lines in total.  The lines outside of that range are unchanged.
+        """
+        if not self._sizes:
+            self._build(lines)
+            return
+
+        # the chunks containing the changed lines (as they were before the
+        # change), inserting at the very end extends the last chunk
+        first_line = min(start, self._len - 1)
+        last_line = min(max(start, end - delta - 1), self._len - 1)
+        first = bisect.bisect_right(self._starts, first_line) - 1
+        last = bisect.bisect_right(self._starts, last_line) - 1
+        region_start = self._starts[first]
+        region_end = self._starts[last] + self._sizes[last] + delta
+
+        # a changed last line may no longer end the chunk, continue until
+        # the chunks line up with the old ones again
+        while (
+                region_start < region_end < len(lines) and
+                last + 1 < len(self._sizes) and
+                not _ends_chunk(lines[region_end - 1])
+        ):
+            last += 1
+            region_end += self._sizes[last]
+
+        region = [lines[i] for i in range(region_start, region_end)]
+        sizes, digests = _chunks(region)
+        self._sizes[first:last + 1] = sizes
+        self._digests[first:last + 1] = digests
+        self._update_starts()
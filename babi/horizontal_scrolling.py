@@ -15,13 +15,16 @@ def line_x(x: int, width: int) -> int:
 
 def scrolled_line(s: str, x: int, width: int) -> str:
     l_x = line_x(x, width)
+    return scrolled_window(s[l_x:l_x + width + 1], l_x, width)
+
+
+def scrolled_window(s: str, l_x: int, width: int) -> str:
+    """Render `s`, the visible part of a line (`line[l_x:l_x + width + 1]`),
+    so long lines never need to be copied in full.
+    """
     if l_x:
-        s = f'«{s[l_x + 1:]}'
-        if l_x and len(s) > width:
-            return f'{s[:width - 1]}»'
-        else:
-            return s.ljust(width)
-    elif len(s) > width:
+        s = f'«{s[1:]}'
+    if len(s) > width:
         return f'{s[:width - 1]}»'
     else:
         return s.ljust(width)
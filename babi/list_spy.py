@@ -1,10 +1,16 @@
-import functools
-from typing import Callable
+import itertools
+import sys
+from typing import Iterable
 from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Tuple
 
 from babi._types import Protocol
 
+# see `ListSpy.undo_records`
+UndoRecord = Tuple[int, int, List[str], Optional[List[str]]]
+
 
 class MutableSequenceNoSlice(Protocol):
     def __len__(self) -> int: ...
@@ -26,22 +32,83 @@ class MutableSequenceNoSlice(Protocol):
         return victim
 
 
-def _del(lst: MutableSequenceNoSlice, *, idx: int) -> None:
-    del lst[idx]
+class _Run:
+    """`lines[idx:idx + count]` replaced the `old` lines.  Consecutive
+    changes at or next to the replaced lines extend the same run.
+
+    The `new` lines are only kept once the run can no longer be extended,
+    see `ListSpy.seal`.
+    """
 
+    def __init__(
+            self,
+            idx: int,
+            count: int,
+            old: List[str],
+            new: Optional[List[str]] = None,
+    ) -> None:
+        self.idx = idx
+        self.count = count
+        self.old = old
+        self.new = new
 
-def _set(lst: MutableSequenceNoSlice, *, idx: int, val: str) -> None:
-    lst[idx] = val
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.idx}, {self.count}, {self.old})'
 
+    def seal(self, lst: MutableSequenceNoSlice) -> None:
+        if self.new is None:
+            self.new = [lst[i] for i in range(self.idx, self.end)]
 
-def _ins(lst: MutableSequenceNoSlice, *, idx: int, val: str) -> None:
-    lst.insert(idx, val)
+    @property
+    def end(self) -> int:
+        return self.idx + self.count
+
+
+def _replace(
+        lst: MutableSequenceNoSlice,
+        idx: int,
+        count: int,
+        vals: List[str],
+) -> None:
+    """Replace `lst[idx:idx + count]` with `vals`."""
+    if isinstance(lst, ListSpy):
+        lst.replace(idx, count, vals)
+    elif isinstance(lst, list):
+        lst[idx:idx + count] = vals
+    else:
+        common = min(count, len(vals))
+        for i in range(common):
+            lst[idx + i] = vals[i]
+        for _ in range(count - common):
+            del lst[idx + common]
+        for i in range(common, len(vals)):
+            lst.insert(idx + i, vals[i])
+
+
+def _combine(
+        changed: Optional[Tuple[int, int]],
+        start: int,
+        end: int,
+        delta: int,
+) -> Tuple[int, int]:
+    """The lines `changed` after `[start:end]` changed by `delta` lines."""
+    if changed is None:
+        return start, end
+    else:
+        prev_start, prev_end = changed
+        # the lines after the change move by `delta`
+        if prev_end > start:
+            prev_end += delta
+        return min(prev_start, start), max(prev_start, prev_end, end)
 
 
 class ListSpy(MutableSequenceNoSlice):
     def __init__(self, lst: MutableSequenceNoSlice) -> None:
         self._lst = lst
-        self._undo: List[Callable[[MutableSequenceNoSlice], None]] = []
+        self._undo: List[_Run] = []
+        # see `take_changes`
+        self._changed: Optional[Tuple[int, int]] = None
+        self._delta = 0
 
     def __repr__(self) -> str:
         return f'{type(self).__name__}({self._lst})'
@@ -52,25 +119,134 @@ class ListSpy(MutableSequenceNoSlice):
     def __getitem__(self, idx: int) -> str:
         return self._lst[idx]
 
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._lst)
+
+    def _record_change(self, start: int, end: int, delta: int) -> None:
+        self._changed = _combine(self._changed, start, end, delta)
+        self._delta += delta
+
+    def _run(self, idx: int) -> _Run:
+        """The run which a change at `idx` extends."""
+        if self._undo and self._undo[-1].idx <= idx <= self._undo[-1].end:
+            return self._undo[-1]
+        else:
+            self.seal(self._lst)
+            run = _Run(idx, 0, [])
+            self._undo.append(run)
+            return run
+
     def __setitem__(self, idx: int, val: str) -> None:
-        self._undo.append(functools.partial(_set, idx=idx, val=self._lst[idx]))
+        if idx < 0:
+            idx %= len(self)
+        run = self._run(idx)
+        # a line already in the run keeps its original value recorded
+        if idx == run.end:
+            run.old.append(self._lst[idx])
+            run.count += 1
         self._lst[idx] = val
+        self._record_change(idx, idx + 1, 0)
 
     def __delitem__(self, idx: int) -> None:
         if idx < 0:
             idx %= len(self)
-        self._undo.append(functools.partial(_ins, idx=idx, val=self._lst[idx]))
+        run = self._run(idx)
+        if idx == run.end:
+            run.old.append(self._lst[idx])
+        else:
+            run.count -= 1
         del self._lst[idx]
+        self._record_change(idx, idx, -1)
 
     def insert(self, idx: int, val: str) -> None:
         if idx < 0:
             idx %= len(self)
-        self._undo.append(functools.partial(_del, idx=idx))
+        self._run(idx).count += 1
         self._lst.insert(idx, val)
+        self._record_change(idx, idx + 1, 1)
+
+    def replace(self, idx: int, count: int, vals: List[str]) -> None:
+        """Replace `count` lines at `idx` with `vals` as a single change."""
+        old = [self._lst[i] for i in range(idx, idx + count)]
+        self.seal(self._lst)
+        self._undo.append(_Run(idx, len(vals), old))
+        _replace(self._lst, idx, count, vals)
+        self._record_change(idx, idx + len(vals), len(vals) - count)
+
+    def replay(
+            self,
+            changes: Iterable[Tuple[int, int, List[str]]],
+            work: MutableSequenceNoSlice,
+    ) -> None:
+        """Make each `(idx, count, vals)` replacement, in order, as a single
+        change.  They are first made in `work`, a copy of the lines which is
+        cheap to insert into and delete from.
+        """
+        changed = None
+        total = 0
+        for idx, count, vals in changes:
+            _replace(work, idx, count, vals)
+            delta = len(vals) - count
+            changed = _combine(changed, idx, idx + len(vals), delta)
+            total += delta
+        if changed is not None:
+            start, end = changed
+            vals = list(itertools.islice(work, start, end))
+            self.replace(start, end - total - start, vals)
+
+    def seal(self, lst: MutableSequenceNoSlice) -> None:
+        """Keep the lines of the last run for `redo`, `lst` must be the lines
+        as they were after the last change.
+        """
+        if self._undo:
+            self._undo[-1].seal(lst)
 
     def undo(self, lst: MutableSequenceNoSlice) -> None:
-        for fn in reversed(self._undo):
-            fn(lst)
+        for run in reversed(self._undo):
+            run.seal(lst)
+            _replace(lst, run.idx, run.count, run.old)
+
+    def redo(self, lst: MutableSequenceNoSlice) -> None:
+        """Make the changes again after they were undone from `lst`."""
+        for run in self._undo:
+            assert run.new is not None
+            _replace(lst, run.idx, len(run.old), run.new)
+
+    @property
+    def undo_size(self) -> int:
+        """Approximate number of bytes used to record the undo."""
+        return sum(
+            sys.getsizeof(run) + sys.getsizeof(run.old) +
+            sum(map(sys.getsizeof, run.old)) +
+            sum(map(sys.getsizeof, run.new or ()))
+            for run in self._undo
+        )
+
+    def undo_records(self) -> List[UndoRecord]:
+        """The undo (and redo) as plain data, see `from_undo_records`.  The
+        spy must be sealed.
+        """
+        return [(run.idx, run.count, run.old, run.new) for run in self._undo]
+
+    @classmethod
+    def from_undo_records(cls, records: List[UndoRecord]) -> 'ListSpy':
+        """A spy which only undoes and redoes the `undo_records` of another
+        spy.
+        """
+        spy = cls([])
+        spy._undo = [_Run(*record) for record in records]
+        return spy
+
+    def take_changes(self) -> Optional[Tuple[int, int, int]]:
+        """The lines changed since the last call (`None` if unchanged) as
+        `(start, end, delta)`: `lines[start:end]` replaced what were
+        `end - delta - start` lines.
+        """
+        if self._changed is None:
+            return None
+        (start, end), delta = self._changed, self._delta
+        self._changed, self._delta = None, 0
+        return start, end, delta
 
     @property
     def has_modifications(self) -> bool:
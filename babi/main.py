@@ -1,24 +1,40 @@
 import argparse
 import curses
+import os
+import sys
+from typing import BinaryIO
+from typing import cast
 from typing import Optional
 from typing import Sequence
 
 from babi.file import File
+from babi.file import UNDO_MEMORY
+from babi.screen import EDIT_KEYS
 from babi.screen import EditResult
 from babi.screen import make_stdscr
+from babi.screen import READ_ONLY_MSG
 from babi.screen import Screen
 
 
 def _edit(screen: Screen) -> EditResult:
-    screen.file.ensure_loaded(screen.status)
+    screen.file.ensure_loaded(screen.status, screen.margin)
+    if screen.file.recoverable:
+        screen.recover()
 
     while True:
+        screen.poll()
         screen.status.tick(screen.margin)
         screen.draw()
         screen.file.move_cursor(screen.stdscr, screen.margin)
 
+        screen.wait_for_input()
         key = screen.get_char()
-        if key.keyname in File.DISPATCH:
+        if screen.file.view and (
+                key.keyname in EDIT_KEYS or
+                isinstance(key.wch, str) and key.wch.isprintable()
+        ):
+            screen.status.update(READ_ONLY_MSG)
+        elif key.keyname in File.DISPATCH:
             File.DISPATCH[key.keyname](screen.file, screen.margin)
         elif key.keyname in Screen.DISPATCH:
             ret = Screen.DISPATCH[key.keyname](screen)
@@ -30,13 +46,40 @@ def _edit(screen: Screen) -> EditResult:
             screen.status.update(f'unknown key: {key}')
 
 
-def c_main(stdscr: 'curses._CursesWindow', args: argparse.Namespace) -> None:
-    screen = Screen(stdscr, [File(f) for f in args.filenames or [None]])
+def _open_stdin() -> BinaryIO:  # pragma: no cover (needs a pipe and a tty)
+    """Keep reading the piped stdin from another fd and replace stdin with
+    the terminal so curses can read keys from it.
+    """
+    stream = os.fdopen(os.dup(sys.stdin.fileno()), 'rb', buffering=0)
+    tty = os.open('/dev/tty', os.O_RDONLY)
+    os.dup2(tty, sys.stdin.fileno())
+    os.close(tty)
+    return cast(BinaryIO, stream)
+
+
+def c_main(
+        stdscr: 'curses._CursesWindow',
+        args: argparse.Namespace,
+        stdin: Optional[BinaryIO] = None,
+) -> None:
+    files = [
+        File(
+            None if f == '-' else f,
+            compact_lines=args.compact_lines,
+            view=args.view,
+            follow=args.follow,
+            stream=stdin if f == '-' else None,
+            undo_memory=args.undo_memory * 1024 * 1024,
+        )
+        for f in args.filenames or [None]
+    ]
+    screen = Screen(stdscr, files)
     with screen.perf.log(args.perf_log), screen.history.save():
         while screen.files:
             screen.i = screen.i % len(screen.files)
             res = _edit(screen)
             if res == EditResult.EXIT:
+                screen.file.close()
                 del screen.files[screen.i]
                 screen.status.clear()
             elif res == EditResult.NEXT:
@@ -53,9 +96,34 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument('filenames', metavar='filename', nargs='*')
     parser.add_argument('--perf-log')
+    parser.add_argument(
+        '--compact-lines', action='store_true',
+        help='store lines compactly (slower to edit, for very large files)',
+    )
+    parser.add_argument(
+        '--view', action='store_true',
+        help='open the files read-only, without loading them into memory',
+    )
+    parser.add_argument(
+        '--follow', action='store_true',
+        help='show what is appended to the files (M-f to pause / resume)',
+    )
+    parser.add_argument(
+        '--undo-memory', type=int, default=UNDO_MEMORY // 1024 // 1024,
+        metavar='MB',
+        help='undo history kept in memory per file, the rest is kept on disk',
+    )
     args = parser.parse_args(argv)
+    if '-' in args.filenames:
+        if args.filenames.count('-') > 1:
+            parser.error('stdin (`-`) can only be read once')
+        elif sys.stdin.isatty():
+            parser.error('stdin (`-`) must be piped')
+        stdin = _open_stdin()
+    else:
+        stdin = None
     with make_stdscr() as stdscr:
-        c_main(stdscr, args)
+        c_main(stdscr, args, stdin)
     return 0
 
 
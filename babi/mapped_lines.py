@@ -0,0 +1,167 @@
+import bisect
+import collections
+import hashlib
+import itertools
+import mmap
+from array import array
+from typing import BinaryIO
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
+from typing import Union
+
+from babi.list_spy import MutableSequenceNoSlice
+
+CHUNK_SIZE = 1024 * 1024
+
+Piece = Union[range, List[str]]
+
+
+def _line_starts(mm: mmap.mmap) -> Tuple['array[int]', int, str]:
+    """Scan the mapped file once in large chunks, returning the byte offset
+    of the start of every line, the number of `\\r\\n` endings and the
+    sha256 of the contents.
+    """
+    sha256 = hashlib.sha256()
+    starts = array('q', [0])
+    crlf = 0
+    prev_cr = False
+    for pos in range(0, len(mm), CHUNK_SIZE):
+        chunk = mm[pos:pos + CHUNK_SIZE]
+        sha256.update(chunk)
+        crlf += chunk.count(b'\r\n') + (prev_cr and chunk.startswith(b'\n'))
+        prev_cr = chunk.endswith(b'\r')
+        # every part but the last is followed by a `\n` in this chunk
+        *parts, _ = chunk.split(b'\n')
+        lengths = map((1).__add__, map(len, parts))
+        starts.extend(map(pos.__add__, itertools.accumulate(lengths)))
+    return starts, crlf, sha256.hexdigest()
+
+
+class MappedLines(MutableSequenceNoSlice):
+    """Lines of a memory mapped file which are only decoded when accessed.
+
+    The contents are represented as a piece table: a `range` piece refers to
+    a run of unmodified lines in the mapped file and a `list` piece holds
+    lines which were inserted or replaced while editing.
+    """
+
+    def __init__(self, mm: mmap.mmap, line_starts: 'array[int]') -> None:
+        self._mm = mm
+        self._line_starts = line_starts
+        self._count = len(line_starts) - 1
+        if line_starts[-1] < len(mm):  # missing final newline
+            self._count += 1
+        count = self._count
+        # as with `get_lines`, the lines always end in a blank line
+        if not count or self._decode(count - 1) != '':
+            count += 1
+        self._pieces: List[Piece] = [range(count)]
+        self._starts = [0]
+        self._len = count
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(<{self._len} lines>)'
+
+    def _decode(self, n: int) -> str:
+        if n == self._count:
+            return ''
+        start = self._line_starts[n]
+        if n + 1 < len(self._line_starts):
+            end = self._line_starts[n + 1] - 1
+            if end > start and self._mm[end - 1] == ord('\r'):
+                end -= 1
+        else:
+            end = len(self._mm)
+        return self._mm[start:end].decode()
+
+    def _update_starts(self) -> None:
+        self._pieces = [piece for piece in self._pieces if len(piece)]
+        self._starts = [0, *itertools.accumulate(map(len, self._pieces))]
+        self._len = self._starts.pop()
+
+    def _locate(self, idx: int) -> Tuple[int, int]:
+        if idx < 0:
+            idx += self._len
+        if not 0 <= idx < self._len:
+            raise IndexError(idx)
+        i = bisect.bisect_right(self._starts, idx) - 1
+        return i, idx - self._starts[i]
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _iter_pieces(self, pieces: Iterable[Piece]) -> Iterator[str]:
+        for piece in pieces:
+            if isinstance(piece, range):
+                yield from map(self._decode, piece)
+            else:
+                yield from piece
+
+    def __iter__(self) -> Iterator[str]:
+        return self._iter_pieces(self._pieces)
+
+    def snapshot(self) -> Iterator[str]:
+        """The current lines, unaffected by later edits."""
+        pieces = [
+            piece.copy() if isinstance(piece, list) else piece
+            for piece in self._pieces
+        ]
+        return self._iter_pieces(pieces)
+
+    def __getitem__(self, idx: int) -> str:
+        i, offset = self._locate(idx)
+        piece = self._pieces[i]
+        if isinstance(piece, range):
+            return self._decode(piece[offset])
+        else:
+            return piece[offset]
+
+    def __setitem__(self, idx: int, val: str) -> None:
+        i, offset = self._locate(idx)
+        piece = self._pieces[i]
+        if isinstance(piece, range):
+            before, after = piece[:offset], piece[offset + 1:]
+            self._pieces[i:i + 1] = [before, [val], after]
+            self._update_starts()
+        else:
+            piece[offset] = val
+
+    def __delitem__(self, idx: int) -> None:
+        i, offset = self._locate(idx)
+        piece = self._pieces[i]
+        if isinstance(piece, range):
+            self._pieces[i:i + 1] = [piece[:offset], piece[offset + 1:]]
+        else:
+            del piece[offset]
+        self._update_starts()
+
+    def insert(self, idx: int, val: str) -> None:
+        if idx >= self._len:
+            if self._pieces and isinstance(self._pieces[-1], list):
+                self._pieces[-1].append(val)
+            else:
+                self._pieces.append([val])
+            self._update_starts()
+            return
+
+        i, offset = self._locate(max(idx, -self._len))
+        piece = self._pieces[i]
+        if isinstance(piece, range):
+            before, after = piece[:offset], piece[offset:]
+            self._pieces[i:i + 1] = [before, [val], after]
+        else:
+            piece.insert(offset, val)
+        self._update_starts()
+
+
+def get_lines_mapped(f: BinaryIO) -> Tuple[MappedLines, str, bool, str]:
+    """The memory mapped equivalent of `babi.file.get_lines`."""
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    line_starts, crlf, sha256 = _line_starts(mm)
+    lf = len(line_starts) - 1 - crlf
+    newlines = collections.Counter({'\n': lf, '\r\n': crlf})
+    (nl, _), = newlines.most_common(1)
+    mixed = len({k for k, v in newlines.items() if v}) > 1
+    return MappedLines(mm, line_starts), nl, mixed, sha256
@@ -1,5 +1,6 @@
 import curses
 import enum
+from typing import Callable
 from typing import List
 from typing import Optional
 from typing import TYPE_CHECKING
@@ -15,10 +16,19 @@ PromptResult = enum.Enum('PromptResult', 'CANCELLED')
 
 
 class Prompt:
-    def __init__(self, screen: 'Screen', prompt: str, lst: List[str]) -> None:
+    def __init__(
+            self,
+            screen: 'Screen',
+            prompt: str,
+            lst: List[str],
+            *,
+            change_cb: Optional[Callable[[str], None]] = None,
+    ) -> None:
         self._screen = screen
         self._prompt = prompt
         self._lst = lst
+        # called with the text whenever it changes
+        self._change_cb = change_cb
         self._y = len(lst) - 1
         self._x = len(self._s)
 
@@ -173,6 +183,7 @@ class Prompt:
         while True:
             self._render_prompt()
 
+            prev = self._s
             key = self._screen.get_char()
             if key.keyname in Prompt.DISPATCH:
                 ret = Prompt.DISPATCH[key.keyname](self)
@@ -180,3 +191,6 @@ class Prompt:
                     return ret
             elif isinstance(key.wch, str) and key.wch.isprintable():
                 self._c(key.wch)
+
+            if self._change_cb is not None and self._s != prev:
+                self._change_cb(self._s)
@@ -0,0 +1,132 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+from typing import BinaryIO
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from babi.user_data import xdg_data
+
+# changes are written (and synced) at most this long after they were made
+FLUSH_SECONDS = 1.0
+
+# `lines[start:start + count]` were replaced with `lines`
+Change = Tuple[int, int, List[str]]
+
+
+def _recovery_path(filename: str) -> str:
+    path = os.path.realpath(filename).encode()
+    return xdg_data('recovery', hashlib.sha256(path).hexdigest())
+
+
+def _merge(changes: List[Change]) -> List[Change]:
+    """Combine consecutive changes where a change replaces exactly the lines
+    of the previous one (such as typing on a line).
+    """
+    ret: List[Change] = []
+    for start, count, lines in changes:
+        if ret and ret[-1][0] == start and len(ret[-1][2]) == count:
+            ret[-1] = (start, ret[-1][1], lines)
+        else:
+            ret.append((start, count, lines))
+    return ret
+
+
+def recovery_exists(filename: str) -> bool:
+    return os.path.exists(_recovery_path(filename))
+
+
+def load_recovery(filename: str, sha256: str) -> Optional[List[Change]]:
+    """The unsaved changes to `filename` from a session which did not exit,
+    if they apply to its current contents `sha256`.  A journal for other
+    contents is removed.
+    """
+    path = _recovery_path(filename)
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    with f:
+        if f.readline().rstrip(b'\n') != sha256.encode():
+            remove_recovery(filename)
+            return None
+        data = f.read()
+
+    # the last change may only be partially written
+    complete = data[:data.rfind(b'\n') + 1].splitlines()
+    # decoded all at once, this is much faster than decoding each change
+    changes = json.loads(b'[%s]' % b','.join(complete))
+    return _merge([(start, count, lines) for start, count, lines in changes])
+
+
+def remove_recovery(filename: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(_recovery_path(filename))
+
+
+class RecoveryJournal:
+    """The changes made to a file since it was last saved, so they can be
+    recovered when the session ends without exiting.
+
+    `record` only queues the change, a background thread writes them in
+    batches and syncs them to disk at most every `FLUSH_SECONDS`.
+    """
+
+    def __init__(self, filename: str, base: str) -> None:
+        self._path = _recovery_path(filename)
+        # the sha256 of the contents the changes apply to
+        self._base = base
+        self._pending: List[bytes] = []
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._flush, daemon=True)
+        self._thread.start()
+
+    def record(self, start: int, count: int, lines: List[str]) -> None:
+        data = json.dumps((start, count, lines), separators=(',', ':'))
+        with self._cond:
+            self._pending.append(f'{data}\n'.encode())
+            self._cond.notify()
+
+    def _write(self, f: Optional[BinaryIO], pending: List[bytes]) -> BinaryIO:
+        if f is None:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            f = open(self._path, 'wb')
+            f.write(f'{self._base}\n'.encode())
+        f.write(b''.join(pending))
+        f.flush()
+        os.fsync(f.fileno())
+        return f
+
+    def _flush(self) -> None:
+        f = None
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._pending or self._closed)
+                    pending, self._pending = self._pending, []
+                    closed = self._closed
+                if pending:
+                    f = self._write(f, pending)
+                if closed:
+                    break
+                # gather the changes made in the meantime into one write
+                with self._cond:
+                    self._cond.wait_for(lambda: self._closed, FLUSH_SECONDS)
+        finally:
+            if f is not None:
+                f.close()
+
+    def close(self) -> None:
+        """Stop recording and remove the journal."""
+        with self._cond:
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify()
+        self._thread.join()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path)
@@ -7,27 +7,48 @@ import re
 import signal
 import sys
 from typing import Callable
+from typing import Dict
 from typing import Generator
 from typing import List
+from typing import Match
 from typing import NamedTuple
 from typing import Optional
 from typing import Pattern
 from typing import Tuple
 from typing import Union
 
+from babi.compression import detect_compression
+from babi.compression import open_decompressed
 from babi.file import Action
 from babi.file import File
-from babi.file import get_lines
+from babi.file import FileStat
+from babi.file import get_lines_bytes
+from babi.file import HIGHLIGHT
+from babi.hash_tree import HashTree
 from babi.history import History
 from babi.margin import Margin
 from babi.perf import Perf
 from babi.prompt import Prompt
 from babi.prompt import PromptResult
+from babi.search import compile_search
+from babi.search import is_literal
+from babi.search import match_at
 from babi.status import Status
 
 VERSION_STR = 'babi v0'
+# how often to redraw while waiting for background work
+POLL_INTERVAL_MS = 100
 EditResult = enum.Enum('EditResult', 'EXIT NEXT PREV')
-
+# keys which change the file, these do nothing with `--view`
+EDIT_KEYS = frozenset((
+    b'KEY_BACKSPACE', b'^H', b'KEY_DC', b'^M', b'^I', b'KEY_BTAB',
+    b'^K', b'^U', b'M-u', b'M-U', b'^\\', b'^S', b'^O',
+))
+READ_ONLY_MSG = 'file is read-only (opened with --view)'
+# `:earlier` / `:later` by a number of changes or an amount of time
+EARLIER_LATER_RE = re.compile(r'^:(earlier|later)(?: (\d+)([smhd]?))?$')
+SECONDS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+# characters which make a search a regular expression instead of text
 # TODO: find a place to populate these, surely there's a database somewhere
 SEQUENCE_KEYNAME = {
     '\x1bOH': b'KEY_HOME',
@@ -87,6 +108,8 @@ class Screen:
         filename = self.file.filename or '<<new file>>'
         if self.file.modified:
             filename += ' *'
+        if self.file.loading_progress is not None:
+            filename += f' (loading {self.file.loading_progress})'
         if len(self.files) > 1:
             files = f'[{self.i + 1}/{len(self.files)}] '
             version_width = len(VERSION_STR) + 2 + len(files)
@@ -134,6 +157,31 @@ class Screen:
         self.perf.start(ret.keyname.decode())
         return ret
 
+    def wait_for_input(self) -> None:
+        """While background work is pending, redraw periodically until a key
+        is available.
+        """
+        while self.file.busy:
+            self.stdscr.timeout(POLL_INTERVAL_MS)
+            try:
+                wch = self.stdscr.get_wch()
+            except curses.error:
+                pass
+            else:
+                curses.unget_wch(wch)
+                return
+            finally:
+                self.stdscr.timeout(-1)
+
+            self.poll()
+            self.draw()
+            self.file.move_cursor(self.stdscr, self.margin)
+
+    def poll(self) -> None:
+        """Check on background work and a followed file."""
+        self.file.poll(self.status)
+        self.file.poll_follow(self.status, self.margin)
+
     def draw(self) -> None:
         if self.margin.header:
             self._draw_header()
@@ -182,6 +230,7 @@ class Screen:
             history: Optional[str] = None,
             default_prev: bool = False,
             default: Optional[str] = None,
+            change_cb: Optional[Callable[[str], None]] = None,
     ) -> Union[str, PromptResult]:
         default = default or ''
         self.status.clear()
@@ -192,7 +241,7 @@ class Screen:
         else:
             history_data = [default]
 
-        ret = Prompt(self, prompt, history_data).run()
+        ret = Prompt(self, prompt, history_data, change_cb=change_cb).run()
 
         if ret is not PromptResult.CANCELLED and history is not None:
             if ret:  # only put non-empty things in history
@@ -219,6 +268,7 @@ class Screen:
                 self.file.go_to_line(lineno, self.margin)
 
     def current_position(self) -> None:
+        self.file.wait_until_loaded(self.status)
         line = f'line {self.file.y + 1}'
         col = f'col {self.file.x + 1}'
         line_count = max(len(self.file.lines) - 1, 1)
@@ -239,12 +289,19 @@ class Screen:
         else:
             self.file.uncut(self.cut_buffer, self.margin)
 
-    def _get_search_re(self, prompt: str) -> Union[Pattern[str], PromptResult]:
-        response = self.prompt(prompt, history='search', default_prev=True)
+    def _get_search_re(
+            self,
+            prompt: str,
+            *,
+            change_cb: Optional[Callable[[str], None]] = None,
+    ) -> Union[Pattern[str], PromptResult]:
+        response = self.prompt(
+            prompt, history='search', default_prev=True, change_cb=change_cb,
+        )
         if response is PromptResult.CANCELLED:
             return response
         try:
-            return re.compile(response)
+            return compile_search(response)
         except re.error:
             self.status.update(f'invalid regex: {response!r}')
             return PromptResult.CANCELLED
@@ -252,27 +309,91 @@ class Screen:
     def _undo_redo(
             self,
             op: str,
-            from_stack: List[Action],
-            to_stack: List[Action],
+            func: Callable[[File], Optional[Action]],
     ) -> None:
-        if not from_stack:
+        action = func(self.file)
+        if action is None:
             self.status.update(f'nothing to {op}!')
         else:
-            action = from_stack.pop()
-            to_stack.append(action.apply(self.file))
             self.file.scroll_screen_if_needed(self.margin)
             self.status.update(f'{op}: {action.name}')
 
     def undo(self) -> None:
-        self._undo_redo('undo', self.file.undo_stack, self.file.redo_stack)
+        self._undo_redo('undo', self.file.history.undo)
 
     def redo(self) -> None:
-        self._undo_redo('redo', self.file.redo_stack, self.file.undo_stack)
+        self._undo_redo('redo', self.file.history.redo)
+
+    def earlier_later(self, match: Match[str]) -> None:
+        op, n, unit = match[1], int(match[2] or 1), match[3]
+        sign = -1 if op == 'earlier' else 1
+        history = self.file.history
+        if unit:
+            state = history.find(seconds=sign * n * SECONDS[unit])
+        else:
+            state = history.find(changes=sign * n)
+
+        if state == history.state:
+            self.status.update(f'no {op} state!')
+        else:
+            history.go_to(self.file, state)
+            self.file.scroll_screen_if_needed(self.margin)
+            self.status.update(f'{op}: state {state}')
 
     def search(self) -> None:
-        response = self._get_search_re('search')
+        file = self.file
+        orig = (file.y, file.x, file.x_hint, file.file_y)
+        # the lines containing each literal search typed so far
+        found: Dict[str, List[int]] = {}
+
+        def _restore() -> None:
+            file.y, file.x, file.x_hint, file.file_y = orig
+
+        def _candidates(reg: Pattern[str]) -> Optional[List[int]]:
+            s = reg.pattern
+            if not is_literal(s):
+                return None
+            elif s not in found:
+                # lines containing `s` contain every part of it as well
+                ys = min(
+                    (v for k, v in found.items() if k in s),
+                    key=len, default=None,
+                )
+                ignore_case = bool(reg.flags & re.IGNORECASE)
+                found[s] = file.lines_containing(
+                    s, ys, ignore_case=ignore_case,
+                )
+            return found[s]
+
+        def _search_as_typed(s: str) -> None:
+            _restore()
+            try:
+                reg = compile_search(s)
+            except re.error:
+                s = ''
+            if s:
+                file.search(
+                    reg, Status(), self.margin,
+                    candidates=_candidates(reg), count=False,
+                )
+
+            self.draw()
+            current = match_at(file.lines, reg, file.y, file.x) if s else None
+            if current is not None:
+                first_line, _, _ = current.match[0].partition('\n')
+                file.highlight(
+                    self.stdscr, self.margin,
+                    y=file.y, x=file.x, n=len(first_line),
+                    color=HIGHLIGHT, include_edge=True,
+                )
+
+        response = self._get_search_re('search', change_cb=_search_as_typed)
+        _restore()
         if response is not PromptResult.CANCELLED:
-            self.file.search(response, self.status, self.margin)
+            candidates = found.get(response.pattern)
+            file.search(
+                response, self.status, self.margin, candidates=candidates,
+            )
 
     def replace(self) -> None:
         search_response = self._get_search_re('search (to replace)')
@@ -287,6 +408,8 @@ class Screen:
         response = self.prompt('', history='command')
         if response == ':q':
             return EditResult.EXIT
+        elif self.file.view and response in {':w', ':wq', ':sort'}:
+            self.status.update(READ_ONLY_MSG)
         elif response == ':w':
             self.save()
         elif response == ':wq':
@@ -299,16 +422,21 @@ class Screen:
                 self.file.sort(self.margin)
             self.status.update('sorted!')
         elif response is not PromptResult.CANCELLED:
-            self.status.update(f'invalid command: {response}')
+            assert isinstance(response, str)
+            match = EARLIER_LATER_RE.match(response)
+            if match:
+                self.earlier_later(match)
+            else:
+                self.status.update(f'invalid command: {response}')
         return None
 
     def save(self) -> Optional[PromptResult]:
+        self.file.wait_until_loaded(self.status)
+        self.file.wait_until_saved(self.status)
         self.file.finalize_previous_action()
 
         # TODO: make directories if they don't exist
-        # TODO: maybe use mtime / stat as a shortcut for hashing below
         # TODO: strip trailing whitespace?
-        # TODO: save atomically?
         if self.file.filename is None:
             filename = self.prompt('enter filename')
             if filename is PromptResult.CANCELLED:
@@ -316,36 +444,27 @@ class Screen:
             else:
                 self.file.filename = filename
 
-        if os.path.isfile(self.file.filename):
-            with open(self.file.filename) as f:
-                *_, sha256 = get_lines(f)
-        else:
+        sha256: Optional[str]
+        if not os.path.isfile(self.file.filename):
             sha256 = hashlib.sha256(b'').hexdigest()
-
-        contents = self.file.nl.join(self.file.lines)
-        sha256_to_save = hashlib.sha256(contents.encode()).hexdigest()
-
-        # the file on disk is the same as when we opened it
-        if sha256 not in (self.file.sha256, sha256_to_save):
+            root = HashTree(('',)).root(self.file.nl)
+        elif FileStat.from_path(self.file.filename) == self.file.stat:
+            # not written since we read it, no need to hash it again
+            sha256, root = self.file.sha256, self.file.hash_root
+        else:
+            filename = self.file.filename
+            compression = detect_compression(filename)
+            with open_decompressed(filename, compression) as bf:
+                lines, nl, _, sha256 = get_lines_bytes(bf)
+            root = HashTree(lines).root(nl)
+
+        # the file on disk is the same as when we opened it (or is already
+        # what we are about to write)
+        if sha256 != self.file.sha256 and root != self.file.hash_root:
             self.status.update('(file changed on disk, not implemented)')
             return PromptResult.CANCELLED
 
-        with open(self.file.filename, 'w') as f:
-            f.write(contents)
-
-        self.file.modified = False
-        self.file.sha256 = sha256_to_save
-        num_lines = len(self.file.lines) - 1
-        lines = 'lines' if num_lines != 1 else 'line'
-        self.status.update(f'saved! ({num_lines} {lines} written)')
-
-        # fix up modified state in undo / redo stacks
-        for stack in (self.file.undo_stack, self.file.redo_stack):
-            first = True
-            for action in reversed(stack):
-                action.end_modified = not first
-                action.start_modified = True
-                first = False
+        self.file.save(self.status)
         return None
 
     def save_filename(self) -> Optional[PromptResult]:
@@ -357,15 +476,19 @@ class Screen:
             return self.save()
 
     def quit_save_modified(self) -> Optional[EditResult]:
+        self.file.wait_until_saved(self.status)
         if self.file.modified:
             response = self.quick_prompt(
                 'file is modified - save [y(es), n(o)]?', 'yn',
             )
             if response == 'y':
                 if self.save_filename() is not PromptResult.CANCELLED:
-                    return EditResult.EXIT
-                else:
+                    # don't exit until the file is written (or fails to be)
+                    self.file.wait_until_saved(self.status)
+                if self.file.modified:
                     return None
+                else:
+                    return EditResult.EXIT
             elif response == 'n':
                 return EditResult.EXIT
             else:
@@ -373,6 +496,20 @@ class Screen:
                 return None
         return EditResult.EXIT
 
+    def recover(self) -> None:
+        self.draw()
+        response = self.quick_prompt(
+            'unsaved changes found - recover [y(es), n(o)]?', 'yn',
+        )
+        if response == 'y':
+            self.file.recover(self.margin)
+            self.status.update('recovered unsaved changes')
+        else:
+            self.file.discard_recovery()
+
+    def toggle_following(self) -> None:
+        self.file.toggle_following(self.status)
+
     def background(self) -> None:
         curses.endwin()
         os.kill(os.getpid(), signal.SIGSTOP)
@@ -396,6 +533,7 @@ class Screen:
         b'kLFT3': lambda screen: EditResult.PREV,
         b'kRIT3': lambda screen: EditResult.NEXT,
         b'^Z': background,
+        b'M-f': toggle_following,
     }
 
 
@@ -0,0 +1,405 @@
+import bisect
+import functools
+import itertools
+import multiprocessing
+import os
+import re
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Generator
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Match
+from typing import NamedTuple
+from typing import Optional
+from typing import Pattern
+from typing import Tuple
+
+from babi.list_spy import MutableSequenceNoSlice
+
+# searches containing none of these are searched for as plain text
+REGEX_CHARS = frozenset('.^$*+?{}[]\\|()\n')
+# escapes such as `\S` are not uppercase letters for smart-case
+ESCAPE_RE = re.compile(r'\\.')
+# plain text is searched for in chunks of lines, growing from the first
+# size (in case the match is close) to the last
+LITERAL_CHUNK_LINES = (64, 16384)
+# buffers of at least this many lines are searched in chunks of this many
+# lines by several processes, see `parallel_matches`
+PARALLEL_LINES = 4000000
+PARALLEL_CHUNK_LINES = 500000
+# a match across lines may span at most this many lines
+MAX_MATCH_LINES = 64
+# at most this many lines are joined to be searched at once
+WINDOW_LINES = 8192
+# a `\n` in a pattern which is not an escaped backslash followed by `n`
+NEWLINE_ESCAPE_RE = re.compile(r'(?<!\\)(?:\\\\)*\\n')
+
+
+# the lines being searched by `parallel_matches`, which its processes inherit
+_parallel_lines: Optional[MutableSequenceNoSlice] = None
+
+
+class Found(NamedTuple):
+    y: int
+    x: int
+    end_y: int
+    end_x: int
+    # for a match across lines, of the lines joined by newlines
+    match: Match[str]
+
+
+class Replacement(NamedTuple):
+    y: int
+    x: int
+    end_y: int
+    end_x: int
+    text: str
+    # the number of matches replaced
+    count: int
+
+
+def is_literal(s: str) -> bool:
+    return REGEX_CHARS.isdisjoint(s)
+
+
+def compile_search(s: str) -> Pattern[str]:
+    """Compile a search, it ignores case unless it contains an uppercase
+    letter (smart-case).
+    """
+    if any(c.isupper() for c in ESCAPE_RE.sub('', s)):
+        return re.compile(s)
+    else:
+        return re.compile(s, re.IGNORECASE)
+
+
+def _find_all(reg: Pattern[str], text: str) -> Generator[int, None, None]:
+    if reg.flags & re.IGNORECASE:
+        # much faster than searching: unless some characters fold to
+        # several (such as `İ`), the casefolded text contains any match
+        folded = text.casefold()
+        if len(folded) == len(text) and reg.pattern.casefold() not in folded:
+            return
+        pos = 0
+        while pos <= len(text):
+            match = reg.search(text, pos)
+            if match is None:
+                return
+            yield match.start()
+            pos = match.start() + 1
+    else:
+        pos = text.find(reg.pattern)
+        while pos != -1:
+            yield pos
+            pos = text.find(reg.pattern, pos + 1)
+
+
+def literal_matches(
+        lines: MutableSequenceNoSlice,
+        reg: Pattern[str],
+        start: int,
+        end: int,
+) -> Generator[Tuple[int, int], None, None]:
+    """Every `(y, x)` in `lines[start:end]` which searching for the plain
+    text `reg` (see `is_literal`) from any earlier position finds, in order.
+
+    Instead of searching each line, the lines are joined in chunks which are
+    searched with `str.find` (or `reg.search` when ignoring case).  Matches
+    cannot contain a newline so they are the same as searching each line.
+    """
+    size, max_size = LITERAL_CHUNK_LINES
+    while start < end:
+        chunk_end = min(start + size, end)
+        chunk = [lines[i] for i in range(start, chunk_end)]
+        starts: List[int] = []
+        for pos in _find_all(reg, '\n'.join(chunk)):
+            if not starts:
+                starts = [0, *itertools.accumulate(len(s) + 1 for s in chunk)]
+            i = bisect.bisect_right(starts, pos) - 1
+            yield start + i, pos - starts[i]
+        start = chunk_end
+        size = min(size * 2, max_size)
+
+
+def line_matches(
+        lines: MutableSequenceNoSlice,
+        reg: Pattern[str],
+        ys: Iterable[int],
+) -> Generator[Tuple[int, int], None, None]:
+    """Every `(y, x)` in the lines `ys` which searching for `reg` from any
+    earlier position finds, searching each line.
+    """
+    for y in ys:
+        line = lines[y]
+        x = 0
+        while x <= len(line):
+            match = reg.search(line, x)
+            if match is None:
+                break
+            yield y, match.start()
+            x = match.start() + 1
+
+
+def _matches(
+        lines: MutableSequenceNoSlice,
+        reg: Pattern[str],
+        ys: Iterable[int],
+) -> Iterator[Tuple[int, int]]:
+    if isinstance(ys, range) and is_literal(reg.pattern):
+        return literal_matches(lines, reg, ys.start, ys.stop)
+    else:
+        return line_matches(lines, reg, ys)
+
+
+def _chunk_matches(  # pragma: no cover (run by the other processes)
+        reg: Pattern[str],
+        start: int,
+        end: int,
+        first: bool,
+) -> Tuple['array[int]', 'array[int]']:
+    """The matches in `_parallel_lines[start:end]` (only the first with
+    `first`) as `ys` and `xs`, run by the processes of `parallel_matches`.
+    """
+    assert _parallel_lines is not None
+    ys, xs = array('q'), array('q')
+    for y, x in _matches(_parallel_lines, reg, range(start, end)):
+        ys.append(y)
+        xs.append(x)
+        if first:
+            break
+    return ys, xs
+
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    # forked processes share the lines with this one until they are changed
+    if sys.version_info >= (3, 7):  # pragma: no cover
+        context = multiprocessing.get_context('fork')
+        return ProcessPoolExecutor(workers, mp_context=context)
+    else:  # pragma: no cover
+        return ProcessPoolExecutor(workers)
+
+
+def parallel_matches(
+        lines: MutableSequenceNoSlice,
+        reg: Pattern[str],
+        start: int,
+        end: int,
+        *,
+        first: bool = False,
+) -> Generator[Tuple[int, int], None, None]:
+    """The matches (see `matches`) in `lines[start:end]`, searched in
+    chunks of `PARALLEL_CHUNK_LINES` lines by a process for each cpu.
+
+    The processes are forked so they read the lines from memory shared with
+    this process instead of being sent them.  The chunks are waited for in
+    order, a match is yielded once every chunk before it was searched so the
+    first match is found without waiting for the rest.  With `first` each
+    chunk only finds its first match.
+
+    The first chunk is searched before starting the processes, a match
+    close to `start` does not need them.
+    """
+    global _parallel_lines
+    first_end = min(start + PARALLEL_CHUNK_LINES, end)
+    yield from _matches(lines, reg, range(start, first_end))
+
+    chunks = [
+        (chunk_start, min(chunk_start + PARALLEL_CHUNK_LINES, end))
+        for chunk_start in range(first_end, end, PARALLEL_CHUNK_LINES)
+    ]
+    if not chunks:
+        return
+    workers = min(len(chunks), os.cpu_count() or 1)
+
+    _parallel_lines = lines
+    try:
+        executor = _executor(workers)
+        futures = [
+            executor.submit(_chunk_matches, reg, *chunk, first)
+            for chunk in chunks
+        ]
+    finally:
+        _parallel_lines = None
+
+    try:
+        for future in futures:
+            ys, xs = future.result()
+            yield from zip(ys, xs)
+    finally:
+        for future in futures:
+            future.cancel()
+        # when stopped early the chunks being searched are not waited for
+        executor.shutdown(wait=False)
+
+
+def matches(
+        lines: MutableSequenceNoSlice,
+        reg: Pattern[str],
+        ys: Iterable[int],
+        *,
+        first: bool = False,
+) -> Iterator[Tuple[int, int]]:
+    """Every `(y, x)` in the lines `ys` which searching for `reg` (which
+    does not match across lines) from any earlier position finds, in order.
+    With `first` the search may stop after the first match.
+    """
+    if (
+            isinstance(ys, range) and
+            len(ys) >= PARALLEL_LINES and
+            (os.cpu_count() or 1) > 1
+    ):
+        return parallel_matches(lines, reg, ys.start, ys.stop, first=first)
+    else:
+        return _matches(lines, reg, ys)
+
+
+def search_lines(
+        lines: MutableSequenceNoSlice,
+        reg: Pattern[str],
+        ys: Iterable[int],
+) -> Optional[Found]:
+    """The first match of `reg` (which does not match across lines) in the
+    lines `ys`.
+    """
+    for y, x in matches(lines, reg, ys, first=True):
+        match = reg.match(lines[y], x)
+        assert match is not None
+        return Found(y, x, y, match.end(), match)
+    return None
+
+
+def is_multiline(reg: Pattern[str]) -> bool:
+    """Whether `reg` is searched for across lines, when it contains a
+    newline.  Other patterns are searched for in each line on its own.
+    """
+    return '\n' in reg.pattern or bool(NEWLINE_ESCAPE_RE.search(reg.pattern))
+
+
+@functools.lru_cache(maxsize=16)
+def _multiline_reg(reg: Pattern[str]) -> Pattern[str]:
+    # `^` and `$` still match at the start and end of each line
+    return re.compile(reg.pattern, reg.flags | re.MULTILINE)
+
+
+def search_multiline(
+        lines: MutableSequenceNoSlice,
+        reg: Pattern[str],
+        y: int,
+        x: int,
+) -> Optional[Found]:
+    """The first match of `reg` at or after `(y, x)` in the lines joined by
+    newlines.
+
+    The lines are joined in windows which grow up to `WINDOW_LINES`, a
+    match is only accepted from a window when it starts at least
+    `MAX_MATCH_LINES` lines before the window ends (or the window reaches
+    the end) so it cannot continue past the window.  The next window starts
+    that many lines before the end of the previous one.
+    """
+    reg = _multiline_reg(reg)
+    size = MAX_MATCH_LINES * 2
+    x = min(x, len(lines[y]))
+    while True:
+        end = min(y + size, len(lines))
+        window = [lines[i] for i in range(y, end)]
+        match = reg.search('\n'.join(window), x)
+        if match is not None:
+            # the offset of the start of each line in the window
+            starts = [0, *itertools.accumulate(len(s) + 1 for s in window)]
+            match_y = bisect.bisect_right(starts, match.start()) - 1
+            if end == len(lines) or match_y < len(window) - MAX_MATCH_LINES:
+                end_y = bisect.bisect_right(starts, match.end()) - 1
+                return Found(
+                    y + match_y, match.start() - starts[match_y],
+                    y + end_y, match.end() - starts[end_y],
+                    match,
+                )
+
+        if end == len(lines):
+            return None
+        y, x = end - MAX_MATCH_LINES, 0
+        size = min(size * 2, WINDOW_LINES)
+
+
+def finditer(
+        lines: MutableSequenceNoSlice,
+        reg: Pattern[str],
+        start: Tuple[int, int],
+        end: Tuple[int, int],
+) -> Generator[Found, None, None]:
+    """The matches of `reg` which start from `start` and before `end`,
+    without overlapping (as `re.finditer` finds them).
+    """
+    y, x = start
+    if is_multiline(reg):
+        while True:
+            found = search_multiline(lines, reg, y, x)
+            if found is None or (found.y, found.x) >= end:
+                return
+            yield found
+            y, x = found.end_y, found.end_x
+            # not the same empty match again
+            if found.match[0]:
+                pass
+            elif x < len(lines[y]):
+                x += 1
+            elif y + 1 < len(lines):
+                y, x = y + 1, 0
+            else:
+                return
+    else:
+        end_y = min(end[0] + 1, len(lines))
+        prev_y = -1
+        # the lines are found quickly, the matches by searching them again
+        for line_y, _ in matches(lines, reg, range(y, end_y)):
+            if line_y == prev_y:
+                continue
+            prev_y = line_y
+            line = lines[line_y]
+            for match in reg.finditer(line, x if line_y == y else 0):
+                if (line_y, match.start()) >= end:
+                    return
+                yield Found(line_y, match.start(), line_y, match.end(), match)
+
+
+def sub_lines(
+        lines: MutableSequenceNoSlice,
+        reg: Pattern[str],
+        replace: str,
+        start: int,
+        end: int,
+) -> Generator[Replacement, None, None]:
+    """Each of `lines[start:end]` which `reg` (which does not match across
+    lines) matches, replaced entirely by the line with every match replaced
+    (as `reg.subn` replaces them).
+    """
+    prev_y = -1
+    for y, _ in matches(lines, reg, range(start, end)):
+        if y != prev_y:
+            prev_y = y
+            line = lines[y]
+            text, count = reg.subn(replace, line)
+            yield Replacement(y, 0, y, len(line), text, count)
+
+
+def match_at(
+        lines: MutableSequenceNoSlice,
+        reg: Pattern[str],
+        y: int,
+        x: int,
+) -> Optional[Found]:
+    """The match of `reg` which starts at `(y, x)`."""
+    if is_multiline(reg):
+        found = search_multiline(lines, reg, y, x)
+        if found is not None and (found.y, found.x) == (y, x):
+            return found
+        else:
+            return None
+    else:
+        match = reg.match(lines[y], x)
+        if match is None:
+            return None
+        else:
+            return Found(y, match.start(), y, match.end(), match)
@@ -0,0 +1,120 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from typing import Any
+from typing import IO
+from typing import Optional
+
+from babi.user_data import xdg_data
+
+# the sha256 of the contents of the file which the records apply to
+HEADER_SIZE = 32
+# follows every record: its size and the number of records up to it
+TRAILER = struct.Struct('<II')
+
+
+def _journal_path(filename: str) -> str:
+    path = os.path.realpath(filename).encode()
+    return xdg_data('undo', hashlib.sha256(path).hexdigest())
+
+
+class UndoJournal:
+    """A stack of undo records which did not fit in memory or are kept
+    between sessions, stored under `xdg_data('undo')`.
+
+    Each record is compressed json followed by a `TRAILER`, so the records
+    are read from the end of the file without an index.  Popping a record
+    truncates the file.
+    """
+
+    def __init__(self, f: Optional[IO[bytes]] = None) -> None:
+        self._f = f
+        self._end = HEADER_SIZE
+        self._len = 0
+        if f is not None:
+            self._end = f.seek(0, os.SEEK_END)
+            if self._end > HEADER_SIZE:
+                f.seek(self._end - TRAILER.size)
+                _, self._len = TRAILER.unpack(f.read(TRAILER.size))
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(<{len(self)} records>)'
+
+    def __len__(self) -> int:
+        return self._len
+
+    @classmethod
+    def open(cls, filename: str, sha256: str) -> Optional['UndoJournal']:
+        """The journal saved for `filename` if its contents are still
+        `sha256`.
+        """
+        try:
+            f = open(_journal_path(filename), 'r+b')
+        except FileNotFoundError:
+            return None
+
+        if f.read(HEADER_SIZE) != bytes.fromhex(sha256):
+            f.close()
+            return None
+        # while in use the records may not match the file, see `save`
+        f.seek(0)
+        f.write(bytes(HEADER_SIZE))
+        return cls(f)
+
+    def push(self, record: Any) -> None:
+        if self._f is None:
+            undo_dir = xdg_data('undo')
+            os.makedirs(undo_dir, exist_ok=True)
+            self._f = tempfile.TemporaryFile(dir=undo_dir)
+
+        data = json.dumps(record, separators=(',', ':')).encode()
+        data = zlib.compress(data, 1)
+        self._len += 1
+        self._f.seek(self._end)
+        self._f.write(data + TRAILER.pack(len(data), self._len))
+        self._end = self._f.tell()
+
+    def pop(self) -> Any:
+        assert self._f is not None
+        self._f.seek(self._end - TRAILER.size)
+        size, _ = TRAILER.unpack(self._f.read(TRAILER.size))
+        self._end -= TRAILER.size + size
+        self._len -= 1
+        self._f.seek(self._end)
+        data = self._f.read(size)
+        self._f.truncate(self._end)
+        return json.loads(zlib.decompress(data))
+
+    def clear(self) -> None:
+        if self._f is not None:
+            self._f.truncate(HEADER_SIZE)
+        self._end = HEADER_SIZE
+        self._len = 0
+
+    def save(self, filename: str, sha256: str) -> None:
+        """Keep the records for when `filename` is opened again with the
+        contents `sha256`.  The journal can no longer be used afterwards.
+        """
+        path = _journal_path(filename)
+        if not self._len:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+        elif self._f is not None and self._f.name == path:
+            self._f.seek(0)
+            self._f.write(bytes.fromhex(sha256))
+        else:
+            assert self._f is not None
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(bytes.fromhex(sha256))
+                self._f.seek(HEADER_SIZE)
+                shutil.copyfileobj(self._f, f)
+
+        if self._f is not None:
+            self._f.close()
+            self._f = None
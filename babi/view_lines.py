@@ -0,0 +1,100 @@
+import bisect
+import mmap
+from array import array
+from typing import BinaryIO
+from typing import NoReturn
+from typing import Tuple
+
+from babi.list_spy import MutableSequenceNoSlice
+
+# the index records the number of lines before every block of this size
+BLOCK_SIZE = 64 * 1024
+
+
+class ViewLines(MutableSequenceNoSlice):
+    """Read-only lines of a memory mapped file for `--view`.
+
+    Instead of the offset of every line, the index only holds the number of
+    newlines before each `BLOCK_SIZE` block of the file.  A line is found by
+    splitting the block it starts in, reading consecutive lines (drawing,
+    searching) only needs to find the end of the line.
+    """
+
+    def __init__(self, mm: mmap.mmap) -> None:
+        self._mm = mm
+        self._block_lines = array('q')
+        newlines = 0
+        for pos in range(0, len(mm), BLOCK_SIZE):
+            self._block_lines.append(newlines)
+            newlines += mm[pos:pos + BLOCK_SIZE].count(b'\n')
+        self._newlines = newlines
+        # (line, offset) of the most recently read line
+        self._last = (0, 0)
+
+        count = newlines + (mm[-1:] != b'\n')
+        self._len = count + 1
+        # as with `get_lines`, the lines always end in a blank line
+        if count and self[count - 1] == '':
+            self._len = count
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(<{self._len} lines>)'
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _line_start(self, n: int) -> int:
+        last_n, last_start = self._last
+        if n == last_n:
+            return last_start
+        elif n == last_n + 1:
+            return self._mm.find(b'\n', last_start) + 1
+        elif n == 0:
+            return 0
+
+        # the block containing the `n`th newline
+        block = bisect.bisect_left(self._block_lines, n) - 1
+        block_start = block * BLOCK_SIZE
+        data = self._mm[block_start:block_start + BLOCK_SIZE]
+        *_, rest = data.split(b'\n', n - self._block_lines[block])
+        return block_start + len(data) - len(rest)
+
+    def __getitem__(self, idx: int) -> str:
+        if idx < 0:
+            idx += self._len
+        if not 0 <= idx < self._len:
+            raise IndexError(idx)
+        elif idx > self._newlines:  # after a missing final newline
+            return ''
+
+        start = self._line_start(idx)
+        self._last = (idx, start)
+        end = self._mm.find(b'\n', start)
+        if end == -1:
+            end = len(self._mm)
+        if end > start and self._mm[end - 1] == ord('\r'):
+            end -= 1
+        # nothing is written back so undecodable bytes are only displayed
+        return self._mm[start:end].decode(errors='replace')
+
+    def _read_only(self) -> NoReturn:
+        raise TypeError(f'{type(self).__name__} is read-only')
+
+    def __setitem__(self, idx: int, val: str) -> None:
+        self._read_only()
+
+    def __delitem__(self, idx: int) -> None:
+        self._read_only()
+
+    def insert(self, idx: int, val: str) -> None:
+        self._read_only()
+
+
+def get_lines_view(f: BinaryIO) -> Tuple[ViewLines, str]:
+    """The lines of a (non-empty) file for viewing and its newline, guessed
+    from the first line.
+    """
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    first_end = mm.find(b'\n')
+    crlf = first_end > 0 and mm[first_end - 1] == ord('\r')
+    return ViewLines(mm), '\r\n' if crlf else '\n'
@@ -0,0 +1,59 @@
+"""Compare editing near the top of a large file using a `list` and
+`ChunkedLines` as the line store.
+
+usage: python -m bench.chunked_lines [--lines N] [--edits N]
+"""
+import argparse
+import gc
+import time
+from typing import Callable
+from typing import Optional
+from typing import Sequence
+
+from babi.chunked_lines import ChunkedLines
+from babi.list_spy import ListSpy
+from babi.list_spy import MutableSequenceNoSlice
+
+
+def _edit_near_top(lines: MutableSequenceNoSlice, edits: int) -> float:
+    spy = ListSpy(lines)
+    start = time.perf_counter()
+    for _ in range(edits):
+        # `enter` followed by `backspace` at the beginning of line 2
+        spy[1] = ''
+        spy.insert(2, 'line_1')
+        victim = spy.pop(2)
+        spy[1] += victim
+    return time.perf_counter() - start
+
+
+def _bench(
+        name: str,
+        factory: Callable[[], MutableSequenceNoSlice],
+        edits: int,
+) -> None:
+    start = time.perf_counter()
+    lines = factory()
+    build = time.perf_counter() - start
+    # don't charge the collection triggered by building to the edits
+    gc.collect()
+    duration = _edit_near_top(lines, edits)
+    per_edit = duration / edits * 1000 * 1000
+    print(f'{name:>12}: build {build:.3f}s, {per_edit:.1f}μs per edit')
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=5000000)
+    parser.add_argument('--edits', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    print(f'{args.edits} edits near line 1 of a {args.lines} line file')
+    lst = [f'line_{i}' for i in range(args.lines)]
+    _bench('list', lst.copy, args.edits)
+    _bench('ChunkedLines', lambda: ChunkedLines(lst), args.edits)
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
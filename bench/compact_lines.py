@@ -0,0 +1,67 @@
+"""Compare the memory used to store log-like lines in a `list` and in
+`CompactLines`.
+
+The size of the `list` is computed from `sys.getsizeof` while the lines are
+generated so very large line counts do not need the memory to hold them.
+
+usage: python -m bench.compact_lines [--lines N [N ...]]
+"""
+import argparse
+import sys
+import time
+from typing import Iterator
+from typing import Optional
+from typing import Sequence
+
+from babi.compact_lines import CompactLines
+
+REPEATED = tuple(
+    f'2020-01-01 INFO worker-{i} heartbeat ok, queue empty' for i in range(16)
+)
+
+
+def _log_lines(n: int) -> Iterator[str]:
+    """every fourth line is distinct, the rest repeat"""
+    for i in range(n):
+        if i % 4 == 0:
+            yield f'{i:09} GET /api/items/{i * 7919 % 1000003} 200 {i % 97}ms'
+        else:
+            yield REPEATED[i % len(REPEATED)]
+
+
+def _list_size(n: int) -> int:
+    # each line from the file is a separate `str` (even when repeated)
+    return sys.getsizeof([None] * n) + sum(map(sys.getsizeof, _log_lines(n)))
+
+
+def _compact_size(lines: CompactLines) -> int:
+    return sys.getsizeof(lines) + sum(map(sys.getsizeof, vars(lines).values()))
+
+
+def _mb(n: int) -> str:
+    return f'{n / 1024 / 1024:,.0f}MiB'
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--lines', type=int, nargs='+',
+        default=[1000000, 10000000, 100000000],
+    )
+    args = parser.parse_args(argv)
+
+    for n in args.lines:
+        text = sum(len(line.encode()) + 1 for line in _log_lines(n))
+        print(f'{n:,} lines ({_mb(text)} of text)')
+        print(f'{"list":>14}: {_mb(_list_size(n))}')
+        start = time.perf_counter()
+        lines = CompactLines(_log_lines(n))
+        duration = time.perf_counter() - start
+        size = _compact_size(lines)
+        print(f'{"CompactLines":>14}: {_mb(size)} (built in {duration:.1f}s)')
+        del lines
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
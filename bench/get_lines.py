@@ -0,0 +1,57 @@
+"""Compare loading a large file with `get_lines` (line by line from a text
+file) and `get_lines_bytes` (chunks of a binary file).
+
+usage: python -m bench.get_lines [--megabytes N] [--crlf]
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+from typing import Optional
+from typing import Sequence
+
+from babi.file import get_lines
+from babi.file import get_lines_bytes
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--megabytes', type=int, default=256)
+    parser.add_argument('--crlf', action='store_true')
+    args = parser.parse_args(argv)
+
+    nl = b'\r\n' if args.crlf else b'\n'
+    block = b''.join(
+        b'%d: the quick brown fox jumps over the lazy dog%s' % (i, nl)
+        for i in range(20000)
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'f')
+        with open(filename, 'wb') as f:
+            for _ in range(args.megabytes * 1024 * 1024 // len(block)):
+                f.write(block)
+        size = os.path.getsize(filename) / 1024 / 1024
+        print(f'loading a {size:.0f}MiB file')
+
+        start = time.perf_counter()
+        with open(filename, newline='') as f:
+            expected = get_lines(f)
+        text_duration = time.perf_counter() - start
+        print(f'{"get_lines":>16}: {text_duration:.2f}s')
+
+        del expected
+        gc.collect()
+
+        start = time.perf_counter()
+        with open(filename, 'rb') as bf:
+            get_lines_bytes(bf)
+        bytes_duration = time.perf_counter() - start
+        print(f'{"get_lines_bytes":>16}: {bytes_duration:.2f}s')
+
+    print(f'{text_duration / bytes_duration:.1f}x faster')
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,55 @@
+"""Compare the peak memory of saving by joining the lines into one string
+and of streaming them with `write_lines`.
+
+usage: python -m bench.save [--lines N]
+"""
+import argparse
+import hashlib
+import os
+import tracemalloc
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from babi.file import write_lines
+
+
+def _join(lines: List[str], nl: str) -> None:
+    contents = nl.join(lines)
+    hashlib.sha256(contents.encode()).hexdigest()
+    with open(os.devnull, 'w') as f:
+        f.write(contents)
+
+
+def _stream(lines: List[str], nl: str) -> None:
+    with open(os.devnull, 'wb') as bf:
+        write_lines(bf, lines, nl)
+
+
+def _peak(
+        name: str,
+        func: Callable[[List[str], str], None],
+        n: int,
+) -> None:
+    lines = [f'line {i}: the quick brown fox' for i in range(n)]
+    tracemalloc.start()
+    func(lines, '\n')
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:>12}: peak {peak / 1024 / 1024:,.1f}MiB')
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=1000000)
+    args = parser.parse_args(argv)
+
+    print(f'saving {args.lines} lines')
+    _peak('join', _join, args.lines)
+    _peak('write_lines', _stream, args.lines)
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,75 @@
+"""Compare finding every match of plain text by searching each line with a
+regex, with `literal_matches` (chunks of lines searched by `str.find`) and
+with `parallel_matches` (chunks of lines searched by a process per cpu).
+
+usage: python -m bench.search [--lines N]
+"""
+import argparse
+import time
+from typing import Callable
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Pattern
+from typing import Sequence
+from typing import Tuple
+
+from babi.search import compile_search
+from babi.search import literal_matches
+from babi.search import parallel_matches
+
+Matcher = Callable[[List[str], Pattern[str]], Iterable[Tuple[int, int]]]
+
+
+def _per_line(lines: List[str], reg: Pattern[str]) -> List[Tuple[int, int]]:
+    ret = []
+    for y, line in enumerate(lines):
+        x = 0
+        while x <= len(line):
+            match = reg.search(line, x)
+            if match is None:
+                break
+            ret.append((y, match.start()))
+            x = match.start() + 1
+    return ret
+
+
+def _literal(lines: List[str], reg: Pattern[str]) -> List[Tuple[int, int]]:
+    return list(literal_matches(lines, reg, 0, len(lines)))
+
+
+def _parallel(lines: List[str], reg: Pattern[str]) -> List[Tuple[int, int]]:
+    return list(parallel_matches(lines, reg, 0, len(lines)))
+
+
+def _bench(
+        name: str,
+        func: Matcher,
+        lines: List[str],
+        reg: Pattern[str],
+) -> List[Tuple[int, int]]:
+    start = time.perf_counter()
+    ret = list(func(lines, reg))
+    print(f'{name:>12}: {time.perf_counter() - start:.3f}s')
+    return ret
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=2000000)
+    args = parser.parse_args(argv)
+
+    lines = [f'line {i}: the quick brown fox' for i in range(args.lines)]
+    lines[args.lines // 2] += ' needle'
+    lines.append('')
+    for s in ('needle', 'Needle', 'missing'):
+        reg = compile_search(s)
+        print(f'{s!r} in {args.lines} lines')
+        expected = _bench('per line', _per_line, lines, reg)
+        assert _bench('literal', _literal, lines, reg) == expected
+        assert _bench('parallel', _parallel, lines, reg) == expected
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
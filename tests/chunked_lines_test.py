@@ -0,0 +1,107 @@
+import random
+from typing import List
+from unittest import mock
+
+import pytest
+
+from babi.chunked_lines import ChunkedLines
+from babi.list_spy import ListSpy
+
+
+@pytest.fixture(autouse=True)
+def small_chunks():
+    with mock.patch('babi.chunked_lines.LOAD', 2):
+        yield
+
+
+def test_chunked_lines_repr():
+    assert repr(ChunkedLines(['a', 'b'])) == "ChunkedLines(['a', 'b'])"
+
+
+def test_chunked_lines_item_retrieval():
+    lines = ChunkedLines('abcdefg')
+    assert lines[1] == 'b'
+    assert lines[5] == 'f'
+    assert lines[-1] == 'g'
+    with pytest.raises(IndexError):
+        lines[7]
+    with pytest.raises(IndexError):
+        ChunkedLines()[0]
+
+
+def test_chunked_lines_iter():
+    assert list(ChunkedLines('abcdefg')) == list('abcdefg')
+
+
+def test_chunked_lines_set_value():
+    lines = ChunkedLines('abcdefg')
+    lines[4] = 'hello'
+    assert list(lines) == ['a', 'b', 'c', 'd', 'hello', 'f', 'g']
+
+
+def test_chunked_lines_insert_into_empty():
+    lines = ChunkedLines()
+    lines.insert(0, 'a')
+    lines.append('b')
+    lines.insert(-1, 'c')
+    assert list(lines) == ['a', 'c', 'b']
+    assert len(lines) == 3
+
+
+def test_chunked_lines_delete_everything():
+    lines = ChunkedLines('abc')
+    for _ in range(3):
+        del lines[0]
+    assert len(lines) == 0
+    assert list(lines) == []
+
+
+def test_chunked_lines_matches_list():
+    rand = random.Random(0)
+    lst: List[str] = []
+    lines = ChunkedLines()
+    for i in range(2000):
+        op = rand.choice(('insert', 'insert', 'del', 'set', 'pop'))
+        if op == 'insert':
+            idx = rand.randint(-len(lst) - 1, len(lst) + 1)
+            lst.insert(idx, str(i))
+            lines.insert(idx, str(i))
+        elif op == 'del' and lst:
+            idx = rand.randrange(-len(lst), len(lst))
+            del lst[idx]
+            del lines[idx]
+        elif op == 'set' and lst:
+            idx = rand.randrange(len(lst))
+            lst[idx] = lines[idx] = str(i)
+        elif op == 'pop' and lst:
+            assert lines.pop() == lst.pop()
+
+        assert len(lines) == len(lst)
+        if lst:
+            idx = rand.randrange(-len(lst), len(lst))
+            assert lines[idx] == lst[idx]
+    assert list(lines) == lst
+
+
+def test_chunked_lines_with_list_spy():
+    lines = ChunkedLines('abcdefg')
+
+    spy = ListSpy(lines)
+    spy.insert(1, 'q')
+    spy[5] = 'hello'
+    del spy[0]
+    spy.pop()
+
+    assert list(lines) == ['q', 'b', 'c', 'd', 'hello', 'f']
+
+    spy.undo(lines)
+
+    assert list(lines) == list('abcdefg')
+
+
+def test_chunked_lines_snapshot():
+    lines = ChunkedLines('abcde')
+    snapshot = lines.snapshot()
+    lines[0] = 'q'
+    lines.insert(1, 'r')
+    assert list(snapshot) == list('abcde')
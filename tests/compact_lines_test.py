@@ -0,0 +1,83 @@
+import random
+from typing import List
+
+import pytest
+
+from babi.compact_lines import CompactLines
+from babi.list_spy import ListSpy
+
+
+def test_compact_lines_repr():
+    assert repr(CompactLines(['a', 'b'])) == "CompactLines(['a', 'b'])"
+
+
+def test_compact_lines_item_retrieval():
+    lines = CompactLines(['a', 'wörld', '', 'a'])
+    assert lines[1] == 'wörld'
+    assert lines[2] == ''
+    assert lines[-1] == 'a'
+    with pytest.raises(IndexError):
+        lines[4]
+
+
+def test_compact_lines_stores_repeated_lines_once():
+    lines = CompactLines(['hello', 'world'] * 1000)
+    assert len(lines) == 2000
+    assert bytes(lines._blob) == b'helloworld'
+    assert list(lines) == ['hello', 'world'] * 1000
+
+
+def test_compact_lines_many_distinct_lines():
+    lst = [str(i) for i in range(1000)] * 2
+    lines = CompactLines(lst)
+    assert list(lines) == lst
+    assert len(lines._offsets) == 1001
+
+
+def test_compact_lines_matches_list():
+    rand = random.Random(0)
+    lst: List[str] = []
+    lines = CompactLines()
+    for i in range(2000):
+        op = rand.choice(('insert', 'insert', 'del', 'set', 'pop'))
+        val = str(rand.randrange(50))
+        if op == 'insert':
+            idx = rand.randint(-len(lst) - 1, len(lst) + 1)
+            lst.insert(idx, val)
+            lines.insert(idx, val)
+        elif op == 'del' and lst:
+            idx = rand.randrange(-len(lst), len(lst))
+            del lst[idx]
+            del lines[idx]
+        elif op == 'set' and lst:
+            idx = rand.randrange(len(lst))
+            lst[idx] = lines[idx] = val
+        elif op == 'pop' and lst:
+            assert lines.pop() == lst.pop()
+
+        assert len(lines) == len(lst)
+    assert list(lines) == lst
+
+
+def test_compact_lines_with_list_spy():
+    lines = CompactLines('abcdefg')
+
+    spy = ListSpy(lines)
+    spy.insert(1, 'q')
+    spy[5] = 'hello'
+    del spy[0]
+    spy.pop()
+
+    assert list(lines) == ['q', 'b', 'c', 'd', 'hello', 'f']
+
+    spy.undo(lines)
+
+    assert list(lines) == list('abcdefg')
+
+
+def test_compact_lines_snapshot():
+    lines = CompactLines('abcde')
+    snapshot = lines.snapshot()
+    lines[0] = 'q'
+    lines.insert(1, 'r')
+    assert list(snapshot) == list('abcde')
@@ -0,0 +1,50 @@
+import bz2
+import gzip
+import io
+import lzma
+
+import pytest
+
+from babi.compression import detect_compression
+from babi.compression import open_compressor
+from babi.compression import open_decompressed
+
+
+@pytest.mark.parametrize(
+    ('compress', 'expected'),
+    (
+        (gzip.compress, 'gzip'),
+        (bz2.compress, 'bz2'),
+        (lzma.compress, 'xz'),
+    ),
+)
+@pytest.mark.parametrize('s', (b'', b'hello\nworld\n'))
+def test_detect_compression(tmpdir, compress, expected, s):
+    f = tmpdir.join('f')
+    f.write_binary(compress(s))
+    assert detect_compression(f) == expected
+    with open_decompressed(f, expected) as bf:
+        assert bf.read() == s
+
+
+@pytest.mark.parametrize('s', (b'', b'hello\n', b'BZh9 is not bz2\n'))
+def test_detect_compression_not_compressed(tmpdir, s):
+    f = tmpdir.join('f')
+    f.write_binary(s)
+    assert detect_compression(f) is None
+
+
+@pytest.mark.parametrize(
+    ('compression', 'decompress'),
+    (
+        ('gzip', gzip.decompress),
+        ('bz2', bz2.decompress),
+        ('xz', lzma.decompress),
+    ),
+)
+def test_open_compressor(compression, decompress):
+    bio = io.BytesIO()
+    with open_compressor(bio, compression, 'f.gz') as cf:
+        cf.write(b'hello\n')
+    assert not bio.closed
+    assert decompress(bio.getvalue()) == b'hello\n'
@@ -0,0 +1,35 @@
+from unittest import mock
+
+import pytest
+
+from testing.runner import and_exit
+from tests.features.conftest import run_fake
+
+
+@pytest.fixture(autouse=True)
+def always_chunked():
+    with mock.patch('babi.file.CHUNKED_LINES_THRESHOLD', 1):
+        with mock.patch('babi.chunked_lines.LOAD', 2):
+            yield
+
+
+def test_chunked_file_editing_and_undo(ten_lines):
+    with run_fake(str(ten_lines)) as h, and_exit(h):
+        h.await_text('line_9')
+        h.press('Down')
+        h.press('Enter')
+        h.press('Enter')
+        h.press('^K')
+        h.press('^K')
+        h.press('^U')
+        h.await_text('line_2')
+        h.press('^S')
+        h.await_text('saved! (12 lines written)')
+        for _ in range(3):
+            h.press('M-u')
+        h.await_text('undo: line break')
+        h.press('^S')
+        h.await_text('saved! (10 lines written)')
+
+    expected = ''.join(f'line_{i}\n' for i in range(10))
+    assert ten_lines.read() == expected
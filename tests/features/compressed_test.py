@@ -0,0 +1,62 @@
+import bz2
+import gzip
+import lzma
+from unittest import mock
+
+import pytest
+
+from testing.runner import and_exit
+from tests.features.conftest import run_fake
+
+
+@pytest.fixture(
+    params=(
+        ('f.gz', gzip.compress, gzip.decompress),
+        ('f.bz2', bz2.compress, bz2.decompress),
+        ('f.xz', lzma.compress, lzma.decompress),
+    ),
+    ids=('gzip', 'bz2', 'xz'),
+)
+def compressed(request, tmpdir):
+    name, compress, decompress = request.param
+    f = tmpdir.join(name)
+    f.write_binary(compress(b'hello\nworld\n'))
+    return f, decompress
+
+
+def test_edit_compressed_file(compressed):
+    f, decompress = compressed
+    with run_fake(str(f)) as h, and_exit(h):
+        h.await_text('hello\nworld')
+        h.press('Down')
+        h.press('hi ')
+        h.press('^S')
+        h.await_text('saved! (2 lines written)')
+        h.await_text_missing('*')
+
+    assert decompress(f.read_binary()) == b'hello\nhi world\n'
+
+
+def test_compressed_file_loads_in_background(compressed):
+    f, decompress = compressed
+    with mock.patch('babi.file.COMPRESSED_LOAD_THRESHOLD', 0):
+        with run_fake(str(f)) as h, and_exit(h):
+            h.press('^C')
+            h.await_text('line 1, col 1 (of 2 lines)')
+            h.press('a')
+            h.press('^S')
+            h.await_text('saved! (2 lines written)')
+
+    assert decompress(f.read_binary()) == b'ahello\nworld\n'
+
+
+def test_compressed_file_changed_on_disk(compressed):
+    f, decompress = compressed
+    with run_fake(str(f)) as h, and_exit(h):
+        h.await_text('hello')
+        h.run(lambda: f.write_binary(gzip.compress(b'hello\nworld\n')))
+        h.press('^S')
+        h.await_text('saved! (2 lines written)')
+        h.run(lambda: f.write_binary(gzip.compress(b'changed\n')))
+        h.press('^S')
+        h.await_text('file changed on disk, not implemented')
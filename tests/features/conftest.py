@@ -162,6 +162,9 @@ class CursesScreen:
     def nodelay(self, val):
         pass
 
+    def timeout(self, delay):
+        pass
+
 
 class Key(NamedTuple):
     tmux: str
@@ -312,6 +315,9 @@ class DeferredRunner:
     def _curses_keyname(self, k):
         return KEYS_CURSES.get(k, b'')
 
+    def _curses_unget_wch(self, wch):
+        self._i -= 1
+
     def _curses_update_lines_cols(self):
         curses.LINES = self.screen.height
         curses.COLS = self.screen.width
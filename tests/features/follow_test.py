@@ -0,0 +1,116 @@
+from testing.runner import and_exit
+from tests.features.conftest import run_fake
+
+
+def _append(f, s):
+    return lambda: f.write(s, mode='a')
+
+
+def test_follow_appends_lines(tmpdir):
+    f = tmpdir.join('f')
+    f.write(''.join(f'line_{i}\n' for i in range(10)))
+
+    with run_fake('--follow', str(f), height=8) as h, and_exit(h):
+        h.await_text('line_9')
+        h.await_text_missing('line_0')
+        h.run(_append(f, 'line_10\nline_1'))
+        h.press('^C')
+        h.await_text('line_10\nline_1\n')
+        h.run(_append(f, '1\nline_12\n'))
+        h.press('^C')
+        # the view stays at the end
+        h.await_text('line_11\nline_12\n')
+        h.await_cursor_position(x=0, y=6)
+        h.await_text('line_8')
+        h.await_text_missing(' *')
+
+        h.press('^S')
+        h.await_text('saved! (13 lines written)')
+        h.press('M-f')
+        h.await_text('not following (open the file with --follow)')
+
+    assert f.read() == ''.join(f'line_{i}\n' for i in range(13))
+
+
+def test_follow_not_at_end_does_not_scroll(tmpdir):
+    f = tmpdir.join('f')
+    f.write(''.join(f'line_{i}\n' for i in range(10)))
+
+    with run_fake('--follow', str(f), height=8) as h, and_exit(h):
+        h.await_text('line_9')
+        h.await_text('line_5')
+        h.press('Up')
+        h.run(_append(f, 'line_10\nline_11\n'))
+        h.press('^C')
+        h.await_text('line_10')
+        h.await_text('line_5')
+        h.await_cursor_position(x=0, y=5)
+
+
+def test_follow_toggle(tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+
+    with run_fake('--follow', str(f)) as h, and_exit(h):
+        h.await_text('hello')
+        h.press('M-f')
+        h.await_text('stopped following')
+        h.run(_append(f, 'world\n'))
+        h.press('^C')
+        h.await_text('line 2, col 1 (of 1 line)')
+        h.await_text_missing('world')
+        h.press('M-f')
+        h.await_text('following')
+        h.press('^C')
+        h.await_text('world')
+
+
+def test_follow_paused_while_modified(tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+
+    with run_fake('--follow', str(f)) as h, and_exit(h):
+        h.await_text('hello')
+        h.press('a')
+        h.run(_append(f, 'world\n'))
+        h.press('^C')
+        h.await_text_missing('world')
+        h.press('M-u')
+        h.await_text('undo: text')
+        h.press('^C')
+        h.await_text('world')
+
+
+def test_follow_stops_when_truncated(tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+
+    with run_fake('--follow', str(f)) as h, and_exit(h):
+        h.await_text('hello')
+        h.run(lambda: f.write(''))
+        h.press('^C')
+        h.await_text('file was truncated or replaced, stopped following')
+        h.press('M-f')
+        h.await_text('not following (open the file with --follow)')
+
+
+def test_toggle_follow_without_follow(tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+
+    with run_fake(str(f)) as h, and_exit(h):
+        h.await_text('hello')
+        h.press('M-f')
+        h.await_text('not following (open the file with --follow)')
+
+
+def test_follow_stops_when_removed(tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+
+    with run_fake('--follow', str(f)) as h, and_exit(h):
+        h.await_text('hello')
+        h.run(f.remove)
+        h.press('^C')
+        h.await_text('file was truncated or replaced, stopped following')
+        h.await_text('hello')
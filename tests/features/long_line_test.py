@@ -0,0 +1,74 @@
+from unittest import mock
+
+import pytest
+
+from testing.runner import and_exit
+from tests.features.conftest import run_fake
+
+
+@pytest.fixture(autouse=True)
+def small_gap_buffer_threshold():
+    with mock.patch('babi.file.GAP_BUFFER_THRESHOLD', 5):
+        yield
+
+
+def test_long_line_editing(tmpdir):
+    f = tmpdir.join('f')
+    f.write(f'{"0123456789" * 3}\nshort\n')
+
+    with run_fake(str(f), width=20) as h, and_exit(h):
+        h.await_text('0123456789012345678»')
+        for _ in range(22):
+            h.press('Right')
+        h.press('a')
+        h.press('b')
+        h.await_text('«345678901ab23456789')
+        h.press('BSpace')
+        h.press('DC')
+        h.press('DC')
+        h.await_text('«345678901a456789\n')
+        h.press('End')
+        h.press('DC')
+        h.await_text('«345678901a456789sh»')
+        h.press('^S')
+        h.await_text('saved!')
+
+    assert f.read() == f'{"0123456789" * 2}01a456789short\n'
+
+
+def test_long_line_undo(tmpdir):
+    f = tmpdir.join('f')
+    f.write('0123456789\n')
+
+    with run_fake(str(f)) as h, and_exit(h):
+        h.await_text('0123456789')
+        h.press('a')
+        h.press('b')
+        h.press('DC')
+        h.await_text('ab123456789')
+        h.press('M-u')
+        h.await_text('undo: delete text')
+        h.await_text('ab0123456789')
+        h.press('M-u')
+        h.await_text('undo: text')
+        h.await_text('\n0123456789')
+        h.press('M-U')
+        h.await_text('redo: text')
+        h.await_text('ab0123456789')
+        h.press('^S')
+
+    assert f.read() == 'ab0123456789\n'
+
+
+def test_long_line_modified(tmpdir):
+    f = tmpdir.join('f')
+    f.write('0123456789\n')
+
+    with run_fake(str(f)) as h, and_exit(h):
+        h.await_text('0123456789')
+        h.press('a')
+        h.press('BSpace')
+        # still being edited in the gap buffer
+        h.await_text(' *')
+        h.press('Right')
+        h.await_text_missing(' *')
@@ -0,0 +1,63 @@
+from unittest import mock
+
+import pytest
+
+from testing.runner import and_exit
+from tests.features.conftest import run_fake
+
+
+@pytest.fixture(autouse=True)
+def always_mapped():
+    with mock.patch('babi.file.MAPPED_LINES_THRESHOLD', 1):
+        yield
+
+
+def test_mapped_file_displays_and_edits(ten_lines):
+    with run_fake(str(ten_lines)) as h, and_exit(h):
+        h.await_text('line_9')
+        h.press('^End')
+        h.press('hello')
+        h.press('Up')
+        h.press('Enter')
+        h.await_text('hello')
+        h.await_text('line_0')
+
+        h.press('^S')
+        h.await_text('saved! (12 lines written)')
+
+        h.press('^Home')
+        h.press('^K')
+        h.press('^S')
+        h.await_text('saved! (11 lines written)')
+        h.await_text_missing('line_0')
+
+    expected = '\n'.join(f'line_{i}' for i in range(1, 9))
+    assert ten_lines.read() == f'{expected}\nline_\n9\nhello\n'
+
+
+def test_mapped_file_save_keeps_permissions(tmpdir):
+    f = tmpdir.join('f')
+    f.write('a\n')
+    f.chmod(0o751)
+    with run_fake(str(f)) as h, and_exit(h):
+        h.press('b')
+        h.press('^S')
+        h.await_text('saved! (1 line written)')
+
+    assert f.read() == 'ba\n'
+    assert f.stat().mode & 0o777 == 0o751
+
+
+def test_mapped_file_saved_empty(tmpdir):
+    f = tmpdir.join('f')
+    f.write('a\n')
+    with run_fake(str(f)) as h, and_exit(h):
+        h.press('^K')
+        h.press('^S')
+        h.await_text('saved! (0 lines written)')
+        h.press('hi')
+        h.await_text('hi')
+        h.press('^S')
+        h.await_text('saved! (1 line written)')
+
+    assert f.read() == 'hi\n'
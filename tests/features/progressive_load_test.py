@@ -0,0 +1,73 @@
+import threading
+from unittest import mock
+
+import pytest
+
+from babi.file import _Loader
+from testing.runner import and_exit
+
+
+@pytest.fixture
+def big_file(tmpdir):
+    f = tmpdir.join('f')
+    f.write(''.join(f'line_{i}\n' for i in range(200000)))
+    return f
+
+
+@pytest.fixture
+def paused_loader():
+    event = threading.Event()
+    orig = _Loader._feed
+
+    def _feed(self, chunk):
+        orig(self, chunk)
+        event.wait()
+
+    with mock.patch.object(_Loader, '_feed', _feed):
+        yield event
+
+
+def test_progressive_load(run, big_file):
+    with run(str(big_file)) as h, and_exit(h):
+        h.await_text('line_0')
+        h.press('^End')
+        h.await_text('line_199999')
+        h.await_text_missing('loading')
+        h.press('^C')
+        h.await_text('line 200001, col 1 (of 200000 lines)')
+
+
+def test_progressive_load_edit_waits_for_file(run, big_file):
+    with run(str(big_file)) as h, and_exit(h):
+        h.await_text('line_0')
+        h.press('hello ')
+        h.await_text('hello line_0')
+        h.press('^S')
+        h.await_text('saved! (200000 lines written)')
+
+    assert big_file.read().startswith('hello line_0\nline_1\n')
+
+
+def test_progressive_load_mixed_newlines(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write_binary(b'a\r\n' + b''.join(b'%d\n' % i for i in range(300000)))
+    with run(str(f)) as h, and_exit(h):
+        h.press('^End')
+        h.await_text('299999')
+        h.await_text(r"mixed newlines will be converted to '\n'")
+        h.await_text('f *')
+
+
+def test_progressive_load_shows_progress(big_file, paused_loader):
+    from tests.features.conftest import run_fake
+
+    with run_fake(str(big_file)) as h, and_exit(h):
+        h.await_text('line_0')
+        h.await_text('(loading 2%)')
+        h.run(paused_loader.set)
+        h.press('Down')
+        h.await_cursor_position(x=0, y=2)
+        h.press('^_')
+        h.press_and_enter('123456')
+        h.await_text('line_123455')
+        h.await_text_missing('loading')
@@ -0,0 +1,77 @@
+import shutil
+
+from babi.recovery import _recovery_path
+from testing.runner import and_exit
+from tests.recovery_test import _wait_for_changes
+
+
+def _crashed_session(run, f, *keys, changes):
+    """edit the file and keep the recovery journal as if babi had died"""
+    saved = f.dirpath().join('saved_journal')
+
+    def _keep_journal():
+        _wait_for_changes(str(f), changes)
+        shutil.copy(_recovery_path(str(f)), str(saved))
+
+    with run(str(f)) as h:
+        for key in keys:
+            h.press(key)
+        h.run(_keep_journal)
+        h.press('^X')
+        h.await_text('file is modified - save [y(es), n(o)]?')
+        h.press('n')
+        h.await_exit()
+
+    shutil.copy(str(saved), _recovery_path(str(f)))
+
+
+def test_recover_unsaved_changes(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\nworld\n')
+    _crashed_session(run, f, 'Down', 'x', 'y', 'Enter', 'z', changes=4)
+
+    with run(str(f)) as h, and_exit(h):
+        h.await_text('unsaved changes found - recover [y(es), n(o)]?')
+        h.press('y')
+        h.await_text('recovered unsaved changes')
+        h.await_text('hello\nxy\nzworld\n')
+        h.await_text('f *')
+        h.press('M-u')
+        h.await_text('undo: recover')
+        h.await_text('hello\nworld\n')
+        h.press('M-U')
+        h.press('^S')
+        h.await_text('saved!')
+
+    assert f.read() == 'hello\nxy\nzworld\n'
+
+    with run(str(f)) as h, and_exit(h):
+        h.await_text('hello')
+        h.await_text_missing('unsaved changes found')
+
+
+def test_recover_declined(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+    _crashed_session(run, f, 'x', changes=1)
+
+    with run(str(f)) as h, and_exit(h):
+        h.await_text('unsaved changes found - recover [y(es), n(o)]?')
+        h.press('n')
+        h.await_text('hello')
+        h.await_text_missing('xhello')
+
+    with run(str(f)) as h, and_exit(h):
+        h.await_text('hello')
+        h.await_text_missing('unsaved changes found')
+
+
+def test_recover_file_changed_on_disk(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+    _crashed_session(run, f, 'x', changes=1)
+    f.write('changed\n')
+
+    with run(str(f)) as h, and_exit(h):
+        h.await_text('changed')
+        h.await_text_missing('unsaved changes found')
@@ -123,6 +123,58 @@ def test_replace_all(run, ten_lines):
         h.await_text('replaced 10 occurrences')
 
 
+def test_replace_all_undone_at_once(run, ten_lines):
+    with run(str(ten_lines)) as h, and_exit(h):
+        h.press('^\\')
+        h.await_text('search (to replace):')
+        h.press_and_enter('line_')
+        h.await_text('replace with:')
+        h.press_and_enter('l')
+        h.await_text('replace [y(es), n(o), a(ll)]?')
+        h.press('y')
+        h.await_text('l0')
+        h.press('a')
+        h.await_text('replaced 10 occurrences')
+        h.await_text_missing('line_')
+        h.press('M-u')
+        h.await_text('undo: replace')
+        h.await_text('l0\nline_1')
+        h.await_text('line_9')
+
+
+def test_replace_all_after_wrapping(run, ten_lines):
+    with run(str(ten_lines)) as h, and_exit(h):
+        for _ in range(5):
+            h.press('Down')
+        h.press('Right')
+        h.press('^\\')
+        h.await_text('search (to replace):')
+        h.press_and_enter('(line|ne)_')
+        h.await_text('replace with:')
+        h.press_and_enter('')
+        h.await_text('replace [y(es), n(o), a(ll)]?')
+        h.press('a')
+        h.await_text('replaced 10 occurrences')
+        h.await_text('0\n1\n2\n3\n4\nli5\n6\n7\n8\n9\n')
+        h.await_cursor_position(x=2, y=6)
+
+
+def test_replace_all_adding_and_removing_lines(run, ten_lines):
+    with run(str(ten_lines)) as h, and_exit(h):
+        h.press('^\\')
+        h.await_text('search (to replace):')
+        h.press_and_enter(r'line_([0-3])(\n)?')
+        h.await_text('replace with:')
+        h.press_and_enter(r'\1\n\1')
+        h.await_text('replace [y(es), n(o), a(ll)]?')
+        h.press('a')
+        h.await_text('replaced 4 occurrences')
+        h.await_text('0\n01\n12\n23\n3line_4\n')
+        h.await_cursor_position(x=0, y=1)
+        h.press('M-u')
+        h.await_text('line_0\nline_1\nline_2\nline_3\nline_4\n')
+
+
 def test_replace_with_empty_string(run, ten_lines):
     with run(str(ten_lines)) as h, and_exit(h):
         h.press('^\\')
@@ -272,3 +324,35 @@ def test_replace_separate_line_after_wrapping(run, ten_lines):
         h.await_text_missing('line_0')
         h.press('y')
         h.await_text_missing('line_1')
+
+
+def test_replace_across_lines(run, ten_lines):
+    with run(str(ten_lines)) as h, and_exit(h):
+        h.press('^\\')
+        h.await_text('search (to replace):')
+        h.press_and_enter(r'_(\d)\nline_(\d)')
+        h.await_text('replace with:')
+        h.press_and_enter(r'_\1\2')
+        h.await_text('replace [y(es), n(o), a(ll)]?')
+        h.press('a')
+        h.await_text('replaced 5 occurrences')
+        h.await_text('line_01\nline_23')
+        h.await_text('line_89\n')
+        h.press('M-u')
+        h.await_text('line_0\nline_1\nline_2')
+        h.await_text('line_8\nline_9')
+
+
+def test_replace_adding_lines(run, ten_lines):
+    with run(str(ten_lines)) as h, and_exit(h):
+        h.press('^\\')
+        h.await_text('search (to replace):')
+        h.press_and_enter(r'line_(1|2)')
+        h.await_text('replace with:')
+        h.press_and_enter(r'a\1\nb\1')
+        h.await_text('replace [y(es), n(o), a(ll)]?')
+        h.press('y')
+        h.await_text('a1\nb1\nline_2')
+        h.press('y')
+        h.await_text('replaced 2 occurrences')
+        h.await_text('a1\nb1\na2\nb2\nline_3')
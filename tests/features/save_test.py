@@ -1,6 +1,12 @@
+import os
+import threading
+from unittest import mock
+
 import pytest
 
+from babi.file import _Saver
 from testing.runner import and_exit
+from tests.features.conftest import run_fake
 
 
 def test_mixed_newlines(run, tmpdir):
@@ -59,6 +65,152 @@ def test_saving_file_on_disk_changes(run, tmpdir):
         h.await_text('file changed on disk, not implemented')
 
 
+def test_saving_file_on_disk_changes_same_size(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+
+    def change() -> None:
+        f.write('world\n')
+        os.utime(f, ns=(0, 0))
+
+    with run(str(f)) as h, and_exit(h):
+        h.await_text('hello')
+        h.run(change)
+        h.press('a')
+        h.press('^S')
+        h.await_text('file changed on disk, not implemented')
+
+
+def test_save_does_not_rehash_unchanged_file(tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+
+    with mock.patch('babi.screen.get_lines_bytes') as get_lines_bytes:
+        with run_fake(str(f)) as h, and_exit(h):
+            h.press('a')
+            h.press('^S')
+            h.await_text('saved! (1 line written)')
+            h.press('b')
+            h.press('^S')
+            h.await_text('saved! (1 line written)')
+
+    get_lines_bytes.assert_not_called()
+    assert f.read() == 'abhello\n'
+
+
+def test_save_crlf_file_touched_on_disk(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write_binary(b'hello\r\n')
+
+    with run(str(f)) as h, and_exit(h):
+        h.await_text('hello')
+        h.run(lambda: os.utime(f, ns=(0, 0)))
+        h.press('a')
+        h.press('^S')
+        h.await_text('saved! (1 line written)')
+
+    assert f.read_binary() == b'ahello\r\n'
+
+
+def test_save_keeps_permissions_and_leaves_no_temporary_files(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+    f.chmod(0o751)
+
+    with run(str(f)) as h, and_exit(h):
+        h.await_text('hello')
+        h.press('a')
+        h.press('^S')
+        h.await_text('saved! (1 line written)')
+
+    assert f.read() == 'ahello\n'
+    assert f.stat().mode & 0o777 == 0o751
+    assert tmpdir.listdir('.f*') == []
+
+
+def test_save_through_symlink(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+    link = tmpdir.join('link')
+    link.mksymlinkto(f)
+
+    with run(str(link)) as h, and_exit(h):
+        h.await_text('hello')
+        h.press('a')
+        h.press('^S')
+        h.await_text('saved! (1 line written)')
+
+    assert link.islink()
+    assert f.read() == 'ahello\n'
+
+
+def test_save_error(run, tmpdir):
+    f = tmpdir.join('d').join('f')
+
+    with run(str(f)) as h, and_exit(h):
+        h.press('hello')
+        h.press('^S')
+        h.await_text('error saving: [Errno 2] No such file or directory')
+        h.await_text('f *')
+        h.press('^X')
+        h.await_text('file is modified - save [y(es), n(o)]?')
+        h.press('y')
+        h.press('Enter')
+        h.await_text('error saving: [Errno 2] No such file or directory')
+
+
+class PausedSaver:
+    def __init__(self):
+        self.event = threading.Event()
+        self.savers = []
+
+    def finish(self):
+        self.event.set()
+        for saver in self.savers:
+            saver.wait()
+
+
+@pytest.fixture
+def paused_saver():
+    paused = PausedSaver()
+    orig = _Saver._save
+
+    def _save(self):
+        paused.savers.append(self)
+        paused.event.wait()
+        orig(self)
+
+    with mock.patch.object(_Saver, '_save', _save):
+        with mock.patch('babi.file.SAVE_BLOCK_SECONDS', 0):
+            yield paused
+
+
+def test_save_in_background(tmpdir, paused_saver):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+
+    with run_fake(str(f)) as h, and_exit(h):
+        h.press('a')
+        h.press('^S')
+        h.await_text('saving...')
+        h.press('b')
+        h.await_text('abhello')
+        h.run(paused_saver.finish)
+        h.press('Left')
+        h.await_text('saved! (1 line written)')
+        # still modified: the saved file doesn't have the last edit
+        h.await_text('f *')
+        h.press('M-u')
+        h.await_text('ahello')
+        h.await_text_missing('f *')
+        h.press('M-U')
+        h.await_text('f *')
+        h.press('^S')
+        # exiting waits for the save to finish
+
+    assert f.read() == 'abhello\n'
+
+
 def test_allows_saving_same_contents_as_modified_contents(run, tmpdir):
     f = tmpdir.join('f')
 
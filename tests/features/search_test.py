@@ -24,6 +24,65 @@ def test_search_find_next_line(run, ten_lines):
         h.await_cursor_position(x=0, y=2)
 
 
+def test_search_shows_which_match(run, ten_lines):
+    with run(str(ten_lines)) as h, and_exit(h):
+        h.press('^W')
+        h.await_text('search:')
+        h.press_and_enter('^line_')
+        h.await_text('match 2 of 10')
+        h.press('^W')
+        h.press('Enter')
+        h.await_text('match 3 of 10')
+        h.press('^End')
+        h.press('^W')
+        h.press('Enter')
+        h.await_text('search wrapped, match 1 of 10')
+        h.await_cursor_position(x=0, y=1)
+
+
+def test_search_smart_case(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write('x\nHELLO\nhello\n')
+    with run(str(f)) as h, and_exit(h):
+        h.press('^W')
+        h.await_text('search:')
+        h.press_and_enter('hello')
+        h.await_text('match 1 of 2')
+        h.await_cursor_position(x=0, y=2)
+        h.press('^W')
+        h.press_and_enter('HELLO')
+        h.await_text('this is the only occurrence')
+
+
+def test_search_across_lines(run, ten_lines):
+    with run(str(ten_lines)) as h, and_exit(h):
+        h.press('^W')
+        h.await_text('search:')
+        h.press_and_enter(r'[35]\nline')
+        h.await_cursor_position(x=5, y=4)
+        h.press('^W')
+        h.press('Enter')
+        h.await_cursor_position(x=5, y=6)
+        h.press('^W')
+        h.press('Enter')
+        h.await_text('search wrapped')
+        h.await_cursor_position(x=5, y=4)
+
+
+def test_search_match_count_follows_edits(run, ten_lines):
+    with run(str(ten_lines)) as h, and_exit(h):
+        h.press('^W')
+        h.await_text('search:')
+        h.press_and_enter('^line_')
+        h.await_text('match 2 of 10')
+        h.press('Enter')
+        h.press('line_')
+        h.press('Enter')
+        h.press('^W')
+        h.press('Enter')
+        h.await_text('match 4 of 11')
+
+
 def test_search_find_later_in_line(run):
     with run() as h, and_exit(h):
         h.press_and_enter('lol')
@@ -106,6 +165,50 @@ def test_search_repeated_search(run, ten_lines):
         h.await_cursor_position(x=0, y=3)
 
 
+@pytest.fixture
+def hundred_lines(tmpdir):
+    f = tmpdir.join('f')
+    f.write(''.join(f'line_{i}\n' for i in range(100)))
+    return f
+
+
+def test_search_moves_while_typing(run, hundred_lines):
+    with run(str(hundred_lines)) as h, and_exit(h):
+        h.await_text_missing('line_50')
+        h.press('^W')
+        h.await_text('search:')
+        h.press('line_50')
+        h.await_text('line_50')
+        h.await_text('search: line_50')
+        h.press('BSpace')
+        h.await_text_missing('line_50')
+        h.press('Enter')
+        h.await_cursor_position(x=0, y=6)
+
+
+def test_search_moves_while_typing_cancelled(run, hundred_lines):
+    with run(str(hundred_lines)) as h, and_exit(h):
+        h.press('^W')
+        h.await_text('search:')
+        h.press('line_50')
+        h.await_text('line_50')
+        h.press('^C')
+        h.await_text('cancelled')
+        h.await_text_missing('line_50')
+        h.await_cursor_position(x=0, y=1)
+
+
+def test_search_moves_while_typing_submitted(run, hundred_lines):
+    with run(str(hundred_lines)) as h, and_exit(h):
+        h.press('^W')
+        h.await_text('search:')
+        h.press('line_5[0-9]')
+        h.await_text('line_59')
+        h.press('Enter')
+        h.await_text('line_59')
+        h.await_cursor_position(x=0, y=12)
+
+
 def test_search_history_recorded(run):
     with run() as h, and_exit(h):
         h.press('^W')
@@ -0,0 +1,59 @@
+import os
+from unittest import mock
+
+import pytest
+
+from babi.main import main
+from testing.runner import and_exit
+from tests.features.conftest import run_fake
+
+
+@pytest.fixture
+def pipe():
+    r, w = os.pipe()
+    with open(r, 'rb', buffering=0) as rf, open(w, 'wb', buffering=0) as wf:
+        with mock.patch('babi.main._open_stdin', return_value=rf):
+            with mock.patch('sys.stdin.isatty', return_value=False):
+                yield wf
+
+
+def test_stdin_streams_in(pipe, tmpdir):
+    pipe.write(b''.join(b'line_%d\n' % i for i in range(30)))
+
+    with run_fake('-', height=10) as h, and_exit(h):
+        h.await_text('<<new file>> (loading')
+        h.await_text('line_7')
+        # moving doesn't wait for the rest of stdin
+        h.press('Down')
+        h.run(lambda: pipe.write(b'line_30\n'))
+        h.run(pipe.close)
+        # waits for the end of stdin
+        h.press('^C')
+        h.await_text('line 2, col 1 (of 31 lines)')
+        h.press('^End')
+        h.await_text('line_30')
+        h.await_text_missing('(loading')
+        h.await_text_missing(' *')
+
+        h.press('^S')
+        h.await_text('enter filename:')
+        h.press_and_enter(str(tmpdir.join('f')))
+        h.await_text('saved! (31 lines written)')
+
+    expected = ''.join(f'line_{i}\n' for i in range(31))
+    assert tmpdir.join('f').read() == expected
+
+
+def test_stdin_only_once(capsys):
+    with pytest.raises(SystemExit):
+        main(['-', '-'])
+    _, err = capsys.readouterr()
+    assert 'stdin (`-`) can only be read once' in err
+
+
+def test_stdin_must_be_piped(capsys):
+    with mock.patch('sys.stdin.isatty', return_value=True):
+        with pytest.raises(SystemExit):
+            main(['-'])
+    _, err = capsys.readouterr()
+    assert 'stdin (`-`) must be piped' in err
@@ -1,4 +1,5 @@
 from testing.runner import and_exit
+from testing.runner import trigger_command_mode
 
 
 def test_nothing_to_undo_redo(run):
@@ -79,6 +80,23 @@ def test_undo_redo_with_save(run, tmpdir):
         h.await_text(' *')
 
 
+def test_undo_redo_back_to_saved_contents(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\nworld\n')
+
+    with run(str(f)) as h, and_exit(h):
+        h.press('Down')
+        h.press('^K')
+        h.await_text(' *')
+        h.press('^U')
+        h.await_text_missing(' *')
+        h.press('M-u')
+        h.await_text(' *')
+        h.press('M-u')
+        h.await_text('undo: cut')
+        h.await_text_missing(' *')
+
+
 def test_undo_redo_implicit_linebreak(run, tmpdir):
     f = tmpdir.join('f')
 
@@ -106,6 +124,51 @@ def test_redo_cleared_after_action(run, tmpdir):
         h.await_text('nothing to redo!')
 
 
+def test_earlier_later_reach_undone_branch(run):
+    with run() as h, and_exit(h):
+        h.press('hello')
+        h.await_text('hello')
+        h.press('M-u')
+        h.await_text_missing('hello')
+        h.press('world')
+        h.await_text('world')
+
+        trigger_command_mode(h)
+        h.press_and_enter(':earlier')
+        h.await_text('earlier: state 1')
+        h.await_text('hello')
+        h.await_text_missing('world')
+
+        trigger_command_mode(h)
+        h.press_and_enter(':later')
+        h.await_text('later: state 2')
+        h.await_text('world')
+        h.await_text_missing('hello')
+
+        trigger_command_mode(h)
+        h.press_and_enter(':later')
+        h.await_text('no later state!')
+
+
+def test_earlier_later_by_time(run):
+    with run() as h, and_exit(h):
+        h.press('hello')
+        h.press('Left')
+        h.press('world')
+        h.await_text('hellworldo')
+
+        trigger_command_mode(h)
+        h.press_and_enter(':earlier 10m')
+        h.await_text('earlier: state 0')
+        h.await_text_missing('hell')
+        h.await_text_missing(' *')
+
+        trigger_command_mode(h)
+        h.press_and_enter(':later 1h')
+        h.await_text('later: state 2')
+        h.await_text('hellworldo')
+
+
 def test_undo_no_action_when_noop(run):
     with run() as h, and_exit(h):
         h.press('hello')
@@ -127,3 +190,97 @@ def test_undo_redo_causes_scroll(run):
         h.await_cursor_position(x=0, y=1)
         h.press('M-U')
         h.await_cursor_position(x=0, y=4)
+
+
+def test_undo_redo_history_moved_to_disk(run, xdg_data_home):
+    def _assert_journal_used():
+        assert xdg_data_home.join('babi/undo').isdir()
+
+    with run('--undo-memory', '0') as h, and_exit(h):
+        h.press('hello')
+        h.press('Enter')
+        h.press('world')
+        h.press('Enter')
+        h.press('Up')
+        h.press('^K')
+        h.await_text_missing('world')
+        h.run(_assert_journal_used)
+        for _ in range(5):
+            h.press('M-u')
+        h.await_text('undo: text')
+        h.await_text_missing('hello')
+        h.press('M-u')
+        h.await_text('nothing to undo!')
+        for _ in range(5):
+            h.press('M-U')
+        h.await_text('redo: cut')
+        h.await_text('hello')
+        h.await_text_missing('world')
+        h.press('M-U')
+        h.await_text('nothing to redo!')
+
+
+def test_undo_history_kept_between_sessions(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+    with run(str(f)) as h, and_exit(h):
+        h.press('Down')
+        h.press('world')
+        h.press('Up')
+        h.press('^K')
+        h.press('^S')
+        h.await_text('saved!')
+
+    with run(str(f)) as h, and_exit(h):
+        h.await_text('world')
+        h.press('M-u')
+        h.await_text('undo: cut')
+        h.await_text('hello')
+        h.press('M-u')
+        h.await_text('undo: text')
+        h.await_text_missing('world')
+        h.press('M-u')
+        h.await_text('nothing to undo!')
+        h.press('^S')
+        h.await_text('saved!')
+
+    assert f.read() == 'hello\n'
+
+    # the history continues from the last session
+    with run(str(f)) as h, and_exit(h):
+        h.press('M-u')
+        h.await_text('nothing to undo!')
+
+
+def test_undo_history_not_kept_for_changed_file(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+    with run(str(f)) as h, and_exit(h):
+        h.press('world')
+        h.press('^S')
+        h.await_text('saved!')
+
+    f.write('changed\n')
+    with run(str(f)) as h, and_exit(h):
+        h.await_text('changed')
+        h.press('M-u')
+        h.await_text('nothing to undo!')
+
+
+def test_undo_history_not_kept_when_not_saved(run, tmpdir):
+    f = tmpdir.join('f')
+    f.write('hello\n')
+    with run(str(f)) as h:
+        h.press('world')
+        h.press('^S')
+        h.await_text('saved!')
+        h.press('x')
+        h.press('^X')
+        h.await_text('file is modified - save [y(es), n(o)]?')
+        h.press('n')
+        h.await_exit()
+
+    with run(str(f)) as h, and_exit(h):
+        h.await_text('worldhello')
+        h.press('M-u')
+        h.await_text('nothing to undo!')
@@ -0,0 +1,64 @@
+from unittest import mock
+
+import pytest
+
+from testing.runner import and_exit
+from tests.features.conftest import run_fake
+
+
+@pytest.fixture(autouse=True)
+def small_blocks():
+    with mock.patch('babi.view_lines.BLOCK_SIZE', 16):
+        yield
+
+
+@pytest.fixture
+def many_lines(tmpdir):
+    f = tmpdir.join('f')
+    f.write(''.join(f'line_{i}\n' for i in range(100)))
+    return f
+
+
+def test_view_navigation(many_lines):
+    with run_fake('--view', str(many_lines), height=10) as h, and_exit(h):
+        h.await_text('line_6')
+        h.press('PageDown')
+        h.await_text('line_11')
+        h.press('^_')
+        h.await_text('enter line number:')
+        h.press_and_enter('75')
+        h.await_text('line_74')
+        h.await_text_missing('line_11')
+        h.press('^W')
+        h.await_text('search:')
+        h.press_and_enter('line_3$')
+        h.await_text('search wrapped')
+        h.await_text('line_3')
+        h.press('^End')
+        h.await_text('line_99')
+
+
+def test_view_is_read_only(many_lines):
+    with run_fake('--view', str(many_lines)) as h, and_exit(h):
+        h.await_text('line_0')
+        h.press('a')
+        h.await_text('file is read-only (opened with --view)')
+        h.press('Enter')
+        h.press('^K')
+        h.press('^S')
+        h.await_text('file is read-only (opened with --view)')
+        h.press('Escape')
+        h.press_and_enter(':w')
+        h.await_text('file is read-only (opened with --view)')
+        h.await_text('line_0')
+        h.await_text_missing(' *')
+
+    assert many_lines.read().startswith('line_0\n')
+
+
+def test_view_empty_file(tmpdir):
+    f = tmpdir.join('f').ensure()
+
+    with run_fake('--view', str(f)) as h, and_exit(h):
+        h.press('^C')
+        h.await_text('line 1, col 1 (of 1 line)')
@@ -1,9 +1,24 @@
+import curses
+import hashlib
 import io
+import random
+import re
+from unittest import mock
 
 import pytest
 
+from babi.chunked_lines import ChunkedLines
+from babi.compact_lines import CompactLines
+from babi.file import Action
 from babi.file import File
+from babi.file import FileStat
 from babi.file import get_lines
+from babi.file import get_lines_bytes
+from babi.file import _MatchIndex
+from babi.file import _write_atomically
+from babi.file import write_lines
+from babi.margin import Margin
+from babi.status import Status
 
 
 def test_position_repr():
@@ -11,17 +26,32 @@ def test_position_repr():
     assert ret == (
         'File(\n'
         "    filename='f.txt',\n"
+        '    stream=None,\n'
+        '    compact_lines=False,\n'
+        '    view=False,\n'
+        '    following=False,\n'
         '    modified=False,\n'
         '    lines=[],\n'
         "    nl='\\n',\n"
+        '    compression=None,\n'
         '    file_y=0,\n'
         '    y=0,\n'
         '    x=0,\n'
         '    x_hint=0,\n'
         '    sha256=None,\n'
-        '    undo_stack=[],\n'
-        '    redo_stack=[],\n'
+        '    stat=None,\n'
+        '    _hash_tree=None,\n'
+        '    _saved_root=None,\n'
+        '    history=UndoTree(<1 states>),\n'
         '    select_start=None,\n'
+        '    _loader=None,\n'
+        '    _saver=None,\n'
+        '    _follower=None,\n'
+        '    _gap=None,\n'
+        '    _recovery=None,\n'
+        '    _recoverable=None,\n'
+        '    version=0,\n'
+        '    _matches=None,\n'
         ')'
     )
 
@@ -46,3 +76,228 @@ def test_get_lines_sha256_checksum():
     ret = get_lines(io.StringIO(''))
     sha256 = 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'
     assert ret == ([''], '\n', False, sha256)
+
+
+@pytest.mark.parametrize('chunk_size', (1, 2, 3, 1024))
+@pytest.mark.parametrize(
+    's',
+    (
+        pytest.param(b'', id='trivial'),
+        pytest.param(b'1\n2\n', id='lf'),
+        pytest.param(b'1\r\n2\r\n', id='crlf'),
+        pytest.param(b'1\r\n2\n\n', id='mixed'),
+        pytest.param(b'1\n2', id='noeol'),
+        pytest.param(b'1\r2\r\n3\r', id='lone cr'),
+        pytest.param('h\u00e9llo\nw\u00f6rld\n'.encode(), id='non-ascii'),
+    ),
+)
+def test_get_lines_bytes_matches_get_lines(s, chunk_size):
+    expected = get_lines(io.StringIO(s.decode(), newline=''))
+    with mock.patch('babi.file.LOAD_CHUNK_SIZE', chunk_size):
+        assert get_lines_bytes(io.BytesIO(s)) == expected
+
+
+def test_get_lines_bytes_compact():
+    bio = io.BytesIO(b'a\r\nb\r\na\r\n')
+    lines, nl, mixed, _ = get_lines_bytes(bio, compact=True)
+    assert isinstance(lines, CompactLines)
+    assert (list(lines), nl, mixed) == (['a', 'b', 'a', ''], '\r\n', False)
+
+
+def test_ensure_loaded_compact_lines(tmpdir):
+    f = tmpdir.join('f')
+    f.write('a\nb\n')
+    file = File(str(f), compact_lines=True)
+    with mock.patch('babi.file.CHUNKED_LINES_THRESHOLD', 1):
+        file.ensure_loaded(Status(), Margin(header=True, footer=True))
+    assert isinstance(file.lines, CompactLines)
+    assert list(file.lines) == ['a', 'b', '']
+
+
+@pytest.mark.parametrize(
+    'lines',
+    ([], [''], ['a', ''], ['a', 'b', 'c', 'd', ''], ['h\u00e9llo', 'w']),
+)
+@pytest.mark.parametrize('nl', ('\n', '\r\n'))
+def test_write_lines(lines, nl):
+    expected = nl.join(lines).encode()
+    bio = io.BytesIO()
+    with mock.patch('babi.file.SAVE_CHUNK_LINES', 2):
+        size, sha256 = write_lines(bio, lines, nl)
+    assert bio.getvalue() == expected
+    assert size == len(expected)
+    assert sha256 == hashlib.sha256(expected).hexdigest()
+
+
+def test_write_atomically_removes_tempfile_on_error(tmpdir):
+    f = tmpdir.join('f')
+    f.write('original\n')
+    with mock.patch('babi.file.write_lines', side_effect=OSError('full')):
+        with pytest.raises(OSError):
+            _write_atomically(str(f), ['new', ''], '\n', mode=0o644)
+    assert tmpdir.listdir() == [f]
+    assert f.read() == 'original\n'
+
+
+def test_ensure_loaded_uses_chunked_lines_for_many_lines(tmpdir):
+    f = tmpdir.join('f')
+    f.write('a\nb\n')
+    file = File(str(f))
+    with mock.patch('babi.file.CHUNKED_LINES_THRESHOLD', 3):
+        file.ensure_loaded(Status(), Margin(header=True, footer=True))
+    assert isinstance(file.lines, ChunkedLines)
+    assert list(file.lines) == ['a', 'b', '']
+
+
+def test_ensure_loaded_small_files_use_a_list(tmpdir):
+    f = tmpdir.join('f')
+    f.write('a\nb\n')
+    file = File(str(f))
+    with mock.patch('babi.file.CHUNKED_LINES_THRESHOLD', 4):
+        file.ensure_loaded(Status(), Margin(header=True, footer=True))
+    assert file.lines == ['a', 'b', '']
+
+
+@pytest.mark.parametrize(
+    'appended',
+    (
+        (b'a\r\nb', b'c\r\n', b'\r\nd\r\n'),
+        (b'a\n\n', b'b\r', b'\nc'),
+        ('hé'.encode()[:2], 'hé'.encode()[2:], b'llo\n'),
+    ),
+)
+def test_follow_matches_loading(tmpdir, appended):
+    f = tmpdir.join('f')
+    f.write_binary(b'hello\r\n')
+    margin = Margin(header=True, footer=True)
+    file = File(str(f), follow=True)
+    with mock.patch.object(curses, 'LINES', 24, create=True):
+        file.ensure_loaded(Status(), margin)
+        for s in appended:
+            f.write(s, mode='ab')
+            file.poll_follow(Status(), margin)
+
+    with open(f, 'rb') as bf:
+        lines, nl, _, sha256 = get_lines_bytes(bf)
+    assert (file.lines, file.nl, file.sha256) == (lines, nl, sha256)
+    assert file.stat == FileStat.from_path(str(f))
+    assert not file.modified
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_undo_tree_go_to_any_state(tmpdir, monkeypatch, seed):
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmpdir.join('data')))
+    rand = random.Random(seed)
+    f = tmpdir.join('f')
+    f.write('a\nb\nc\n')
+    margin = Margin(header=True, footer=True)
+    file = File(str(f))
+    monkeypatch.setattr(curses, 'LINES', 24, raising=False)
+    monkeypatch.setattr('babi.file.CHECKPOINT_INTERVAL', 4)
+
+    file.ensure_loaded(Status(), margin)
+    orig = list(file.lines)
+    states = {file.history.state: orig}
+    for i in range(200):
+        op = rand.choice(('c', 'enter', 'backspace', 'down', 'undo'))
+        if op == 'c':
+            file.c(str(i % 10), margin)
+        elif op == 'enter':
+            file.enter(margin)
+        elif op == 'backspace':
+            file.backspace(margin)
+        elif op == 'down':
+            file.down(margin)
+        else:
+            file.history.undo(file)
+        states[file.history.state] = list(file.lines)
+
+    for state in rand.sample(sorted(states), len(states)):
+        file.history.go_to(file, state)
+        assert list(file.lines) == states[state]
+        assert file.modified == (states[state] != orig)
+    file.close()
+
+
+def test_undo_tree_go_to_restores_checkpoints(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmpdir.join('data')))
+    f = tmpdir.join('f')
+    f.write('a\n')
+    margin = Margin(header=True, footer=True)
+    file = File(str(f))
+    monkeypatch.setattr(curses, 'LINES', 24, raising=False)
+
+    file.ensure_loaded(Status(), margin)
+    for _ in range(100):
+        file.c('x', margin)
+        file.down(margin)
+        file.up(margin)
+
+    # from the checkpoint of the first state
+    with mock.patch.object(
+            Action, 'undo', autospec=True, side_effect=Action.undo,
+    ) as undo:
+        file.history.go_to(file, 0)
+    assert undo.call_count == 0
+    assert list(file.lines) == ['a', '']
+    assert not file.modified
+
+    # from the checkpoint 64 actions deep
+    with mock.patch.object(
+            Action, 'redo', autospec=True, side_effect=Action.redo,
+    ) as redo:
+        file.history.go_to(file, 70)
+    assert redo.call_count == 6
+    assert list(file.lines) == ['x' * 70 + 'a', '']
+    file.close()
+
+
+def test_lines_containing(tmpdir):
+    f = tmpdir.join('f')
+    f.write('foo\nbar\nfooBar\nbaz\n')
+    file = File(str(f))
+    file.ensure_loaded(Status(), Margin(header=True, footer=True))
+    assert file.lines_containing('ba') == [1, 3]
+    assert file.lines_containing('ba', ignore_case=True) == [1, 2, 3]
+    assert file.lines_containing('bar', [1, 2, 3]) == [1]
+    assert file.lines_containing('bar', [2], ignore_case=True) == [2]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_match_index_follows_edits(tmpdir, monkeypatch, seed):
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmpdir.join('data')))
+    monkeypatch.setattr(curses, 'LINES', 24, raising=False)
+    rand = random.Random(seed)
+    f = tmpdir.join('f')
+    f.write(''.join(f'ab{i % 3}\n' for i in range(30)))
+    margin = Margin(header=True, footer=True)
+    file = File(str(f))
+    file.ensure_loaded(Status(), margin)
+    reg = re.compile('a+b|b1|^a')
+    index = file._match_index(reg, None)
+
+    for _ in range(20):
+        for _ in range(rand.randrange(5)):
+            file.y = rand.randrange(len(file.lines))
+            file.x = rand.randint(0, len(file.lines[file.y]))
+            op = rand.choice(('c', 'enter', 'backspace'))
+            if op == 'c':
+                file.c('a', margin)
+            elif op == 'enter':
+                file.enter(margin)
+            else:
+                file.backspace(margin)
+
+        assert file._match_index(reg, None) is index
+        expected = _MatchIndex.build(reg, file.lines, file.version, None)
+        assert (index.ys, index.xs) == (expected.ys, expected.xs)
+
+        # finds the same match as searching line by line
+        y = file.y = rand.randrange(len(file.lines))
+        x = file.x = rand.randint(0, len(file.lines[file.y]))
+        file.search(reg, Status(), margin, count=False)
+        unindexed = (file.y, file.x)
+        file.y, file.x = y, x
+        file.search(reg, Status(), margin)
+        assert (file.y, file.x) == unindexed
+    file.close()
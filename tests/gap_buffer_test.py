@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from babi.gap_buffer import GapBuffer
+
+
+def test_gap_buffer_repr():
+    assert repr(GapBuffer('abc')) == "GapBuffer('abc')"
+
+
+def test_gap_buffer_typing_at_the_end():
+    buf = GapBuffer('abc')
+    for i, c in enumerate('def', start=3):
+        buf.insert(i, c)
+    assert str(buf) == 'abcdef'
+    assert len(buf) == 6
+
+
+def test_gap_buffer_backspace_through_inserted_text():
+    buf = GapBuffer('abc')
+    buf.insert(1, 'x')
+    buf.delete(1)
+    buf.delete(0)
+    assert str(buf) == 'bc'
+    assert len(buf) == 2
+
+
+def test_gap_buffer_delete_forward():
+    buf = GapBuffer('abcd')
+    buf.delete(1)
+    buf.delete(1)
+    buf.insert(1, 'x')
+    assert str(buf) == 'axd'
+
+
+def test_gap_buffer_fuzz():
+    rand = random.Random(0)
+    s = 'hello world'
+    buf = GapBuffer(s)
+    pos = len(s)
+    for _ in range(500):
+        if rand.random() < .2:
+            pos = rand.randint(0, len(s))
+        if s and pos and rand.random() < .4:
+            s = s[:pos - 1] + s[pos:]
+            buf.delete(pos - 1)
+            pos -= 1
+        elif s and pos < len(s) and rand.random() < .5:
+            s = s[:pos] + s[pos + 1:]
+            buf.delete(pos)
+        else:
+            c = rand.choice('abc')
+            s = s[:pos] + c + s[pos:]
+            buf.insert(pos, c)
+            pos += 1
+        assert len(buf) == len(s)
+    assert str(buf) == s
+
+
+@pytest.mark.parametrize(
+    ('start', 'end'),
+    (
+        (0, 3), (0, 5), (2, 6), (4, 5), (5, 7), (6, 9), (0, 9), (8, 20),
+    ),
+)
+def test_gap_buffer_substring(start, end):
+    buf = GapBuffer('abcdefg')
+    buf.insert(4, 'X')
+    buf.insert(5, 'Y')
+    buf.delete(6)
+    assert str(buf) == 'abcdXYfg'
+    assert buf.substring(start, end) == 'abcdXYfg'[start:end]
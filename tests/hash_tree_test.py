@@ -0,0 +1,51 @@
+import random
+from unittest import mock
+
+import pytest
+
+from babi.hash_tree import HashTree
+from babi.list_spy import ListSpy
+
+
+def test_hash_tree_repr():
+    with mock.patch('babi.hash_tree.CHUNK_LINES', 1):
+        assert repr(HashTree(['a', 'b', ''])) == 'HashTree(<3 chunks>)'
+
+
+def test_hash_tree_root_depends_on_contents():
+    assert HashTree(['a', '']).root('\n') == HashTree(['a', '']).root('\n')
+    assert HashTree(['a', '']).root('\n') != HashTree(['b', '']).root('\n')
+    assert HashTree(['a', '']).root('\n') != HashTree(['a', '']).root('\r\n')
+    assert HashTree(['a', '']).root('\n') != HashTree(['a']).root('\n')
+
+
+def test_hash_tree_empty():
+    tree = HashTree([])
+    lines = ['a', '']
+    tree.update(lines, 0, 2, 2)
+    assert tree.root('\n') == HashTree(lines).root('\n')
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_hash_tree_update_matches_rebuilding(seed):
+    rand = random.Random(seed)
+    lines = [rand.choice('abcdefgh') for _ in range(50)]
+    with mock.patch('babi.hash_tree.CHUNK_LINES', 4):
+        tree = HashTree(lines)
+        for _ in range(20):
+            spy = ListSpy(lines)
+            for _ in range(rand.randrange(1, 4)):
+                op = rand.choice(('set', 'insert', 'del'))
+                idx = rand.randrange(len(lines) + (op == 'insert'))
+                if op == 'set':
+                    spy[idx] = rand.choice('abcdefgh')
+                elif op == 'insert' or len(lines) == 1:
+                    spy.insert(idx, rand.choice('abcdefgh'))
+                else:
+                    del spy[idx]
+            changes = spy.take_changes()
+            assert changes is not None
+            tree.update(lines, *changes)
+            expected = HashTree(lines)
+            assert tree._sizes == expected._sizes
+            assert tree.root('\n') == expected.root('\n')
@@ -1,5 +1,8 @@
+import random
+
 import pytest
 
+from babi.chunked_lines import ChunkedLines
 from babi.list_spy import ListSpy
 
 
@@ -142,3 +145,148 @@ def test_list_spy_pop_idx():
     spy.undo(lst)
 
     assert lst == ['a', 'b', 'c']
+
+
+def test_list_spy_take_changes():
+    lst = ['a', 'b', 'c', 'd']
+
+    spy = ListSpy(lst)
+    assert spy.take_changes() is None
+    spy[1] = 'hello'
+    spy.insert(3, 'q')
+    del spy[0]
+
+    assert lst == ['hello', 'c', 'q', 'd']
+    # lines 0 to 3 replaced what were lines 0 to 3
+    assert spy.take_changes() == (0, 3, 0)
+    assert spy.take_changes() is None
+
+
+def test_list_spy_take_changes_delete_after_changes():
+    lst = ['a', 'b', 'c', 'd']
+
+    spy = ListSpy(lst)
+    spy.insert(0, 'q')
+    del spy[3]
+
+    assert lst == ['q', 'a', 'b', 'd']
+    assert spy.take_changes() == (0, 3, 0)
+
+
+def test_list_spy_consecutive_changes_are_one_run():
+    lst = ['a', 'b', 'c', 'd', 'e']
+
+    spy = ListSpy(lst)
+    # like uncutting lines
+    spy[1] = 'b1'
+    spy.insert(2, 'x')
+    spy[2] = 'x1'
+    spy.insert(3, 'y')
+    # like cutting lines
+    del spy[4]
+    del spy[4]
+
+    assert lst == ['a', 'b1', 'x1', 'y', 'e']
+    assert len(spy._undo) == 1
+
+    spy.undo(lst)
+
+    assert lst == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_list_spy_replace():
+    lst = ['a', 'b', 'c']
+
+    spy = ListSpy(lst)
+    spy.replace(1, 1, ['q', 'r'])
+
+    assert lst == ['a', 'q', 'r', 'c']
+    assert spy.take_changes() == (1, 3, 1)
+
+    redo = ListSpy(lst)
+    spy.undo(redo)
+
+    assert lst == ['a', 'b', 'c']
+    assert len(redo._undo) == 1
+
+    redo.undo(lst)
+
+    assert lst == ['a', 'q', 'r', 'c']
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_list_spy_undo_random_changes(seed):
+    rand = random.Random(seed)
+    orig = [str(i) for i in range(20)]
+    lst = list(orig)
+    lines = ChunkedLines(orig)
+
+    spy = ListSpy(lst)
+    idx = 10
+    for i in range(50):
+        op = rand.choice(('set', 'del', 'ins'))
+        # near the previous change (extending its run) or anywhere
+        if rand.random() < .8:
+            idx = min(max(idx + rand.randint(-1, 1), 0), len(lst) - 1)
+        else:
+            idx = rand.randrange(len(lst))
+        if op == 'set':
+            spy[idx] = f'set{i}'
+        elif op == 'del' and len(lst) > 1:
+            del spy[idx]
+        else:
+            spy.insert(idx, f'ins{i}')
+    edited = list(lst)
+
+    spy.undo(lst)
+    assert lst == orig
+    spy.redo(lst)
+    assert lst == edited
+    spy.undo(lst)
+
+    for line in edited:
+        lines.append(line)
+    for _ in orig:
+        del lines[0]
+    spy.undo(lines)
+    assert list(lines) == orig
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_list_spy_replay(seed):
+    rand = random.Random(seed)
+    orig = [str(i) for i in range(20)]
+    changes = []
+    for i in range(10):
+        idx = rand.randrange(15)
+        vals = [f'{i}_{j}' for j in range(rand.randrange(3))]
+        changes.append((idx, rand.randrange(3), vals))
+
+    expected = ListSpy(list(orig))
+    for change in changes:
+        expected.replace(*change)
+
+    lst = list(orig)
+    spy = ListSpy(lst)
+    spy.replay(changes, ChunkedLines(orig))
+    assert lst == list(expected)
+    assert spy.take_changes() == expected.take_changes()
+
+    spy.undo(lst)
+    assert lst == orig
+
+
+def test_list_spy_sealed_records_undo_and_redo():
+    lst = ['a', 'b', 'c']
+
+    spy = ListSpy(lst)
+    spy[1] = 'q'
+    spy.insert(3, 'r')
+    del spy[0]
+    spy.seal(lst)
+
+    other = ListSpy.from_undo_records(spy.undo_records())
+    other.undo(lst)
+    assert lst == ['a', 'b', 'c']
+    other.redo(lst)
+    assert lst == ['q', 'c', 'r']
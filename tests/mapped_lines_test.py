@@ -0,0 +1,107 @@
+import io
+from unittest import mock
+
+import pytest
+
+from babi.file import get_lines
+from babi.mapped_lines import get_lines_mapped
+
+
+@pytest.fixture
+def mapped(tmpdir):
+    def mapped(s):
+        f = tmpdir.join('f')
+        f.write_binary(s)
+        with open(f, 'rb') as bf:
+            return get_lines_mapped(bf)
+    return mapped
+
+
+@pytest.mark.parametrize(
+    's',
+    (
+        pytest.param(b'1\n2\n', id='lf'),
+        pytest.param(b'1\r\n2\r\n', id='crlf'),
+        pytest.param(b'1\r\n2\n', id='mixed'),
+        pytest.param(b'1\n2', id='noeol'),
+        pytest.param(b'\n\n', id='blank lines'),
+        pytest.param('hello\nwörld\n'.encode(), id='non-ascii'),
+    ),
+)
+def test_get_lines_mapped_matches_get_lines(mapped, s):
+    lines, nl, mixed, sha256 = mapped(s)
+    expected = get_lines(io.StringIO(s.decode(), newline=''))
+    assert (list(lines), nl, mixed, sha256) == expected
+
+
+def test_get_lines_mapped_crlf_across_chunks(mapped):
+    with mock.patch('babi.mapped_lines.CHUNK_SIZE', 2):
+        lines, nl, mixed, _ = mapped(b'a\r\nb\r\nc\r\n')
+    assert (list(lines), nl, mixed) == (['a', 'b', 'c', ''], '\r\n', False)
+
+
+def test_mapped_lines_repr(mapped):
+    lines, *_ = mapped(b'1\n2\n')
+    assert repr(lines) == 'MappedLines(<3 lines>)'
+
+
+def test_mapped_lines_item_retrieval(mapped):
+    lines, *_ = mapped(b'a\nb\nc')
+    assert lines[1] == 'b'
+    assert lines[-1] == ''
+    assert lines[-2] == 'c'
+    with pytest.raises(IndexError):
+        lines[4]
+
+
+def test_mapped_lines_set_value(mapped):
+    lines, *_ = mapped(b'a\nb\nc\n')
+    lines[1] = 'hello'
+    lines[1] = 'world'
+    assert list(lines) == ['a', 'world', 'c', '']
+    assert len(lines) == 4
+
+
+def test_mapped_lines_del(mapped):
+    lines, *_ = mapped(b'a\nb\nc\n')
+    lines[0] = 'q'
+    del lines[1]
+    del lines[0]
+    assert list(lines) == ['c', '']
+    assert len(lines) == 2
+
+
+def test_mapped_lines_insert(mapped):
+    lines, *_ = mapped(b'a\nb\nc\n')
+    lines.insert(1, 'q')
+    lines.insert(2, 'r')
+    lines.insert(-1, 's')
+    assert list(lines) == ['a', 'q', 'r', 'b', 'c', 's', '']
+    assert lines[5] == 's'
+
+
+def test_mapped_lines_append_and_pop(mapped):
+    lines, *_ = mapped(b'a\n')
+    lines.append('b')
+    lines.append('c')
+    assert lines.pop() == 'c'
+    assert lines.pop(0) == 'a'
+    assert list(lines) == ['', 'b']
+
+
+def test_mapped_lines_delete_everything(mapped):
+    lines, *_ = mapped(b'a\n')
+    del lines[0]
+    del lines[0]
+    assert len(lines) == 0
+    lines.append('')
+    assert list(lines) == ['']
+
+
+def test_mapped_lines_snapshot(mapped):
+    lines, *_ = mapped(b'a\nb\nc\n')
+    lines[1] = 'q'
+    snapshot = lines.snapshot()
+    lines[1] = 'r'
+    lines.insert(0, 's')
+    assert list(snapshot) == ['a', 'q', 'c', '']
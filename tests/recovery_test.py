@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from babi.recovery import _recovery_path
+from babi.recovery import load_recovery
+from babi.recovery import recovery_exists
+from babi.recovery import RecoveryJournal
+
+SHA256 = 'a' * 64
+
+
+@pytest.fixture(autouse=True)
+def xdg_data_home(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmpdir.join('data')))
+
+
+def _wait_for_changes(filename, n):
+    for _ in range(500):
+        try:
+            with open(_recovery_path(filename), 'rb') as f:
+                if len(f.read().splitlines()) == n + 1:
+                    return
+        except FileNotFoundError:
+            pass
+        time.sleep(.01)
+    raise AssertionError('changes were not written')
+
+
+def test_recovery_journal(tmpdir):
+    f = str(tmpdir.join('f'))
+    journal = RecoveryJournal(f, SHA256)
+    journal.record(0, 1, ['hello'])
+    journal.record(0, 1, ['hello world'])
+    journal.record(1, 0, ['a', 'b'])
+    _wait_for_changes(f, 3)
+
+    assert load_recovery(f, SHA256) == [
+        (0, 1, ['hello world']),
+        (1, 0, ['a', 'b']),
+    ]
+
+    journal.close()
+    assert not recovery_exists(f)
+    assert load_recovery(f, SHA256) is None
+
+
+def test_load_recovery_ignores_partial_change(tmpdir):
+    f = str(tmpdir.join('f'))
+    journal = RecoveryJournal(f, SHA256)
+    journal.record(0, 1, ['hello'])
+    _wait_for_changes(f, 1)
+    with open(_recovery_path(f), 'ab') as bf:
+        bf.write(b'[1,0,["wor')
+
+    assert load_recovery(f, SHA256) == [(0, 1, ['hello'])]
+    journal.close()
+
+
+def test_load_recovery_other_contents(tmpdir):
+    f = str(tmpdir.join('f'))
+    journal = RecoveryJournal(f, SHA256)
+    journal.record(0, 1, ['hello'])
+    _wait_for_changes(f, 1)
+
+    assert load_recovery(f, 'b' * 64) is None
+    # the changes no longer apply and are removed
+    assert not recovery_exists(f)
+    journal.close()
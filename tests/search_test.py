@@ -0,0 +1,196 @@
+import os
+import random
+import re
+from unittest import mock
+
+import pytest
+
+from babi.search import compile_search
+from babi.search import is_literal
+from babi.search import is_multiline
+from babi.search import line_matches
+from babi.search import literal_matches
+from babi.search import match_at
+from babi.search import matches
+from babi.search import parallel_matches
+from babi.search import search_lines
+from babi.search import search_multiline
+
+
+@pytest.mark.parametrize(
+    ('s', 'expected'),
+    (('foo', True), ('foo bar', True), ('foo.bar', False), (r'\(', False)),
+)
+def test_is_literal(s, expected):
+    assert is_literal(s) is expected
+
+
+@pytest.mark.parametrize(
+    ('s', 'flags'),
+    (
+        ('foo', re.IGNORECASE),
+        ('Foo', 0),
+        (r'foo\S', re.IGNORECASE),
+        (r'foo\SBar', 0),
+    ),
+)
+def test_compile_search_smart_case(s, flags):
+    assert compile_search(s).flags & re.IGNORECASE == flags
+
+
+def _per_line(lines, reg):
+    # every position searching each line finds, as the regex path does
+    for y, line in enumerate(lines):
+        x = 0
+        while x <= len(line):
+            match = reg.search(line, x)
+            if match is None:
+                break
+            yield y, match.start()
+            x = match.start() + 1
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('s', ('a', 'ab', 'aa', 'B', ''))
+def test_literal_matches_same_as_per_line(seed, s):
+    rand = random.Random(seed)
+    lines = [
+        ''.join(rand.choice('abAB') for _ in range(rand.randrange(8)))
+        for _ in range(200)
+    ] + ['']
+    reg = compile_search(s)
+    start = rand.randrange(len(lines))
+    end = rand.randrange(start, len(lines) + 1)
+    with mock.patch('babi.search.LITERAL_CHUNK_LINES', (4, 32)):
+        found = list(literal_matches(lines, reg, start, end))
+    expected = [
+        (y + start, x) for y, x in _per_line(lines[start:end], reg)
+    ]
+    assert found == expected
+
+
+@pytest.mark.parametrize('s', ('ix', 'ss', 'k'))
+def test_literal_matches_ignoring_case_unicode(s):
+    lines = ['İx', 'ß', 'ẞ', '\u212a', '']
+    reg = compile_search(s)
+    found = list(literal_matches(lines, reg, 0, len(lines)))
+    assert found == list(_per_line(lines, reg))
+
+
+@pytest.fixture
+def parallel():
+    with mock.patch('babi.search.PARALLEL_LINES', 50):
+        with mock.patch('babi.search.PARALLEL_CHUNK_LINES', 16):
+            yield
+
+
+@pytest.mark.parametrize('cpus', (1, 4))
+@pytest.mark.parametrize('s', ('needle', 'Needle', 'ne+dle|^1', 'missing'))
+def test_parallel_matches_same_as_per_line(parallel, cpus, s):
+    lines = [f'{i} needle' if i % 7 == 0 else f'{i}' for i in range(100)]
+    lines.append('')
+    reg = compile_search(s)
+    with mock.patch.object(os, 'cpu_count', return_value=cpus):
+        found = list(matches(lines, reg, range(len(lines))))
+    assert found == list(line_matches(lines, reg, range(len(lines))))
+
+
+def test_parallel_matches_first_chunk_only(parallel):
+    lines = ['a', 'ba', '']
+    assert list(parallel_matches(lines, compile_search('a'), 0, 3)) == [
+        (0, 0), (1, 1),
+    ]
+
+
+def test_parallel_search_lines(parallel):
+    lines = [f'{i}' for i in range(100)] + ['']
+    found = search_lines(lines, compile_search('3'), range(40, 100))
+    assert found is not None
+    assert found[:4] == (43, 1, 43, 2)
+    assert search_lines(lines, compile_search('x'), range(100)) is None
+
+
+def test_search_lines():
+    lines = ['foo', 'Bar bar', '']
+    found = search_lines(lines, compile_search('bar'), range(3))
+    assert found is not None
+    assert found[:4] == (1, 0, 1, 3)
+    assert found.match[0] == 'Bar'
+    assert search_lines(lines, compile_search('Bar'), range(2, 3)) is None
+    found = search_lines(lines, compile_search('o|r$'), [1, 2])
+    assert found is not None
+    assert found[:4] == (1, 6, 1, 7)
+
+
+@pytest.mark.parametrize(
+    ('pattern', 'expected'),
+    (
+        ('foo', False),
+        (r'foo\s+bar', False),
+        (r'foo\\n', False),
+        (r'foo\n', True),
+        (r'foo\\\n', True),
+        ('foo\nbar', True),
+    ),
+)
+def test_is_multiline(pattern, expected):
+    assert is_multiline(re.compile(pattern)) is expected
+
+
+def test_search_multiline_positions():
+    lines = ['foo', 'bar', 'baz', '']
+    found = search_multiline(lines, re.compile(r'o\nb(a)'), 0, 0)
+    assert found is not None
+    assert found[:4] == (0, 2, 1, 2)
+    assert found.match[1] == 'a'
+
+
+def test_search_multiline_from_position():
+    lines = ['a', 'a', 'a', '']
+    found = search_multiline(lines, re.compile(r'a\n'), 0, 1)
+    assert found is not None
+    assert found[:4] == (1, 0, 2, 0)
+
+
+def test_search_multiline_start_end_of_lines():
+    lines = ['xa', 'a', 'b', '']
+    found = search_multiline(lines, re.compile(r'^a$\nb'), 0, 0)
+    assert found is not None
+    assert found[:4] == (1, 0, 2, 1)
+
+
+def test_search_multiline_no_match():
+    lines = ['foo', 'bar', '']
+    assert search_multiline(lines, re.compile(r'bar\nfoo'), 0, 0) is None
+
+
+@pytest.mark.parametrize('start', range(0, 90, 3))
+def test_search_multiline_across_windows(start):
+    lines = [f'line_{i}' for i in range(100)] + ['']
+    reg = re.compile(r'_\d*7\n(?:.*\n){2}line_\d*0$')
+    with mock.patch('babi.search.MAX_MATCH_LINES', 4):
+        with mock.patch('babi.search.WINDOW_LINES', 10):
+            found = search_multiline(lines, reg, start, 0)
+
+    # the same as searching all of the lines at once
+    text = '\n'.join(lines)
+    offset = sum(len(line) + 1 for line in lines[:start])
+    match = re.compile(reg.pattern, re.MULTILINE).search(text, offset)
+    assert match is not None
+    assert found is not None
+    assert found.match[0] == match[0]
+    y = text.count('\n', 0, match.start())
+    x = match.start() - text.rfind('\n', 0, match.start()) - 1
+    assert found[:4] == (y, x, y + 3, len(lines[y + 3]))
+
+
+def test_match_at():
+    lines = ['foo', 'bar', '']
+    found = match_at(lines, re.compile('o+'), 0, 1)
+    assert found is not None
+    assert found[:4] == (0, 1, 0, 3)
+    assert match_at(lines, re.compile('o+'), 0, 0) is None
+    found = match_at(lines, re.compile(r'o\nb'), 0, 2)
+    assert found is not None
+    assert found[:4] == (0, 2, 1, 1)
+    assert match_at(lines, re.compile(r'o\nb'), 0, 1) is None
@@ -0,0 +1,59 @@
+import pytest
+
+from babi.undo_journal import UndoJournal
+
+
+@pytest.fixture(autouse=True)
+def xdg_data_home(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmpdir))
+
+
+def test_undo_journal_push_pop():
+    journal = UndoJournal()
+    assert not journal
+    journal.push(['a', 1, [[0, 1, ['hello']]]])
+    journal.push(['b', 2, []])
+    assert len(journal) == 2
+    assert repr(journal) == 'UndoJournal(<2 records>)'
+    assert journal.pop() == ['b', 2, []]
+    journal.push(['c', 3, []])
+    assert journal.pop() == ['c', 3, []]
+    assert journal.pop() == ['a', 1, [[0, 1, ['hello']]]]
+    assert not journal
+
+
+def test_undo_journal_clear():
+    journal = UndoJournal()
+    journal.clear()
+    journal.push(['a'])
+    journal.clear()
+    assert not journal
+    journal.push(['b'])
+    assert journal.pop() == ['b']
+
+
+def test_undo_journal_save_and_open(tmpdir):
+    f = tmpdir.join('f')
+    sha256 = '0' * 63 + '1'
+    journal = UndoJournal()
+    journal.push(['a'])
+    journal.push(['b'])
+    journal.save(str(f), sha256)
+
+    assert UndoJournal.open(str(f), '0' * 64) is None
+    journal = UndoJournal.open(str(f), sha256)
+    assert journal is not None
+    assert len(journal) == 2
+    assert journal.pop() == ['b']
+    # the journal is not valid until it is saved again
+    assert UndoJournal.open(str(f), sha256) is None
+    journal.push(['c'])
+    journal.save(str(f), sha256)
+
+    journal = UndoJournal.open(str(f), sha256)
+    assert journal is not None
+    assert journal.pop() == ['c']
+    assert journal.pop() == ['a']
+    assert not journal
+    journal.save(str(f), sha256)
+    assert UndoJournal.open(str(f), sha256) is None
@@ -0,0 +1,71 @@
+import io
+from unittest import mock
+
+import pytest
+
+from babi.file import get_lines
+from babi.view_lines import get_lines_view
+
+
+@pytest.fixture
+def view(tmpdir):
+    def view(s):
+        f = tmpdir.join('f')
+        f.write_binary(s)
+        with open(f, 'rb') as bf:
+            return get_lines_view(bf)
+    return view
+
+
+@pytest.mark.parametrize(
+    's',
+    (
+        pytest.param(b'1\n2\n', id='lf'),
+        pytest.param(b'1\r\n2\r\n', id='crlf'),
+        pytest.param(b'1\n2', id='noeol'),
+        pytest.param(b'\n\n', id='blank lines'),
+        pytest.param('hello\nwörld\n'.encode(), id='non-ascii'),
+        pytest.param(b''.join(b'%d\n' % i for i in range(100)), id='many'),
+    ),
+)
+def test_get_lines_view_matches_get_lines(view, s):
+    with mock.patch('babi.view_lines.BLOCK_SIZE', 4):
+        lines, nl = view(s)
+    expected_lines, expected_nl, _, _ = get_lines(
+        io.StringIO(s.decode(), newline=''),
+    )
+    assert (list(lines), nl) == (expected_lines, expected_nl)
+    assert len(lines) == len(expected_lines)
+
+
+def test_view_lines_random_access(view):
+    s = b''.join(b'line_%d\n' % i for i in range(100))
+    with mock.patch('babi.view_lines.BLOCK_SIZE', 16):
+        lines, _ = view(s)
+        assert lines[57] == 'line_57'
+        assert lines[3] == 'line_3'
+        assert lines[0] == 'line_0'
+        assert lines[-2] == 'line_99'
+        assert lines[-1] == ''
+        with pytest.raises(IndexError):
+            lines[101]
+
+
+def test_view_lines_repr(view):
+    lines, _ = view(b'1\n2\n')
+    assert repr(lines) == 'ViewLines(<3 lines>)'
+
+
+def test_view_lines_invalid_utf8(view):
+    lines, _ = view(b'\xff\n')
+    assert lines[0] == '�'
+
+
+def test_view_lines_read_only(view):
+    lines, _ = view(b'1\n')
+    with pytest.raises(TypeError):
+        lines[0] = 'hello'
+    with pytest.raises(TypeError):
+        del lines[0]
+    with pytest.raises(TypeError):
+        lines.insert(0, 'hello')